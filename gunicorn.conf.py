@@ -7,12 +7,19 @@ load_dotenv()
 
 # Configurações básicas
 bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5001')}"
-workers = 4
-worker_class = "sync"
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+# Workers com threads: o processo continua sinalizando que está vivo enquanto
+# uma thread atende uma requisição longa (ex.: exportação em streaming), então
+# o timeout abaixo só derruba workers realmente travados.
+# Cada conexão SSE (/api/v133/notificacoes/stream) ocupa uma thread e fica
+# limitada a EVENTOS_MAX_CONEXOES por worker (padrão: metade das threads);
+# com muitos painéis abertos use GUNICORN_WORKER_CLASS=gevent (pacote gevent)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
-timeout = 30
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
 keepalive = 2
 
 # Configurações de processo
@@ -67,3 +74,13 @@ def post_fork(server, worker):
 def worker_abort(worker):
     """Executado quando worker é abortado"""
     worker.log.info(f"Worker {worker.pid} abortado")
+
+def worker_exit(server, worker):
+    """Executado no worker ao encerrar: grava a fila de auditoria e encerra as tarefas em segundo plano"""
+    from src.services import auditoria, jobs
+    gravados = auditoria.encerrar()
+    if gravados:
+        worker.log.info(f"Worker {worker.pid}: {gravados} registros de auditoria gravados ao encerrar")
+    interrompidas = jobs.encerrar()
+    if interrompidas:
+        worker.log.info(f"Worker {worker.pid}: {interrompidas} tarefas em segundo plano interrompidas ao encerrar")
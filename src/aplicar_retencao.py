@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Arquiva e remove notificações, histórico de cotações e logs de auditoria
+antigos (políticas em src/services/retencao.py).
+
+Pode rodar com a aplicação no ar: cada lote é excluído em uma transação
+curta. Agendar no crontab, fora do horário de pico, por exemplo:
+
+    30 3 * * * cd /path/to/BRCcSis && venv/bin/python src/aplicar_retencao.py
+
+Uso: python src/aplicar_retencao.py [--simular] [--tabela logs_auditoria] [--lote 500] [--vacuum]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.conexao import url_do_banco
+from src.services import retencao
+from src.verificacao_comum import criar_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--simular', action='store_true', help='apenas conta as linhas vencidas')
+    parser.add_argument('--tabela', action='append', help='tabela a processar (pode repetir; padrão: todas)')
+    parser.add_argument('--lote', type=int, default=retencao.LOTE, help='linhas por transação')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='SQLite: VACUUM ao final (reduz o arquivo, mas bloqueia o banco enquanto roda)')
+    args = parser.parse_args()
+
+    # Banco e perfil SQLite da aplicação
+    app = criar_app(url_do_banco(), perfil=None, login=False)
+    with app.app_context():
+        try:
+            resultado = retencao.executar(args.tabela, simular=args.simular, lote=args.lote, vacuum=args.vacuum)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    acao = 'vencidas' if args.simular else 'arquivadas e removidas'
+    for resumo in resultado['tabelas']:
+        print(f"{resumo['tabela']}: {resumo['arquivadas']} linhas com mais de {resumo['dias']} dias {acao}")
+        for segmento in resumo['segmentos']:
+            print(f"  {segmento}")
+    if resultado['compactacao']:
+        compactacao = resultado['compactacao']
+        print(f"SQLite: {compactacao['paginas_livres_antes']} páginas livres "
+              f"({compactacao['paginas_livres_depois']} após a compactação)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark da manutenção do índice de busca de empresas na importação
+
+Insere em massa (executemany, como a importação) linhas de tipos_carga
+distribuídas entre as empresas e mede o tempo até o commit, primeiro sem o
+índice FTS5 e depois com ele. Em seguida substitui os dados relacionados
+(DELETE ... IN + INSERT, como a reimportação) e confere que a busca pelo
+índice devolve as mesmas empresas que a busca ILIKE nas tabelas de origem.
+
+Uso: python src/benchmark_busca_empresa.py [--linhas 20000] [--empresas 1000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.empresa import Empresa, TipoCarga
+from src.models.busca_empresa import IndiceBuscaEmpresa, TABELA_PENDENTES, _condicao_ilike
+from src.routes.empresa import _excluir_dados_relacionados, _inserir_em_lote
+from src.verificacao_comum import criar_app, relatar
+
+TIPOS = ['Refrigerada', 'Granel sólido', 'Granel líquido', 'Perigosa', 'Frigorificada', 'Carga geral']
+
+
+def popular_empresas(quantidade):
+    db.session.add_all([
+        Empresa(razao_social=f'Transportadora {i}', cnpj=f'{i:014d}', endereco_completo='Rua A')
+        for i in range(quantidade)
+    ])
+    db.session.commit()
+    return [empresa_id for (empresa_id,) in db.session.query(Empresa.id).order_by(Empresa.id)]
+
+
+def linhas_tipos_carga(empresa_ids, quantidade, deslocamento=0):
+    return [
+        {'empresa_id': empresa_ids[i % len(empresa_ids)], 'tipo_carga': TIPOS[(i + deslocamento) % len(TIPOS)]}
+        for i in range(quantidade)
+    ]
+
+
+def inserir(empresa_ids, linhas):
+    inicio = time.perf_counter()
+    _inserir_em_lote(TipoCarga, linhas_tipos_carga(empresa_ids, linhas))
+    db.session.commit()
+    return time.perf_counter() - inicio
+
+
+def ids_busca(termo, indice):
+    if indice:
+        condicao = IndiceBuscaEmpresa.condicao({'tipos_carga': termo})
+    else:
+        condicao = _condicao_ilike('tipos_carga', termo)
+    return {empresa_id for (empresa_id,) in db.session.query(Empresa.id).filter(condicao)}
+
+
+def conferir_busca(falhas, etapa):
+    pendentes = db.session.execute(text(f"SELECT count(*) FROM {TABELA_PENDENTES}")).scalar()
+    if pendentes:
+        falhas.append(f'{etapa}: {pendentes} empresas ainda pendentes de reindexação após o commit')
+    for termo in ('refri', 'granel', 'perig', 'geral'):
+        esperado, obtido = ids_busca(termo, indice=False), ids_busca(termo, indice=True)
+        if esperado != obtido:
+            falhas.append(f'{etapa}: busca "{termo}" pelo índice devolveu {len(obtido)} empresas, '
+                          f'esperado {len(esperado)}')
+
+
+def executar(diretorio, nome, args, indice):
+    app = criar_app(f'sqlite:///{os.path.join(diretorio, nome)}.db', perfil=None, login=False)
+    with app.app_context():
+        db.create_all()
+        IndiceBuscaEmpresa._disponivel = None
+        if indice:
+            IndiceBuscaEmpresa.inicializar()
+        empresa_ids = popular_empresas(args.empresas)
+        falhas = []
+
+        segundos = inserir(empresa_ids, args.linhas)
+        print(f'{args.linhas} tipos_carga {"com" if indice else "sem"} índice FTS5: {segundos:.2f}s')
+        if indice:
+            conferir_busca(falhas, 'inserção')
+
+            # Reimportação: exclui os dados relacionados e grava outra distribuição
+            inicio = time.perf_counter()
+            metade = empresa_ids[: len(empresa_ids) // 2]
+            _excluir_dados_relacionados(metade)
+            _inserir_em_lote(TipoCarga, linhas_tipos_carga(metade, args.linhas // 2, 1))
+            db.session.commit()
+            print(f'  reimportação de metade das empresas: {time.perf_counter() - inicio:.2f}s')
+            conferir_busca(falhas, 'reimportação')
+        db.session.remove()
+        IndiceBuscaEmpresa._disponivel = None
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=20000)
+    parser.add_argument('--empresas', type=int, default=1000)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='benchmark_busca_')
+    try:
+        executar(diretorio, 'sem_indice', args, indice=False)
+        falhas = executar(diretorio, 'com_indice', args, indice=True)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    relatar(falhas, 'índice de busca consistente após a importação em massa')
+
+
+if __name__ == '__main__':
+    main()
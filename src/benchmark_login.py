@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark do login: logins por segundo por núcleo
+
+Simula os workers do gunicorn com processos separados fazendo POST
+/api/auth/login em sequência (usuários alternados, senha correta) sobre o
+mesmo arquivo SQLite. Roda uma vez com as senhas gravadas no método antigo
+(pbkdf2:sha256, 1.000.000 iterações no werkzeug atual) e outra com a
+política de SENHA_HASH_METODO, partindo dos hashes antigos: o primeiro
+login de cada usuário refaz o hash e os seguintes já usam o novo. Informa
+vazão total e por núcleo, latência e commits por login.
+
+Uso: python src/benchmark_login.py [--segundos 10] [--processos N] [--usuarios 8]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('AUDITORIA_ASSINCRONA', 'false')
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db
+from src.models import usuario as modelo_usuario
+from src.models.usuario import TipoUsuario
+from src.routes.auth import auth_bp
+from src.verificacao_comum import criar_app as criar_app_verificacao, criar_usuario, CapturaSQL
+
+METODO_ANTIGO = 'pbkdf2:sha256'
+SENHA = 'benchmark'
+
+
+def criar_app(url):
+    return criar_app_verificacao(url, blueprints=[(auth_bp, None)], perfil='concorrente')
+
+
+def preparar_banco(url, usuarios):
+    app = criar_app(url)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Todos com o hash antigo: o mesmo hash serve para todos (mesma senha)
+        hash_antigo = generate_password_hash(SENHA, method=METODO_ANTIGO, salt_length=16)
+        for i in range(usuarios):
+            criar_usuario(f'usuario{i}', TipoUsuario.OPERADOR, hash_antigo)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def trabalhador(indice, url, metodo, usuarios, inicio, fim, resultados):
+    modelo_usuario.METODO_HASH_SENHA = metodo
+    app = criar_app(url)
+    with app.app_context():
+        engine = db.engine
+    cliente = app.test_client()
+    logins = falhas = 0
+    latencias = []
+    while time.time() < inicio:
+        time.sleep(0.001)
+    i = indice
+    with CapturaSQL(engine) as captura:
+        while time.time() < fim:
+            antes = time.perf_counter()
+            resposta = cliente.post('/api/auth/login', json={'username': f'usuario{i % usuarios}', 'password': SENHA})
+            latencias.append(time.perf_counter() - antes)
+            if resposta.status_code == 200:
+                logins += 1
+            else:
+                falhas += 1
+            i += 1
+    engine.dispose()
+    resultados.put((logins, falhas, captura.commits, latencias))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def executar(nome, metodo, args):
+    diretorio = tempfile.mkdtemp(prefix='brccsis_bench_login_')
+    url = f"sqlite:///{os.path.join(diretorio, 'app.db')}"
+    try:
+        preparar_banco(url, args.usuarios)
+        resultados = multiprocessing.Queue()
+        inicio = time.time() + 1
+        fim = inicio + args.segundos
+        processos = [
+            multiprocessing.Process(target=trabalhador,
+                                    args=(i, url, metodo, args.usuarios, inicio, fim, resultados))
+            for i in range(args.processos)
+        ]
+        for processo in processos:
+            processo.start()
+        coletados = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    logins = sum(c[0] for c in coletados)
+    falhas = sum(c[1] for c in coletados)
+    commits = sum(c[2] for c in coletados)
+    latencias = [l for c in coletados for l in c[3]]
+    nucleos = min(args.processos, os.cpu_count() or 1)
+    por_segundo = logins / args.segundos
+    print(f"{nome:<10} {metodo:<22} {por_segundo:8.1f} {por_segundo / nucleos:9.1f} "
+          f"{percentil(latencias, 0.5) * 1000:8.0f} {percentil(latencias, 0.95) * 1000:8.0f} "
+          f"{commits / max(logins + falhas, 1):8.2f} {falhas:6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--usuarios', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.processos} processos, {os.cpu_count()} núcleos, {args.segundos:.0f}s por cenário\n")
+    print(f"{'cenário':<10} {'método':<22} {'login/s':>8} {'/núcleo':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'commits':>8} {'falhas':>6}")
+    executar('antigo', METODO_ANTIGO, args)
+    executar('política', modelo_usuario.METODO_HASH_SENHA, args)
+
+
+if __name__ == '__main__':
+    main()
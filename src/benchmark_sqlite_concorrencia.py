@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concorrência do SQLite: leituras com escritas simultâneas
+
+Simula os workers do gunicorn com processos separados sobre o mesmo arquivo:
+leitores listando cotações (mesma forma de /api/v133/cotacoes/disponiveis)
+e escritores gravando LogAuditoria com um commit por registro (como o login
+e cada alteração). Roda uma vez por perfil de models/perfil_sqlite.py e
+compara vazão de leitura/escrita e erros "database is locked".
+
+Uso: python src/benchmark_sqlite_concorrencia.py [--segundos 10] [--leitores 4] [--escritores 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.exc import OperationalError
+
+from src.models import db
+from src.models.cotacao import Cotacao, StatusCotacao, EmpresaCotacao
+from src.models.usuario import Usuario, TipoUsuario
+from src.models.perfil_sqlite import PERFIS, configurar_engine
+
+CONSULTA_LEITURA = text("""
+    SELECT id, numero_cotacao, cliente_nome, status, created_at
+    FROM cotacoes WHERE status = 'SOLICITADA'
+    ORDER BY created_at DESC, id DESC LIMIT 20
+""")
+ESCRITA = text("""
+    INSERT INTO logs_auditoria (usuario_id, acao, recurso, detalhes, timestamp)
+    VALUES (1, 'login', 'usuario', 'benchmark', :momento)
+""")
+
+
+def preparar_banco(caminho, total_cotacoes):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{caminho}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        admin = Usuario(username='admin', email='admin@exemplo.com', nome_completo='Admin',
+                        tipo_usuario=TipoUsuario.ADMINISTRADOR)
+        admin.set_password('benchmark')
+        db.session.add(admin)
+        db.session.flush()
+        inicio = datetime(2024, 1, 1)
+        status = list(StatusCotacao)
+        db.session.execute(insert(Cotacao), [
+            dict(
+                numero_cotacao=f'BEN{i:07d}', consultor_id=admin.id,
+                empresa_transporte=EmpresaCotacao.BRCARGO_RODOVIARIO, status=status[i % len(status)],
+                created_at=inicio + timedelta(minutes=i), updated_at=inicio + timedelta(minutes=i),
+                cliente_nome=f'Cliente {i}', cliente_cnpj='00000000000000',
+                origem_cep='00000-000', origem_endereco='Rua A', origem_cidade='Santos', origem_estado='SP',
+                destino_cep='00000-000', destino_endereco='Rua B', destino_cidade='Curitiba', destino_estado='PR',
+                carga_descricao='Carga', carga_peso_kg=10
+            )
+            for i in range(total_cotacoes)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def trabalhador(papel, caminho, perfil, inicio, fim, resultados):
+    engine = create_engine(f'sqlite:///{caminho}')
+    configurar_engine(engine, perfil)
+    operacoes = bloqueios = 0
+    latencias = []
+    while time.time() < inicio:
+        time.sleep(0.001)
+    while time.time() < fim:
+        antes = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if papel == 'leitor':
+                    conn.execute(CONSULTA_LEITURA).fetchall()
+                else:
+                    conn.execute(ESCRITA, {'momento': datetime.now()})
+            operacoes += 1
+            latencias.append(time.perf_counter() - antes)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            bloqueios += 1
+    engine.dispose()
+    resultados.put((papel, operacoes, bloqueios, latencias))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def executar(perfil, args):
+    diretorio = tempfile.mkdtemp(prefix='brccsis_bench_')
+    caminho = os.path.join(diretorio, 'app.db')
+    try:
+        preparar_banco(caminho, args.cotacoes)
+        resultados = multiprocessing.Queue()
+        inicio = time.time() + 1
+        fim = inicio + args.segundos
+        processos = [
+            multiprocessing.Process(target=trabalhador, args=(papel, caminho, perfil, inicio, fim, resultados))
+            for papel in ['leitor'] * args.leitores + ['escritor'] * args.escritores
+        ]
+        for processo in processos:
+            processo.start()
+        coletados = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    resumo = {}
+    for papel in ('leitor', 'escritor'):
+        linhas = [r for r in coletados if r[0] == papel]
+        latencias = [l for r in linhas for l in r[3]]
+        resumo[papel] = {
+            'por_segundo': sum(r[1] for r in linhas) / args.segundos,
+            'bloqueios': sum(r[2] for r in linhas),
+            'p99_ms': percentil(latencias, 0.99) * 1000,
+        }
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--cotacoes', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f'{args.leitores} leitores, {args.escritores} escritores, {args.segundos:.0f}s por perfil, '
+          f'{args.cotacoes} cotações\n')
+    print(f'{"perfil":<12} {"leituras/s":>11} {"p99 leit.":>10} {"escritas/s":>11} {"p99 escr.":>10} {"locked":>7}')
+    for perfil in PERFIS:
+        r = executar(perfil, args)
+        print(f'{perfil:<12} {r["leitor"]["por_segundo"]:>11.0f} {r["leitor"]["p99_ms"]:>8.1f}ms '
+              f'{r["escritor"]["por_segundo"]:>11.0f} {r["escritor"]["p99_ms"]:>8.1f}ms '
+              f'{r["leitor"]["bloqueios"] + r["escritor"]["bloqueios"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
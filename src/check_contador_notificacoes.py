@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Verifica o contador de notificações não lidas mantido em usuarios.
+
+Cria um banco SQLite em memória, percorre o fluxo de uma cotação (criação
+com aviso a todos os operadores, aceite, marcar uma, marcar de novo, marcar
+todas) e, após cada passo, confere que o contador de cada usuário bate com
+um COUNT na tabela notificacoes. Confere também que a listagem de
+notificações informa o total de não lidas e o número de cada cotação com
+um número fixo de SELECTs (sem carregar a cotação de cada linha).
+
+Uso: python src/check_contador_notificacoes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+
+from src.models import db
+from src.models.usuario import Usuario, TipoUsuario
+from src.models.cotacao import Cotacao
+from src.models.notificacao import Notificacao
+from src.routes.cotacao_v133 import cotacao_v133_bp
+from src.verificacao_comum import (criar_app, autenticar, criar_usuario, criar_operadores, dados_cotacao,
+                                   CapturaSQL, relatar)
+
+OPERADORES = 5
+COTACOES_LISTAGEM = 30
+
+
+def popular():
+    consultor = criar_usuario('consultor', TipoUsuario.CONSULTOR)
+    operadores = criar_operadores(OPERADORES, consultor.password_hash)
+    db.session.commit()
+    return consultor.id, [o.id for o in operadores]
+
+
+def divergencias():
+    """Usuários cujo contador difere do COUNT real"""
+    reais = dict(db.session.execute(
+        select(Notificacao.usuario_id, func.count()).where(Notificacao.lida.is_(False))
+        .group_by(Notificacao.usuario_id)
+    ).all())
+    contadores = dict(db.session.execute(select(Usuario.id, Usuario.notificacoes_nao_lidas)).all())
+    return {u: (c, reais.get(u, 0)) for u, c in contadores.items() if c != reais.get(u, 0)}
+
+
+def main():
+    app = criar_app(blueprints=[(cotacao_v133_bp, '/api/v133')])
+    falhas = []
+
+    with app.app_context():
+        db.create_all()
+        consultor_id, operadores = popular()
+
+    def conferir(passo):
+        with app.app_context():
+            erradas = divergencias()
+            db.session.remove()
+        if erradas:
+            falhas.append(f'{passo}: contador x COUNT divergentes {erradas}')
+        else:
+            print(f'{passo}: contadores corretos')
+
+    def cliente(usuario_id):
+        return autenticar(app.test_client(), usuario_id)
+
+    with app.app_context():
+        cotacao = Cotacao.criar_cotacao(dados_cotacao(), consultor_id)
+        cotacao_id = cotacao.id
+        db.session.remove()
+    conferir('criação (aviso aos operadores)')
+
+    resposta = cliente(operadores[0]).post(f'/api/v133/cotacoes/{cotacao_id}/aceitar-operador', json={})
+    if resposta.status_code != 200:
+        falhas.append(f'aceitar retornou {resposta.status_code}: {resposta.get_json()}')
+    conferir('aceite (aviso ao consultor)')
+
+    with app.app_context():
+        notificacao_id = db.session.scalar(
+            select(Notificacao.id).where(Notificacao.usuario_id == operadores[1])
+        )
+        db.session.remove()
+    operador = cliente(operadores[1])
+    for tentativa in ('marcar uma como lida', 'marcar a mesma de novo'):
+        resposta = operador.post(f'/api/v133/notificacoes/{notificacao_id}/marcar-lida')
+        if resposta.status_code != 200:
+            falhas.append(f'{tentativa} retornou {resposta.status_code}')
+        conferir(tentativa)
+    resposta = operador.post('/api/v133/notificacoes/999999/marcar-lida')
+    if resposta.status_code != 404:
+        falhas.append(f'marcar notificação inexistente retornou {resposta.status_code}, esperado 404')
+
+    resposta = cliente(operadores[2]).post('/api/v133/notificacoes/marcar-todas-lidas')
+    if resposta.status_code != 200:
+        falhas.append(f'marcar todas retornou {resposta.status_code}')
+    conferir('marcar todas como lidas')
+
+    # Listagem: mais cotações para o operador ter várias notificações, cada uma de uma cotação
+    with app.app_context():
+        for i in range(COTACOES_LISTAGEM):
+            Cotacao.criar_cotacao(dados_cotacao(cliente_nome=f'Cliente {i}'), consultor_id)
+        db.session.remove()
+    conferir('criação de mais cotações')
+
+    # O total vem do usuário já carregado pelo login e o número da cotação vem
+    # no mesmo SELECT da listagem: user_loader + listagem, qualquer que seja o tamanho
+    with app.app_context():
+        with CapturaSQL(db.engine) as captura:
+            resposta = cliente(operadores[3]).get('/api/v133/notificacoes')
+        dados = resposta.get_json()
+        consultas = captura.selects
+        em_notificacoes = [sql for sql in consultas if 'FROM notificacoes' in sql]
+        print(f"listagem: {len(dados['notificacoes'])} notificações, {len(consultas)} SELECTs, "
+              f"{len(em_notificacoes)} em notificacoes")
+        if dados.get('total_nao_lidas') != COTACOES_LISTAGEM + 1:
+            falhas.append(f"listagem informou {dados.get('total_nao_lidas')} não lidas, "
+                          f"esperado {COTACOES_LISTAGEM + 1}")
+        if len(em_notificacoes) != 1:
+            falhas.append(f'listagem consultou notificacoes {len(em_notificacoes)} vezes, esperado 1')
+        if len(consultas) != 2:
+            falhas.append(f'listagem executou {len(consultas)} SELECTs, esperado 2 (usuário + listagem)')
+        if any(n['cotacao_numero'] is None for n in dados['notificacoes']):
+            falhas.append('listagem sem o número da cotação')
+
+        # Reconstrução a partir da tabela (inicialização) mantém os valores
+        db.session.execute(db.update(Usuario).values(notificacoes_nao_lidas=42))
+        db.session.commit()
+        Usuario.recalcular_notificacoes_nao_lidas()
+        if divergencias():
+            falhas.append(f'recalcular_notificacoes_nao_lidas deixou divergências {divergencias()}')
+        db.session.remove()
+
+    relatar(falhas, 'contador de não lidas consistente em todo o fluxo')
+
+
+if __name__ == '__main__':
+    main()
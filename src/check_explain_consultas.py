@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Verifica, com EXPLAIN QUERY PLAN, que as rotas mais usadas não fazem
+varredura completa das tabelas grandes.
+
+Cria um banco SQLite em memória com os índices declarados nos modelos,
+chama as rotas de listagem de cotações, notificações, histórico, logs e
+painéis, captura os SELECTs executados e falha se algum plano tiver
+"SCAN <tabela>" sem índice em cotacoes, notificacoes, historico_cotacoes ou
+logs_auditoria. Ordenações em B-tree temporária são apenas informadas.
+
+Uso: python src/check_explain_consultas.py
+"""
+
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.usuario import TipoUsuario, LogAuditoria
+from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, EmpresaCotacao
+from src.models.notificacao import Notificacao, TipoNotificacao
+from src.models.empresa import Empresa
+from src.routes.auth import auth_bp
+from src.routes.cotacao import cotacao_bp
+from src.routes.cotacao_v133 import cotacao_v133_bp
+from src.routes.dashboard_v133 import dashboard_v133_bp
+from src.services.paginacao import codificar_cursor
+from src.verificacao_comum import criar_app, autenticar, criar_usuarios_por_tipo, dados_cotacao, CapturaSQL, relatar
+
+TABELAS_GRANDES = ('cotacoes', 'notificacoes', 'historico_cotacoes', 'logs_auditoria')
+VARREDURA = re.compile(r'\bSCAN (%s)\b(?! USING)' % '|'.join(TABELAS_GRANDES))
+
+
+def popular():
+    usuarios = criar_usuarios_por_tipo()
+    empresa = Empresa(razao_social='Transportadora', cnpj='00000000000191', endereco_completo='Rua A')
+    db.session.add(empresa)
+    db.session.flush()
+
+    inicio = datetime(2024, 1, 1)
+    status = list(StatusCotacao)
+    modalidades = list(EmpresaCotacao)
+    for i in range(200):
+        momento = inicio + timedelta(hours=i)
+        cotacao = Cotacao(**dados_cotacao(
+            numero_cotacao=f'EXP{i:06d}',
+            consultor_id=usuarios[TipoUsuario.CONSULTOR].id,
+            operador_id=usuarios[TipoUsuario.OPERADOR].id if i % 3 else None,
+            data_aceite_operador=momento if i % 3 else None,
+            empresa_prestadora_id=empresa.id if i % 2 else None,
+            empresa_transporte=modalidades[i % len(modalidades)], status=status[i % len(status)],
+            data_solicitacao=momento, created_at=momento, updated_at=momento, cliente_nome=f'Cliente {i}'
+        ))
+        db.session.add(cotacao)
+        db.session.flush()
+        db.session.add(HistoricoCotacao(cotacao_id=cotacao.id, usuario_id=cotacao.consultor_id,
+                                        status_novo=StatusCotacao.SOLICITADA, timestamp=momento))
+        db.session.add(Notificacao(usuario_id=usuarios[TipoUsuario.OPERADOR].id, cotacao_id=cotacao.id,
+                                   tipo=TipoNotificacao.NOVA_COTACAO, titulo='Nova', mensagem='Nova',
+                                   lida=bool(i % 2), created_at=momento))
+        db.session.add(LogAuditoria(usuario_id=usuarios[TipoUsuario.ADMINISTRADOR].id, acao='check',
+                                    recurso='cotacao', timestamp=momento))
+    db.session.commit()
+    return {tipo: usuario.id for tipo, usuario in usuarios.items()}, empresa.id
+
+
+def rotas(usuarios, empresa_id):
+    """(tipo do usuário logado, url) das rotas verificadas"""
+    admin, operador, consultor = (TipoUsuario.ADMINISTRADOR, TipoUsuario.OPERADOR, TipoUsuario.CONSULTOR)
+    cursor = codificar_cursor(datetime(2024, 1, 3), 50)
+    return [
+        # Sem filtro, o COUNT(*) da paginação por página lê a tabela inteira por
+        # definição; a lista sem filtro é verificada no modo cursor
+        (admin, '/api/cotacoes?status=solicitada'),
+        (consultor, '/api/cotacoes'),
+        (admin, f'/api/cotacoes?limite=20&cursor={cursor}'),
+        (consultor, f'/api/cotacoes?limite=20&cursor={cursor}'),
+        (admin, '/api/cotacoes/1'),
+        (operador, f'/api/v133/cotacoes/disponiveis?limite=20&cursor={cursor}'),
+        (operador, f'/api/v133/cotacoes/minhas-operacoes?limite=20&cursor={cursor}'),
+        (consultor, f'/api/v133/cotacoes/minhas-solicitacoes?limite=20&cursor={cursor}'),
+        (admin, f'/api/v133/cotacoes/minhas-solicitacoes?limite=20&cursor={cursor}'),
+        (admin, f'/api/v133/cotacoes/rodoviarias?limite=20&cursor={cursor}'),
+        (admin, f'/api/v133/cotacoes/maritimas?limite=20&cursor={cursor}'),
+        (admin, f'/api/v133/cotacoes/aereas?limite=20&cursor={cursor}'),
+        (admin, '/api/v133/cotacoes/1/historico'),
+        (operador, '/api/v133/notificacoes'),
+        (operador, '/api/v133/notificacoes?apenas_nao_lidas=true'),
+        (admin, f'/api/auth/logs?limite=20&cursor={cursor}'),
+        (admin, f'/api/v133/analytics/empresas/{empresa_id}/metricas'),
+        (admin, '/api/v133/analytics/sistema/geral'),
+    ]
+
+
+def capturar(app, cliente, url, usuario_id):
+    """Executa a rota e retorna os SELECTs (sql, parâmetros) emitidos"""
+    autenticar(cliente, usuario_id)
+    with app.app_context():
+        engine = db.engine
+    with CapturaSQL(engine) as captura:
+        cliente.get(url)
+    return captura.com_prefixo('SELECT')
+
+
+def main():
+    app = criar_app('sqlite://', blueprints=[(auth_bp, None), (cotacao_bp, '/api'), (cotacao_v133_bp, '/api/v133'),
+                                             (dashboard_v133_bp, '/api/v133')])
+    with app.app_context():
+        db.create_all()
+        usuarios, empresa_id = popular()
+
+    falhas = []
+    cliente = app.test_client()
+    for tipo, url in rotas(usuarios, empresa_id):
+        selects = capturar(app, cliente, url, usuarios[tipo])
+        with app.app_context():
+            conexao = db.session.connection().connection.driver_connection
+            for sql, parametros in selects:
+                plano = [linha[3] for linha in conexao.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)]
+                varreduras = [passo for passo in plano if VARREDURA.search(passo)]
+                temporarias = [passo for passo in plano if 'TEMP B-TREE' in passo]
+                if varreduras:
+                    falhas.append(f'{url} ({tipo.value}): {"; ".join(varreduras)}\n      {sql.split(chr(10))[0][:150]}')
+                if temporarias and any(t in sql for t in TABELAS_GRANDES):
+                    print(f'  info {url}: {"; ".join(temporarias)}')
+        print(f'{url} ({tipo.value}): {len(selects)} SELECTs verificados')
+
+    relatar(falhas, 'nenhuma rota verificada faz varredura completa das tabelas grandes')
+
+
+if __name__ == '__main__':
+    main()
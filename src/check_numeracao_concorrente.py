@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse da numeração de cotações com vários processos.
+
+Simula os workers do gunicorn: cada processo cria cotações pelo ORM (uma
+transação por cotação, número gerado por Cotacao.gerar_numero_cotacao) ao
+mesmo tempo que os outros, sem nenhuma nova tentativa em caso de erro. No
+fim confere que nenhuma criação falhou, que não há números repetidos e que
+a sequência do dia é contínua, começando depois das cotações que já
+existiam antes do contador.
+
+Usa um arquivo SQLite temporário com o perfil 'concorrente' (ou o banco de
+TEST_DATABASE_URL, que é apagado e recriado).
+
+Uso: python src/check_numeracao_concorrente.py [--processos 8] [--cotacoes 500]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.cotacao import Cotacao
+from src.models.usuario import TipoUsuario
+from src.verificacao_comum import criar_app, criar_usuario, dados_cotacao, relatar
+
+# Cotações do dia gravadas antes de existir o contador (numeração antiga)
+EXISTENTES = 7
+
+
+def preparar_banco(url, hoje):
+    app = criar_app(url, perfil='concorrente', login=False)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        consultor = criar_usuario('consultor', TipoUsuario.CONSULTOR)
+        db.session.flush()
+        for i in range(1, EXISTENTES + 1):
+            db.session.add(Cotacao(**dados_cotacao(numero_cotacao=f'COT-{hoje}-{i:04d}', consultor_id=consultor.id,
+                                                   cliente_nome='Antiga')))
+        db.session.commit()
+        consultor_id = consultor.id
+        db.engine.dispose()
+    return consultor_id
+
+
+def trabalhador(indice, url, consultor_id, quantidade, inicio, resultados):
+    app = criar_app(url, perfil='concorrente', login=False)
+    erros = []
+    with app.app_context():
+        while time.time() < inicio:
+            time.sleep(0.001)
+        for i in range(quantidade):
+            try:
+                db.session.add(Cotacao(**dados_cotacao(consultor_id=consultor_id,
+                                                       cliente_nome=f'Processo {indice} #{i}')))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                erros.append(f'{type(e).__name__}: {str(e).splitlines()[0]}')
+        db.engine.dispose()
+    resultados.put((indice, erros))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--cotacoes', type=int, default=500, help='cotações por processo')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='brccsis_numeracao_')
+    url = os.getenv('TEST_DATABASE_URL', f"sqlite:///{os.path.join(diretorio, 'app.db')}")
+    hoje = datetime.now().strftime('%Y%m%d')
+    falhas = []
+    try:
+        consultor_id = preparar_banco(url, hoje)
+
+        resultados = multiprocessing.Queue()
+        inicio = time.time() + 1
+        processos = [
+            multiprocessing.Process(target=trabalhador,
+                                    args=(i, url, consultor_id, args.cotacoes, inicio, resultados))
+            for i in range(args.processos)
+        ]
+        for processo in processos:
+            processo.start()
+        coletados = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+        duracao = time.time() - inicio
+
+        for indice, erros in sorted(coletados):
+            if erros:
+                falhas.append(f'processo {indice}: {len(erros)} criações falharam (ex.: {erros[0]})')
+
+        app = criar_app(url, perfil='concorrente', login=False)
+        with app.app_context():
+            numeros = db.session.scalars(
+                db.select(Cotacao.numero_cotacao).where(Cotacao.cliente_nome != 'Antiga')
+            ).all()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    total = args.processos * args.cotacoes
+    esperados = {f'COT-{hoje}-{seq:04d}' for seq in range(EXISTENTES + 1, EXISTENTES + total + 1)}
+    print(f'{args.processos} processos x {args.cotacoes} cotações: {len(numeros)} criadas em {duracao:.1f}s '
+          f'({len(numeros) / duracao:.0f}/s)')
+
+    if len(numeros) != total:
+        falhas.append(f'{len(numeros)} cotações gravadas, esperado {total}')
+    if len(set(numeros)) != len(numeros):
+        falhas.append(f'{len(numeros) - len(set(numeros))} números repetidos')
+    if set(numeros) != esperados:
+        faltando = sorted(esperados - set(numeros))
+        falhas.append(f'sequência com falhas ou fora do esperado (ex.: faltando {faltando[:3]})')
+
+    relatar(falhas, f'{total} números únicos e contínuos (COT-{hoje}-{EXISTENTES + 1:04d} em diante), sem colisões')
+
+
+if __name__ == '__main__':
+    main()
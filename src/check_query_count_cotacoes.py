@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Verifica quantas consultas as listas de cotações executam.
+
+Cria um banco SQLite em memória com vários consultores e operadores e
+confere, para cada endpoint de lista, que os nomes de consultor/operador
+vêm no mesmo SELECT das cotações (sem um SELECT de usuário por linha) e que
+o resultado é igual ao de Cotacao.to_dict() com os relacionamentos.
+
+Uso: python src/check_query_count_cotacoes.py
+"""
+
+import os
+import sys
+from itertools import cycle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.usuario import TipoUsuario
+from src.models.cotacao import Cotacao, StatusCotacao, EmpresaCotacao
+from src.routes.cotacao import cotacao_bp
+from src.routes.cotacao_v133 import cotacao_v133_bp
+from src.verificacao_comum import (criar_app, autenticar, criar_usuario, criar_usuarios_por_tipo, dados_cotacao,
+                                   CapturaSQL, relatar)
+
+TOTAL_COTACOES = 300
+
+# (url, tipo do usuário logado, SELECTs esperados além do carregamento do usuário logado)
+ENDPOINTS = [
+    ('/api/v133/cotacoes/disponiveis', TipoUsuario.OPERADOR, 1),
+    ('/api/v133/cotacoes/minhas-operacoes', TipoUsuario.OPERADOR, 1),
+    ('/api/v133/cotacoes/minhas-operacoes', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/v133/cotacoes/minhas-solicitacoes', TipoUsuario.CONSULTOR, 1),
+    ('/api/v133/cotacoes/minhas-solicitacoes', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/v133/cotacoes/rodoviarias', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/v133/cotacoes/maritimas', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/v133/cotacoes/aereas', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/cotacoes?per_page=100', TipoUsuario.ADMINISTRADOR, 2),  # página + COUNT
+    # Paginação por cursor: uma consulta por página, sem COUNT
+    ('/api/v133/cotacoes/minhas-solicitacoes?limite=50', TipoUsuario.ADMINISTRADOR, 1),
+    ('/api/cotacoes?limite=50', TipoUsuario.ADMINISTRADOR, 1),
+]
+
+
+def popular():
+    usuarios = criar_usuarios_por_tipo()
+    senha = usuarios[TipoUsuario.CONSULTOR].password_hash
+    consultores = [usuarios[TipoUsuario.CONSULTOR]] + [criar_usuario(f'consultor{i}', TipoUsuario.CONSULTOR, senha)
+                                                      for i in range(5)]
+    operadores = [usuarios[TipoUsuario.OPERADOR]] + [criar_usuario(f'operador{i}', TipoUsuario.OPERADOR, senha)
+                                                    for i in range(4)]
+    db.session.flush()
+
+    status = cycle(StatusCotacao)
+    empresas = cycle(EmpresaCotacao)
+    for i in range(TOTAL_COTACOES):
+        st = next(status)
+        db.session.add(Cotacao(**dados_cotacao(
+            numero_cotacao=f'CHK{i:06d}',
+            consultor_id=consultores[i % len(consultores)].id,
+            operador_id=None if st == StatusCotacao.SOLICITADA else operadores[i % len(operadores)].id,
+            empresa_transporte=next(empresas), status=st, cliente_nome=f'Cliente {i}'
+        )))
+    db.session.commit()
+    return {tipo: usuario.id for tipo, usuario in usuarios.items()}
+
+
+def requisitar(app, cliente, url, usuario_id):
+    autenticar(cliente, usuario_id)
+    with app.app_context():
+        engine = db.engine
+    with CapturaSQL(engine) as captura:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200, f'{url}: {resposta.status_code} {resposta.get_data(as_text=True)}'
+    # O primeiro SELECT é o do user_loader do Flask-Login
+    return len(captura.selects) - 1, resposta.get_json()['cotacoes']
+
+
+def main():
+    app = criar_app(blueprints=[(cotacao_bp, '/api'), (cotacao_v133_bp, '/api/v133')])
+    falhas = []
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        usuarios = popular()
+        db.session.remove()
+
+        esperado_completo = {c.id: c.to_dict() for c in Cotacao.query.all()}
+        db.session.remove()
+
+    # Cada requisição com o seu próprio app context (o Flask-Login guarda o usuário em g)
+    cliente = app.test_client()
+    for url, tipo, esperado in ENDPOINTS:
+        total, cotacoes = requisitar(app, cliente, url, usuarios[tipo])
+        print(f'{url} ({tipo.value}): {len(cotacoes)} cotações, {total} SELECTs (esperado {esperado})')
+        if not cotacoes:
+            falhas.append(f'{url} ({tipo.value}): lista vazia')
+        if total != esperado:
+            falhas.append(f'{url} ({tipo.value}): {total} SELECTs')
+        diferentes = [c['id'] for c in cotacoes if c != esperado_completo[c['id']]]
+        if diferentes:
+            falhas.append(f'{url} ({tipo.value}): serialização diferente nas cotações {diferentes[:5]}')
+
+    relatar(falhas, 'listas de cotações sem consultas por linha')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Verifica quantas consultas o detalhe e a exportação de empresas executam.
+
+Cria um banco SQLite em memória com empresas que possuem registros nos 14
+tipos de dados relacionados e confere que GET /api/empresas/<id> e a
+exportação usam um número fixo de SELECTs (1 de empresas + 1 por
+relacionamento), sem carregamento preguiçoso por coleção ou por empresa.
+
+Uso: python src/check_query_count_empresa.py
+"""
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.empresa import (
+    Empresa, Regulamentacao, Certificacao, ModalidadeTransporte,
+    TipoCarga, AbrangenciaGeografica, Frota, Armazenagem, PortoTerminal,
+    SeguroCobertura, Tecnologia, DesempenhoQualidade, ClienteSegmento,
+    RecursoHumano, Sustentabilidade
+)
+from src.routes.empresa import empresa_bp
+import src.routes.empresa as rotas_empresa
+from src.verificacao_comum import criar_app, CapturaSQL, relatar
+
+RELACIONAMENTOS = len(Empresa.RELACIONAMENTOS_COMPLETOS)
+
+
+def criar_empresa(indice, linhas_por_tipo):
+    empresa = Empresa(
+        razao_social=f'Empresa {indice}', cnpj=f'{indice:014d}',
+        endereco_completo='Av. Exemplo, 100 - Santos/SP'
+    )
+    for n in range(linhas_por_tipo):
+        empresa.regulamentacoes.append(Regulamentacao(tipo_regulamentacao='RNTRC', numero_registro=str(n)))
+        empresa.certificacoes.append(Certificacao(nome_certificacao=f'ISO {n}', data_emissao=date(2020, 1, 1)))
+        empresa.modalidades_transporte.append(ModalidadeTransporte(modalidade=f'Modal {n}'))
+        empresa.tipos_carga.append(TipoCarga(tipo_carga=f'Carga {n}'))
+        empresa.abrangencia_geografica.append(AbrangenciaGeografica(tipo_abrangencia='Regional', detalhes=f'{n}'))
+        empresa.frota.append(Frota(tipo_frota='Própria', quantidade=n))
+        empresa.armazenagem.append(Armazenagem(possui_armazem=True, localizacao=f'Galpão {n}'))
+        empresa.portos_terminais.append(PortoTerminal(nome_porto_terminal=f'Porto {n}', tipo_terminal='Marítimo'))
+        empresa.seguros_coberturas.append(SeguroCobertura(tipo_seguro='RCTR-C', seguradora=f'Seguradora {n}'))
+        empresa.tecnologias.append(Tecnologia(nome_tecnologia=f'TMS {n}'))
+        empresa.desempenho_qualidade.append(DesempenhoQualidade(prazo_medio_atendimento=str(n)))
+        empresa.clientes_segmentos.append(ClienteSegmento(segmento=f'Segmento {n}'))
+        empresa.recursos_humanos.append(RecursoHumano(numero_funcionarios=n))
+        empresa.sustentabilidade.append(Sustentabilidade(certificacao_ambiental=f'ISO 14001 {n}'))
+    db.session.add(empresa)
+    return empresa
+
+
+def contar_selects(cliente, url):
+    with CapturaSQL(db.engine) as captura:
+        resposta = cliente.get(url)
+        resposta.get_data()  # Consumir respostas em streaming dentro da contagem
+    assert resposta.status_code == 200, resposta.get_data(as_text=True)
+    return len(captura.selects), resposta
+
+
+def main():
+    app = criar_app(blueprints=[(empresa_bp, '/api')])
+    falhas = []
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        empresas = [criar_empresa(i + 1, linhas_por_tipo=1 if i == 0 else 5) for i in range(30)]
+        db.session.commit()
+        ids = [empresa.id for empresa in empresas]
+        db.session.remove()
+
+        cliente = app.test_client()
+
+        # Detalhe: mesma quantidade de consultas com 1 ou 5 linhas por relacionamento
+        esperado = 1 + RELACIONAMENTOS
+        for empresa_id in (ids[0], ids[1]):
+            total, resposta = contar_selects(cliente, f'/api/empresas/{empresa_id}')
+            db.session.remove()
+            dados = resposta.get_json()
+            vazios = [nome for nome in Empresa.RELACIONAMENTOS_COMPLETOS if not dados[nome]]
+            print(f'GET /api/empresas/{empresa_id}: {total} SELECTs (esperado {esperado})')
+            if total != esperado:
+                falhas.append(f'detalhe da empresa {empresa_id}: {total} SELECTs')
+            if vazios:
+                falhas.append(f'detalhe da empresa {empresa_id} sem dados em: {", ".join(vazios)}')
+
+        # Exportação: 1 contagem + (1 + relacionamentos) por lote, não por empresa
+        lotes = -(-len(ids) // rotas_empresa.LOTE_EXPORTACAO)
+        esperado = 1 + (lotes + 1) + lotes * RELACIONAMENTOS  # +1: consulta final que encerra a paginação
+        total, _ = contar_selects(cliente, '/api/empresas/export?formato=ndjson')
+        db.session.remove()
+        print(f'GET /api/empresas/export ({len(ids)} empresas, {lotes} lotes): {total} SELECTs (esperado {esperado})')
+        if total != esperado:
+            falhas.append(f'exportação: {total} SELECTs')
+
+    relatar(falhas, 'número de consultas fixo por relacionamento')
+
+
+if __name__ == '__main__':
+    main()
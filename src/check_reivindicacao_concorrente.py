@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse da aceitação de cotações por vários operadores ao mesmo tempo.
+
+Cada processo simula um operador percorrendo a fila de cotações
+disponíveis (em ordem embaralhada) e aceitando todas com
+Cotacao.aceitar_por_operador, sem novas tentativas. No fim confere que
+cada cotação foi aceita por exatamente um operador (o que recebeu
+sucesso), que os demais receberam CotacaoIndisponivelError, que há um
+único registro de histórico e de notificação por cotação e que os
+contadores materializados batem com uma reconstrução completa.
+
+Usa um arquivo SQLite temporário com o perfil 'concorrente' (ou o banco de
+TEST_DATABASE_URL, que é apagado e recriado).
+
+Uso: python src/check_reivindicacao_concorrente.py [--operadores 8] [--cotacoes 300]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from src.models import db
+from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, CotacaoIndisponivelError
+from src.models.estatistica_cotacao import EstatisticaCotacao
+from src.models.notificacao import Notificacao
+from src.models.usuario import TipoUsuario
+from src.verificacao_comum import criar_app, criar_usuario, criar_operadores, dados_cotacao, relatar
+
+
+def preparar_banco(url, operadores, cotacoes):
+    app = criar_app(url, perfil='concorrente', login=False)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        consultor = criar_usuario('consultor', TipoUsuario.CONSULTOR)
+        ids_operadores = [operador.id for operador in criar_operadores(operadores, consultor.password_hash)]
+        db.session.execute(insert(Cotacao), [
+            dados_cotacao(numero_cotacao=f'REI{i:06d}', consultor_id=consultor.id, status=StatusCotacao.SOLICITADA,
+                          cliente_nome=f'Cliente {i}')
+            for i in range(cotacoes)
+        ])
+        db.session.commit()
+        EstatisticaCotacao.reconstruir()
+        ids_cotacoes = db.session.scalars(db.select(Cotacao.id)).all()
+        db.engine.dispose()
+    return ids_operadores, ids_cotacoes
+
+
+def trabalhador(operador_id, url, ids_cotacoes, inicio, resultados):
+    app = criar_app(url, perfil='concorrente', login=False)
+    ganhas, perdidas, erros = [], 0, []
+    ordem = list(ids_cotacoes)
+    random.Random(operador_id).shuffle(ordem)
+    with app.app_context():
+        while time.time() < inicio:
+            time.sleep(0.001)
+        for cotacao_id in ordem:
+            try:
+                cotacao = db.session.get(Cotacao, cotacao_id, populate_existing=True)
+                cotacao.aceitar_por_operador(operador_id)
+                ganhas.append(cotacao_id)
+            except CotacaoIndisponivelError:
+                perdidas += 1
+            except Exception as e:
+                db.session.rollback()
+                erros.append(f'{type(e).__name__}: {str(e).splitlines()[0]}')
+            finally:
+                db.session.remove()
+        db.engine.dispose()
+    resultados.put((operador_id, ganhas, perdidas, erros))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--operadores', type=int, default=8)
+    parser.add_argument('--cotacoes', type=int, default=300)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='brccsis_reivindicacao_')
+    url = os.getenv('TEST_DATABASE_URL', f"sqlite:///{os.path.join(diretorio, 'app.db')}")
+    falhas = []
+    try:
+        ids_operadores, ids_cotacoes = preparar_banco(url, args.operadores, args.cotacoes)
+
+        resultados = multiprocessing.Queue()
+        inicio = time.time() + 1
+        processos = [
+            multiprocessing.Process(target=trabalhador, args=(operador_id, url, ids_cotacoes, inicio, resultados))
+            for operador_id in ids_operadores
+        ]
+        for processo in processos:
+            processo.start()
+        coletados = [resultados.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+        duracao = time.time() - inicio
+
+        app = criar_app(url, perfil='concorrente', login=False)
+        with app.app_context():
+            gravados = dict(db.session.execute(
+                db.select(Cotacao.id, Cotacao.operador_id).where(Cotacao.status == StatusCotacao.ACEITA_OPERADOR)
+            ).all())
+            historicos = Counter(db.session.scalars(db.select(HistoricoCotacao.cotacao_id)).all())
+            notificacoes = Counter(db.session.scalars(db.select(Notificacao.cotacao_id)).all())
+            contadores = EstatisticaCotacao.contagens('status')
+            EstatisticaCotacao.reconstruir()
+            reconstruidos = EstatisticaCotacao.contagens('status')
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    vencedores = {}
+    for operador_id, ganhas, perdidas, erros in coletados:
+        print(f'operador {operador_id}: {len(ganhas)} aceitas, {perdidas} indisponíveis (409), {len(erros)} erros')
+        if erros:
+            falhas.append(f'operador {operador_id}: {len(erros)} erros (ex.: {erros[0]})')
+        for cotacao_id in ganhas:
+            if cotacao_id in vencedores:
+                falhas.append(f'cotação {cotacao_id} aceita por {vencedores[cotacao_id]} e {operador_id}')
+            vencedores[cotacao_id] = operador_id
+    print(f'{len(ids_cotacoes)} cotações x {len(ids_operadores)} operadores em {duracao:.1f}s')
+
+    if vencedores != gravados or len(gravados) != len(ids_cotacoes):
+        falhas.append(f'{len(gravados)} cotações gravadas como aceitas, {len(vencedores)} sucessos informados')
+    repetidos = [c for c in ids_cotacoes if historicos[c] != 1 or notificacoes[c] != 1]
+    if repetidos:
+        falhas.append(f'{len(repetidos)} cotações sem exatamente um histórico/notificação (ex.: {repetidos[:3]})')
+    if contadores != reconstruidos:
+        falhas.append(f'contadores {contadores} diferentes da reconstrução {reconstruidos}')
+
+    relatar(falhas, 'cada cotação aceita por um único operador, sem erros')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Verifica que cada transição de cotação é gravada em uma única transação.
+
+Cria um banco SQLite em memória, executa as transições do fluxo (v1.3.3 e
+rotas antigas) e confere que cada uma faz exatamente um COMMIT com a
+mudança de status, o histórico, as notificações e o log de auditoria. Em
+seguida força uma falha na notificação e confere que nada da transição
+ficou gravado. A criação de uma cotação notifica todos os operadores com
+um único INSERT.
+
+Uso: python src/check_transacoes_cotacao.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models import db
+from src.models.usuario import TipoUsuario, LogAuditoria
+from src.models.empresa import Empresa
+from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao
+from src.models.notificacao import Notificacao
+from src.routes.cotacao import cotacao_bp
+from src.routes.cotacao_v133 import cotacao_v133_bp
+from src.verificacao_comum import (criar_app, autenticar, criar_usuarios_por_tipo, criar_operadores,
+                                   dados_cotacao, CapturaSQL, relatar)
+
+OPERADORES_EXTRAS = 40
+
+
+def popular():
+    usuarios = criar_usuarios_por_tipo()
+    criar_operadores(OPERADORES_EXTRAS, usuarios[TipoUsuario.OPERADOR].password_hash)
+    empresa = Empresa(razao_social='Transportadora', cnpj='00000000000191', endereco_completo='Rua A')
+    db.session.add(empresa)
+    db.session.flush()
+
+    cotacoes = []
+    for i in range(4):
+        cotacao = Cotacao(**dados_cotacao(numero_cotacao=f'TRX{i:06d}', consultor_id=usuarios[TipoUsuario.CONSULTOR].id,
+                                          status=StatusCotacao.SOLICITADA, cliente_nome=f'Cliente {i}'))
+        db.session.add(cotacao)
+        cotacoes.append(cotacao)
+    db.session.commit()
+    return {tipo: usuario.id for tipo, usuario in usuarios.items()}, empresa.id, [c.id for c in cotacoes]
+
+
+def requisitar(app, cliente, url, usuario_id, dados=None):
+    """Executa o POST e retorna (status HTTP, COMMITs emitidos, INSERTs em notificacoes)"""
+    autenticar(cliente, usuario_id)
+    with app.app_context():
+        engine = db.engine
+    with CapturaSQL(engine) as captura:
+        resposta = cliente.post(url, json=dados or {})
+    return resposta.status_code, captura.commits, len(captura.com_prefixo('INSERT INTO NOTIFICACOES'))
+
+
+def contagens(app, cotacao_id):
+    with app.app_context():
+        return (
+            db.session.get(Cotacao, cotacao_id).status,
+            HistoricoCotacao.query.filter_by(cotacao_id=cotacao_id).count(),
+            Notificacao.query.filter_by(cotacao_id=cotacao_id).count(),
+            LogAuditoria.query.count(),
+        )
+
+
+def main():
+    app = criar_app(blueprints=[(cotacao_bp, '/api'), (cotacao_v133_bp, '/api/v133')])
+    falhas = []
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        usuarios, empresa_id, (fluxo, negada, antiga, falha) = popular()
+        db.session.remove()
+
+    admin, operador, consultor = (usuarios[TipoUsuario.ADMINISTRADOR], usuarios[TipoUsuario.OPERADOR],
+                                  usuarios[TipoUsuario.CONSULTOR])
+    # (url, usuário, corpo, status esperado, histórico, notificações, logs de auditoria a mais)
+    passos = [
+        (f'/api/v133/cotacoes/{fluxo}/aceitar-operador', operador, None, StatusCotacao.ACEITA_OPERADOR, 1, 1, 0),
+        (f'/api/v133/cotacoes/{fluxo}/enviar-resposta', operador,
+         {'valor_frete': 100, 'prazo_entrega': 5, 'empresa_prestadora_id': empresa_id},
+         StatusCotacao.COTACAO_ENVIADA, 2, 2, 0),
+        (f'/api/v133/cotacoes/{fluxo}/aceitar-consultor', consultor, None, StatusCotacao.ACEITA_CONSULTOR, 3, 3, 0),
+        (f'/api/v133/cotacoes/{negada}/aceitar-operador', operador, None, StatusCotacao.ACEITA_OPERADOR, 1, 1, 0),
+        (f'/api/v133/cotacoes/{negada}/enviar-resposta', operador,
+         {'valor_frete': 100, 'prazo_entrega': 5, 'empresa_prestadora_id': empresa_id},
+         StatusCotacao.COTACAO_ENVIADA, 2, 2, 0),
+        (f'/api/v133/cotacoes/{negada}/negar-consultor', consultor, None, StatusCotacao.NEGADA_CONSULTOR, 3, 3, 0),
+        (f'/api/cotacoes/{antiga}/aceitar', operador, None, StatusCotacao.ACEITA_OPERADOR, 1, 0, 1),
+        (f'/api/cotacoes/{antiga}/reatribuir', admin, {'operador_id': admin}, StatusCotacao.ACEITA_OPERADOR, 2, 0, 1),
+    ]
+
+    cliente = app.test_client()
+    for url, usuario_id, dados, status, historico, notificacoes, logs in passos:
+        cotacao_id = int(url.split('/')[-2])
+        _, _, _, logs_antes = contagens(app, cotacao_id)
+        codigo, commits, _ = requisitar(app, cliente, url, usuario_id, dados)
+        obtido = contagens(app, cotacao_id)
+        esperado = (status, historico, notificacoes, logs_antes + logs)
+        print(f'{url}: HTTP {codigo}, {commits} COMMIT(s)')
+        if codigo != 200:
+            falhas.append(f'{url}: HTTP {codigo}')
+        if commits != 1:
+            falhas.append(f'{url}: {commits} COMMITs (esperado 1)')
+        if obtido != esperado:
+            falhas.append(f'{url}: gravado {obtido}, esperado {esperado}')
+
+    # Cotação que já saiu da fila: 409 (e não 403) para quem pode aceitar, sem gravar nada,
+    # nas duas rotas; 403 para quem não pode aceitar cotações
+    for url in (f'/api/v133/cotacoes/{fluxo}/aceitar-operador', f'/api/cotacoes/{antiga}/aceitar'):
+        for usuario_id, esperado in ((operador, 409), (admin, 409), (consultor, 403)):
+            codigo, commits, _ = requisitar(app, cliente, url, usuario_id)
+            print(f'{url} (já aceita, usuário {usuario_id}): HTTP {codigo}, {commits} COMMIT(s)')
+            if codigo != esperado or commits != 0:
+                falhas.append(f'{url} (já aceita, usuário {usuario_id}): HTTP {codigo}, {commits} COMMITs '
+                              f'(esperado {esperado}, 0)')
+
+    # Falha no meio da transição: status e histórico não podem ficar gravados
+    antes = contagens(app, falha)
+    original = Notificacao.__dict__['notificar_cotacao_aceita']
+
+    def falhar(cotacao):
+        raise RuntimeError('falha simulada ao notificar')
+
+    Notificacao.notificar_cotacao_aceita = staticmethod(falhar)
+    try:
+        codigo, commits, _ = requisitar(app, cliente, f'/api/v133/cotacoes/{falha}/aceitar-operador', operador)
+    finally:
+        Notificacao.notificar_cotacao_aceita = original
+    depois = contagens(app, falha)
+    print(f'Falha simulada: HTTP {codigo}, {commits} COMMIT(s), antes {antes}, depois {depois}')
+    if codigo != 500 or commits != 0 or depois != antes:
+        falhas.append('transição com falha deixou dados gravados')
+
+    # Criação: cotação, histórico, notificação de cada operador ativo e log em um commit
+    nova = {
+        'empresa_transporte': 'brcargo_rodoviario', 'cliente_nome': 'Cliente Novo',
+        'cliente_cnpj': '11.222.333/0001-81', 'numero_cliente': 'CLI-1',
+        'origem_cep': '11000-000', 'origem_endereco': 'Rua A', 'origem_cidade': 'Santos', 'origem_estado': 'SP',
+        'destino_cep': '80000-000', 'destino_endereco': 'Rua B', 'destino_cidade': 'Curitiba', 'destino_estado': 'PR',
+        'carga_descricao': 'Carga', 'carga_peso_kg': 10, 'carga_valor_mercadoria': 1000, 'carga_cubagem': 1
+    }
+    codigo, commits, inserts = requisitar(app, cliente, '/api/cotacoes', consultor, nova)
+    with app.app_context():
+        criada = Cotacao.query.filter_by(cliente_nome='Cliente Novo').first()
+        notificados = Notificacao.query.filter_by(cotacao_id=criada.id).count() if criada else 0
+        historico = HistoricoCotacao.query.filter_by(cotacao_id=criada.id).count() if criada else 0
+    print(f'/api/cotacoes (criar): HTTP {codigo}, {commits} COMMIT(s), {inserts} INSERT(s) de notificação, '
+          f'{notificados} operadores notificados')
+    if codigo != 201 or commits != 1 or inserts != 1 or historico != 1 or notificados != OPERADORES_EXTRAS + 1:
+        falhas.append(f'criação: HTTP {codigo}, {commits} COMMITs, {inserts} INSERTs, '
+                      f'{historico} históricos, {notificados} notificações')
+
+    relatar(falhas, 'cada transição grava tudo em um único commit')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,106 +3,100 @@
 Script para converter banco de dados para a nova versão do sistema
 """
 
-import sqlite3
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+
+from src.models.conexao import criar_engine, caminho_sqlite
 
 def convert_database():
     """Converte banco de dados para nova versão"""
-    
-    # Caminho do banco de dados
-    db_path = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
-    
-    if not os.path.exists(db_path):
+
+    # Banco configurado em DATABASE_URL (padrão: src/database/app.db)
+    engine = criar_engine()
+    db_path = caminho_sqlite(engine.url)
+
+    if db_path and not os.path.exists(db_path):
         print(f"Banco de dados não encontrado: {db_path}")
         return
-    
+
     try:
-        # Conectar ao banco
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print("🔧 Convertendo banco de dados para nova versão...")
-        
-        # Verificar estrutura atual
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        print(f"📊 Tabelas encontradas: {[t[0] for t in tables]}")
-        
-        # Verificar cotações
-        try:
-            cursor.execute("SELECT id, empresa_transporte, status FROM cotacoes LIMIT 5")
-            cotacoes = cursor.fetchall()
-            print(f"📋 Cotações encontradas: {len(cotacoes)}")
-            
-            if cotacoes:
-                print("📝 Primeiras 5 cotações:")
-                for cotacao_id, empresa_transporte, status in cotacoes:
-                    print(f"  ID: {cotacao_id}, Empresa: {empresa_transporte}, Status: {status}")
-        except Exception as e:
-            print(f"⚠️  Erro ao ler cotações: {e}")
-        
-        # Mapear valores antigos para novos (empresa_transporte)
-        empresa_mapping = {
-            'brcargo_rodoviario': 'BRCARGO_RODOVIARIO',
-            'brcargo_maritimo': 'BRCARGO_MARITIMO', 
-            'frete_aereo': 'FRETE_AEREO',
-            'BRCARGO': 'BRCARGO_RODOVIARIO',
-            'brcargo': 'BRCARGO_RODOVIARIO'
-        }
-        
-        # Mapear valores antigos para novos (status)
-        status_mapping = {
-            'solicitada': 'SOLICITADA',
-            'aceita_operador': 'ACEITA_OPERADOR',
-            'cotacao_enviada': 'COTACAO_ENVIADA',
-            'aceita_consultor': 'ACEITA_CONSULTOR',
-            'negada_consultor': 'NEGADA_CONSULTOR',
-            'finalizada': 'FINALIZADA'
-        }
-        
-        # Aplicar conversões
-        cursor.execute("SELECT id, empresa_transporte, status FROM cotacoes")
-        all_cotacoes = cursor.fetchall()
-        
-        updates = 0
-        for cotacao_id, empresa_transporte, status in all_cotacoes:
-            nova_empresa = empresa_mapping.get(empresa_transporte, empresa_transporte)
-            novo_status = status_mapping.get(status, status)
-            
-            if nova_empresa != empresa_transporte or novo_status != status:
-                cursor.execute(
-                    "UPDATE cotacoes SET empresa_transporte = ?, status = ? WHERE id = ?",
-                    (nova_empresa, novo_status, cotacao_id)
-                )
-                print(f"✅ Cotação {cotacao_id}: {empresa_transporte} → {nova_empresa}, {status} → {novo_status}")
-                updates += 1
-        
-        # Commit das mudanças
-        conn.commit()
+        # Uma transação: commit ao final do bloco, rollback em caso de erro
+        with engine.begin() as conn:
+            print("🔧 Convertendo banco de dados para nova versão...")
+
+            # Verificar estrutura atual
+            tables = inspect(conn).get_table_names()
+            print(f"📊 Tabelas encontradas: {tables}")
+
+            # Verificar cotações
+            try:
+                cotacoes = conn.execute(text("SELECT id, empresa_transporte, status FROM cotacoes LIMIT 5")).fetchall()
+                print(f"📋 Cotações encontradas: {len(cotacoes)}")
+
+                if cotacoes:
+                    print("📝 Primeiras 5 cotações:")
+                    for cotacao_id, empresa_transporte, status in cotacoes:
+                        print(f"  ID: {cotacao_id}, Empresa: {empresa_transporte}, Status: {status}")
+            except Exception as e:
+                print(f"⚠️  Erro ao ler cotações: {e}")
+                raise
+
+            # Mapear valores antigos para novos (empresa_transporte)
+            empresa_mapping = {
+                'brcargo_rodoviario': 'BRCARGO_RODOVIARIO',
+                'brcargo_maritimo': 'BRCARGO_MARITIMO',
+                'frete_aereo': 'FRETE_AEREO',
+                'BRCARGO': 'BRCARGO_RODOVIARIO',
+                'brcargo': 'BRCARGO_RODOVIARIO'
+            }
+
+            # Mapear valores antigos para novos (status)
+            status_mapping = {
+                'solicitada': 'SOLICITADA',
+                'aceita_operador': 'ACEITA_OPERADOR',
+                'cotacao_enviada': 'COTACAO_ENVIADA',
+                'aceita_consultor': 'ACEITA_CONSULTOR',
+                'negada_consultor': 'NEGADA_CONSULTOR',
+                'finalizada': 'FINALIZADA'
+            }
+
+            # Aplicar conversões
+            all_cotacoes = conn.execute(text("SELECT id, empresa_transporte, status FROM cotacoes")).fetchall()
+
+            updates = 0
+            for cotacao_id, empresa_transporte, status in all_cotacoes:
+                nova_empresa = empresa_mapping.get(empresa_transporte, empresa_transporte)
+                novo_status = status_mapping.get(status, status)
+
+                if nova_empresa != empresa_transporte or novo_status != status:
+                    conn.execute(
+                        text("UPDATE cotacoes SET empresa_transporte = :empresa, status = :status WHERE id = :id"),
+                        {'empresa': nova_empresa, 'status': novo_status, 'id': cotacao_id}
+                    )
+                    print(f"✅ Cotação {cotacao_id}: {empresa_transporte} → {nova_empresa}, {status} → {novo_status}")
+                    updates += 1
+
         print(f"🎉 Conversão concluída! {updates} cotações atualizadas.")
-        
+
         # Verificar resultado final
-        cursor.execute("SELECT DISTINCT empresa_transporte FROM cotacoes")
-        empresas_unicas = cursor.fetchall()
-        print(f"📋 Empresas únicas após conversão: {[e[0] for e in empresas_unicas]}")
-        
-        cursor.execute("SELECT DISTINCT status FROM cotacoes")
-        status_unicos = cursor.fetchall()
-        print(f"📋 Status únicos após conversão: {[s[0] for s in status_unicos]}")
-        
-        # Verificar total de cotações
-        cursor.execute("SELECT COUNT(*) FROM cotacoes")
-        total_cotacoes = cursor.fetchone()[0]
-        print(f"📊 Total de cotações no banco: {total_cotacoes}")
-        
+        with engine.connect() as conn:
+            empresas_unicas = conn.execute(text("SELECT DISTINCT empresa_transporte FROM cotacoes")).fetchall()
+            print(f"📋 Empresas únicas após conversão: {[e[0] for e in empresas_unicas]}")
+
+            status_unicos = conn.execute(text("SELECT DISTINCT status FROM cotacoes")).fetchall()
+            print(f"📋 Status únicos após conversão: {[s[0] for s in status_unicos]}")
+
+            # Verificar total de cotações
+            total_cotacoes = conn.execute(text("SELECT COUNT(*) FROM cotacoes")).scalar()
+            print(f"📊 Total de cotações no banco: {total_cotacoes}")
+
     except Exception as e:
         print(f"❌ Erro ao converter banco: {e}")
-        if 'conn' in locals():
-            conn.rollback()
     finally:
-        if 'conn' in locals():
-            conn.close()
+        engine.dispose()
 
 if __name__ == "__main__":
     convert_database()
-
@@ -3,84 +3,74 @@
 Script para corrigir estrutura do banco de dados
 """
 
-import sqlite3
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text, Text, DateTime
+
+from src.models.conexao import criar_engine, caminho_sqlite
 
 def fix_database_schema():
     """Corrige estrutura do banco de dados"""
-    
-    # Caminho do banco de dados
-    db_path = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
-    
-    if not os.path.exists(db_path):
+
+    # Banco configurado em DATABASE_URL (padrão: src/database/app.db)
+    engine = criar_engine()
+    db_path = caminho_sqlite(engine.url)
+
+    if db_path and not os.path.exists(db_path):
         print(f"Banco de dados não encontrado: {db_path}")
         return
-    
+
     try:
-        # Conectar ao banco
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print("🔧 Corrigindo estrutura do banco de dados...")
-        
-        # Verificar estrutura da tabela empresas
-        cursor.execute("PRAGMA table_info(empresas)")
-        columns = cursor.fetchall()
-        column_names = [col[1] for col in columns]
-        
-        print(f"📊 Colunas atuais da tabela empresas: {column_names}")
-        
-        # Colunas necessárias que podem estar faltando
-        required_columns = {
-            'observacoes': 'TEXT',
-            'link_cotacao': 'TEXT',
-            'etiqueta': 'TEXT',
-            'created_at': 'DATETIME DEFAULT CURRENT_TIMESTAMP',
-            'updated_at': 'DATETIME DEFAULT CURRENT_TIMESTAMP'
-        }
-        
-        # Adicionar colunas faltantes
-        for column_name, column_type in required_columns.items():
-            if column_name not in column_names:
-                try:
-                    cursor.execute(f"ALTER TABLE empresas ADD COLUMN {column_name} {column_type}")
+        # Uma transação: commit ao final do bloco, rollback em caso de erro
+        with engine.begin() as conn:
+            print("🔧 Corrigindo estrutura do banco de dados...")
+
+            # Verificar estrutura da tabela empresas
+            column_names = [col['name'] for col in inspect(conn).get_columns('empresas')]
+
+            print(f"📊 Colunas atuais da tabela empresas: {column_names}")
+
+            # Colunas necessárias que podem estar faltando (tipo SQL gerado pelo dialeto do banco)
+            required_columns = {
+                'observacoes': (Text(), None),
+                'link_cotacao': (Text(), None),
+                'etiqueta': (Text(), None),
+                'created_at': (DateTime(), 'CURRENT_TIMESTAMP'),
+                'updated_at': (DateTime(), 'CURRENT_TIMESTAMP')
+            }
+
+            def definicao(tipo, padrao):
+                sql = tipo.compile(dialect=conn.dialect)
+                return f"{sql} DEFAULT {padrao}" if padrao else sql
+
+            # Adicionar colunas faltantes
+            for column_name, (column_type, default) in required_columns.items():
+                if column_name not in column_names:
+                    conn.execute(text(f"ALTER TABLE empresas ADD COLUMN {column_name} {definicao(column_type, default)}"))
                     print(f"✅ Coluna '{column_name}' adicionada à tabela empresas")
-                except Exception as e:
-                    print(f"⚠️  Erro ao adicionar coluna '{column_name}': {e}")
-        
-        # Verificar estrutura da tabela cotacoes
-        cursor.execute("PRAGMA table_info(cotacoes)")
-        cotacao_columns = cursor.fetchall()
-        cotacao_column_names = [col[1] for col in cotacao_columns]
-        
-        print(f"📊 Colunas atuais da tabela cotacoes: {cotacao_column_names}")
-        
-        # Verificar se há campo created_at na tabela cotacoes
-        if 'created_at' not in cotacao_column_names:
-            try:
-                cursor.execute("ALTER TABLE cotacoes ADD COLUMN created_at DATETIME DEFAULT CURRENT_TIMESTAMP")
+
+            # Verificar estrutura da tabela cotacoes
+            cotacao_column_names = [col['name'] for col in inspect(conn).get_columns('cotacoes')]
+
+            print(f"📊 Colunas atuais da tabela cotacoes: {cotacao_column_names}")
+
+            # Verificar se há campo created_at na tabela cotacoes
+            if 'created_at' not in cotacao_column_names:
+                conn.execute(text(f"ALTER TABLE cotacoes ADD COLUMN created_at {definicao(DateTime(), 'CURRENT_TIMESTAMP')}"))
                 print("✅ Coluna 'created_at' adicionada à tabela cotacoes")
-            except Exception as e:
-                print(f"⚠️  Erro ao adicionar coluna 'created_at' à cotacoes: {e}")
-        
-        # Commit das mudanças
-        conn.commit()
+
         print("🎉 Estrutura do banco corrigida!")
-        
+
         # Verificar resultado final
-        cursor.execute("PRAGMA table_info(empresas)")
-        final_columns = cursor.fetchall()
-        final_column_names = [col[1] for col in final_columns]
+        final_column_names = [col['name'] for col in inspect(engine).get_columns('empresas')]
         print(f"📋 Colunas finais da tabela empresas: {final_column_names}")
-        
+
     except Exception as e:
         print(f"❌ Erro ao corrigir estrutura: {e}")
-        if 'conn' in locals():
-            conn.rollback()
     finally:
-        if 'conn' in locals():
-            conn.close()
+        engine.dispose()
 
 if __name__ == "__main__":
     fix_database_schema()
-
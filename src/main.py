@@ -15,6 +15,7 @@ from src.routes.auth import auth_bp
 from src.routes.cotacao import cotacao_bp
 from src.routes.cotacao_v133 import cotacao_v133_bp
 from src.routes.dashboard_v133 import dashboard_v133_bp
+from src.routes.jobs import jobs_bp
 
 from flask_migrate import Migrate
 
@@ -22,12 +23,20 @@ app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'sta
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # Configurar banco de dados ANTES de inicializar Migrate
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# URL e pool vêm do ambiente (DATABASE_URL, DB_POOL_*); padrão: SQLite em src/database/app.db
+from src.models.conexao import url_do_banco, opcoes_engine
+app.config['SQLALCHEMY_DATABASE_URI'] = url_do_banco()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
-# Agora inicializar Migrate
-migrate = Migrate(app, db)
+# PRAGMAs por conexão do SQLite (WAL, busy_timeout...), perfil em SQLITE_PERFIL
+from src.models.perfil_sqlite import configurar_engine
+with app.app_context():
+    configurar_engine(db.engine)
+
+# Agora inicializar Migrate (revisões em src/migrations, aplicadas também na inicialização)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'))
 
 # Habilitar CORS para todas as rotas
 CORS(app)
@@ -59,6 +68,7 @@ app.register_blueprint(seed_bp, url_prefix='/api')
 app.register_blueprint(cotacao_bp, url_prefix='/api')
 app.register_blueprint(cotacao_v133_bp, url_prefix='/api/v133')
 app.register_blueprint(dashboard_v133_bp, url_prefix='/api/v133')
+app.register_blueprint(jobs_bp, url_prefix='/api')
 
 # Criar diretório do banco se não existir
 os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
@@ -66,6 +76,27 @@ os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
 with app.app_context():
     db.create_all()
     
+    # Aplicar as revisões pendentes do Alembic e preencher dados derivados
+    from src.models.esquema import atualizar_esquema
+    atualizar_esquema()
+    
+    # Recalcular contadores materializados de cotações
+    from src.models.estatistica_cotacao import EstatisticaCotacao
+    EstatisticaCotacao.reconstruir()
+    
+    # Recalcular contadores de notificações não lidas por usuário
+    from src.models.usuario import Usuario
+    Usuario.recalcular_notificacoes_nao_lidas()
+    
+    # Criar/atualizar índice de busca textual das empresas (SQLite FTS5)
+    from src.models.busca_empresa import IndiceBuscaEmpresa
+    IndiceBuscaEmpresa.inicializar()
+    
+    # Tarefas em segundo plano que estavam em andamento não sobrevivem à reinicialização
+    from src.models.job import Job
+    Job.marcar_interrompidos()
+    Job.remover_antigos()
+    
     # Criar usuário administrador padrão se não existir
     from src.models.usuario import Usuario, TipoUsuario
     admin_user = Usuario.query.filter_by(username='admin').first()
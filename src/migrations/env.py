@@ -11,7 +11,10 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Na inicialização da aplicação (esquema.aplicar_migracoes) o logging já
+# está configurado e não deve ser substituído
+if not config.attributes.get('logging_configurado'):
+    fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
 
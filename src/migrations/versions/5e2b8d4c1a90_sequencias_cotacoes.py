@@ -0,0 +1,37 @@
+"""contador diário da numeração de cotações
+
+Revision ID: 5e2b8d4c1a90
+Revises: a3c9e1f0b7d2
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b8d4c1a90'
+down_revision = 'a3c9e1f0b7d2'
+branch_labels = None
+depends_on = None
+
+
+def _tabela_existe():
+    return 'sequencias_cotacoes' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    # O db.create_all() da inicialização já cria a tabela em bancos novos.
+    # As linhas de cada dia são criadas sob demanda a partir das cotações existentes.
+    if not _tabela_existe():
+        op.create_table(
+            'sequencias_cotacoes',
+            sa.Column('dia', sa.String(length=8), nullable=False),
+            sa.Column('ultimo', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('dia'),
+        )
+
+
+def downgrade():
+    if _tabela_existe():
+        op.drop_table('sequencias_cotacoes')
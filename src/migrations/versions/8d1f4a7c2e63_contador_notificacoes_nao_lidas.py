@@ -0,0 +1,41 @@
+"""contador de notificações não lidas por usuário
+
+Revision ID: 8d1f4a7c2e63
+Revises: 5e2b8d4c1a90
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1f4a7c2e63'
+down_revision = '5e2b8d4c1a90'
+branch_labels = None
+depends_on = None
+
+
+def _coluna_existe():
+    colunas = sa.inspect(op.get_bind()).get_columns('usuarios')
+    return 'notificacoes_nao_lidas' in {c['name'] for c in colunas}
+
+
+def upgrade():
+    # O db.create_all() já cria a coluna em bancos novos
+    if not _coluna_existe():
+        with op.batch_alter_table('usuarios', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('notificacoes_nao_lidas', sa.Integer(), nullable=False,
+                                          server_default='0'))
+
+    op.execute(
+        "UPDATE usuarios SET notificacoes_nao_lidas = ("
+        "SELECT COUNT(*) FROM notificacoes "
+        "WHERE notificacoes.usuario_id = usuarios.id AND notificacoes.lida = false)"
+    )
+
+
+def downgrade():
+    if _coluna_existe():
+        with op.batch_alter_table('usuarios', schema=None) as batch_op:
+            batch_op.drop_column('notificacoes_nao_lidas')
@@ -0,0 +1,49 @@
+"""indices para as consultas frequentes de cotações, notificações, histórico e logs
+
+Revision ID: a3c9e1f0b7d2
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e1f0b7d2'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas) — os mesmos declarados em __table_args__ nos modelos
+INDICES = [
+    ('ix_cotacoes_data_solicitacao', 'cotacoes', ['data_solicitacao', 'id']),
+    ('ix_cotacoes_created_at', 'cotacoes', ['created_at', 'id']),
+    ('ix_cotacoes_status_created_at', 'cotacoes', ['status', 'created_at', 'id']),
+    ('ix_cotacoes_empresa_transporte_created_at', 'cotacoes', ['empresa_transporte', 'created_at', 'id']),
+    ('ix_cotacoes_consultor_created_at', 'cotacoes', ['consultor_id', 'created_at', 'id']),
+    ('ix_cotacoes_consultor_data_solicitacao', 'cotacoes', ['consultor_id', 'data_solicitacao', 'id']),
+    ('ix_cotacoes_operador_updated_at', 'cotacoes', ['operador_id', 'updated_at', 'id']),
+    ('ix_cotacoes_empresa_prestadora_status', 'cotacoes', ['empresa_prestadora_id', 'status']),
+    ('ix_historico_cotacoes_cotacao_timestamp', 'historico_cotacoes', ['cotacao_id', 'timestamp']),
+    ('ix_notificacoes_usuario_lida_created_at', 'notificacoes', ['usuario_id', 'lida', 'created_at']),
+    ('ix_logs_auditoria_timestamp', 'logs_auditoria', ['timestamp', 'id']),
+]
+
+
+def _indices_existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    # O banco pode ter sido criado pelo db.create_all(), que já cria os
+    # índices declarados nos modelos
+    for nome, tabela, colunas in INDICES:
+        if nome not in _indices_existentes(tabela):
+            op.create_index(nome, tabela, colunas)
+
+
+def downgrade():
+    for nome, tabela, _ in reversed(INDICES):
+        if nome in _indices_existentes(tabela):
+            op.drop_index(nome, table_name=tabela)
@@ -0,0 +1,39 @@
+"""minhas-operacoes paginada pela data de aceite em vez de updated_at
+
+Revision ID: a9f1c5e3b720
+Revises: f2c6d0b9a873
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9f1c5e3b720'
+down_revision = 'f2c6d0b9a873'
+branch_labels = None
+depends_on = None
+
+ANTIGO = ('ix_cotacoes_operador_updated_at', ['operador_id', 'updated_at', 'id'])
+NOVO = ('ix_cotacoes_operador_data_aceite', ['operador_id', 'data_aceite_operador', 'id'])
+
+
+def _indices_existentes():
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes('cotacoes')}
+
+
+def _trocar(remover, criar):
+    existentes = _indices_existentes()
+    if criar[0] not in existentes:
+        op.create_index(criar[0], 'cotacoes', criar[1])
+    if remover[0] in existentes:
+        op.drop_index(remover[0], table_name='cotacoes')
+
+
+def upgrade():
+    _trocar(ANTIGO, NOVO)
+
+
+def downgrade():
+    _trocar(NOVO, ANTIGO)
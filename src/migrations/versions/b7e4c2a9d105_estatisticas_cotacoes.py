@@ -0,0 +1,51 @@
+"""contadores materializados de cotações
+
+Revision ID: b7e4c2a9d105
+Revises: 8d1f4a7c2e63
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c2a9d105'
+down_revision = '8d1f4a7c2e63'
+branch_labels = None
+depends_on = None
+
+STATUS = ('SOLICITADA', 'ACEITA_OPERADOR', 'COTACAO_ENVIADA', 'ACEITA_CONSULTOR', 'NEGADA_CONSULTOR', 'FINALIZADA')
+EMPRESAS = ('BRCARGO_RODOVIARIO', 'BRCARGO_MARITIMO', 'FRETE_AEREO')
+
+
+def _enum(valores, nome):
+    # No PostgreSQL o tipo já existe (criado com a tabela cotacoes)
+    return sa.Enum(*valores, name=nome).with_variant(
+        postgresql.ENUM(*valores, name=nome, create_type=False), 'postgresql')
+
+
+def _tabela_existe():
+    return 'estatisticas_cotacoes' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    # As linhas são reconstruídas a partir das cotações na inicialização
+    # (EstatisticaCotacao.reconstruir)
+    if not _tabela_existe():
+        op.create_table(
+            'estatisticas_cotacoes',
+            sa.Column('status', _enum(STATUS, 'statuscotacao'), nullable=False),
+            sa.Column('empresa_transporte', _enum(EMPRESAS, 'empresacotacao'), nullable=False),
+            sa.Column('operador_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('consultor_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('status', 'empresa_transporte', 'operador_id', 'consultor_id', 'dia'),
+        )
+
+
+def downgrade():
+    if _tabela_existe():
+        op.drop_table('estatisticas_cotacoes')
@@ -0,0 +1,70 @@
+"""tarefas em segundo plano, com o worker responsável e o heartbeat
+
+Revision ID: c1d8f3b6e247
+Revises: b7e4c2a9d105
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1d8f3b6e247'
+down_revision = 'b7e4c2a9d105'
+branch_labels = None
+depends_on = None
+
+
+def _colunas_novas():
+    """Colunas acrescentadas depois da criação da tabela"""
+    return [
+        sa.Column('pid', sa.Integer(), nullable=True),
+        sa.Column('heartbeat_em', sa.DateTime(), nullable=True),
+    ]
+
+
+def _colunas():
+    inspetor = sa.inspect(op.get_bind())
+    if 'jobs' not in inspetor.get_table_names():
+        return None
+    return {c['name'] for c in inspetor.get_columns('jobs')}
+
+
+def upgrade():
+    colunas = _colunas()
+    if colunas is None:
+        op.create_table(
+            'jobs',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('tipo', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.Enum('PENDENTE', 'EXECUTANDO', 'CONCLUIDO', 'ERRO', name='statusjob'),
+                      nullable=False),
+            sa.Column('progresso', sa.Integer(), nullable=False),
+            sa.Column('mensagem', sa.String(length=255), nullable=True),
+            sa.Column('resultado', sa.Text(), nullable=True),
+            sa.Column('arquivo', sa.String(length=500), nullable=True),
+            sa.Column('erro', sa.Text(), nullable=True),
+            sa.Column('usuario_id', sa.Integer(), nullable=True),
+            *_colunas_novas(),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('iniciado_em', sa.DateTime(), nullable=True),
+            sa.Column('finalizado_em', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_jobs_status', 'jobs', ['status'])
+        op.create_index('ix_jobs_created_at', 'jobs', ['created_at'])
+        return
+
+    faltando = [coluna for coluna in _colunas_novas() if coluna.name not in colunas]
+    if faltando:
+        with op.batch_alter_table('jobs', schema=None) as batch_op:
+            for coluna in faltando:
+                batch_op.add_column(coluna)
+
+
+def downgrade():
+    colunas = _colunas()
+    if colunas is not None:
+        op.drop_table('jobs')
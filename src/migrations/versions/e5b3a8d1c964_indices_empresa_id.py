@@ -0,0 +1,42 @@
+"""indices em empresa_id nas tabelas filhas de empresas
+
+Revision ID: e5b3a8d1c964
+Revises: c1d8f3b6e247
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3a8d1c964'
+down_revision = 'c1d8f3b6e247'
+branch_labels = None
+depends_on = None
+
+# Tabelas filhas de empresas (index=True em empresa_id nos modelos)
+TABELAS = [
+    'regulamentacoes', 'certificacoes', 'modalidades_transporte', 'tipos_carga', 'abrangencia_geografica',
+    'frota', 'armazenagem', 'portos_terminais', 'seguros_coberturas', 'tecnologias', 'desempenho_qualidade',
+    'clientes_segmentos', 'recursos_humanos', 'sustentabilidade',
+]
+
+
+def _indices_existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    # A importação e a exclusão em lote filtram as tabelas filhas por empresa_id
+    for tabela in TABELAS:
+        nome = f'ix_{tabela}_empresa_id'
+        if nome not in _indices_existentes(tabela):
+            op.create_index(nome, tabela, ['empresa_id'])
+
+
+def downgrade():
+    for tabela in reversed(TABELAS):
+        nome = f'ix_{tabela}_empresa_id'
+        if nome in _indices_existentes(tabela):
+            op.drop_index(nome, table_name=tabela)
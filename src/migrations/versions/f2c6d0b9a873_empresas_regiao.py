@@ -0,0 +1,35 @@
+"""região derivada do endereço das empresas
+
+Revision ID: f2c6d0b9a873
+Revises: e5b3a8d1c964
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d0b9a873'
+down_revision = 'e5b3a8d1c964'
+branch_labels = None
+depends_on = None
+
+
+def _coluna_existe():
+    colunas = sa.inspect(op.get_bind()).get_columns('empresas')
+    return 'regiao' in {c['name'] for c in colunas}
+
+
+def upgrade():
+    # A classificação pelo endereço é feita em Python, na inicialização
+    # (Empresa.classificar_regioes_pendentes preenche as linhas com regiao nula)
+    if not _coluna_existe():
+        with op.batch_alter_table('empresas', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('regiao', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    if _coluna_existe():
+        with op.batch_alter_table('empresas', schema=None) as batch_op:
+            batch_op.drop_column('regiao')
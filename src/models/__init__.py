@@ -6,5 +6,8 @@ db = SQLAlchemy()
 from .usuario import Usuario
 from .empresa import Empresa
 from .cotacao import Cotacao, StatusCotacao, EmpresaCotacao, HistoricoCotacao
+from .estatistica_cotacao import EstatisticaCotacao
+from .sequencia_cotacao import SequenciaCotacao
 from .notificacao import Notificacao, TipoNotificacao
+from .job import Job, StatusJob
 
@@ -0,0 +1,267 @@
+"""
+Índice de busca textual das empresas (SQLite FTS5)
+
+O índice é uma tabela virtual FTS5 com tokenizer trigram, o que mantém a
+semântica de substring dos antigos filtros ILIKE '%termo%', mas resolvida
+pelo índice em vez de JOINs em até 13 tabelas filhas. A sincronização é
+feita por triggers no próprio banco, cobrindo inserts, updates e deletes
+de Empresa e de todos os modelos relacionados (inclusive deletes em massa).
+
+Alterações em Empresa reindexam a linha na hora. Nas tabelas filhas, que
+recebem milhares de linhas por importação, o trigger apenas anota o
+empresa_id em empresas_busca_pendentes; o documento de cada empresa anotada
+é remontado uma única vez ao confirmar a transação (reindexar_pendentes).
+"""
+
+from sqlalchemy import event, text, select, bindparam, or_, and_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import db
+from .empresa import (
+    Empresa, Regulamentacao, Certificacao, ModalidadeTransporte,
+    TipoCarga, AbrangenciaGeografica, Frota, PortoTerminal,
+    Tecnologia, ClienteSegmento, Sustentabilidade
+)
+
+TABELA_BUSCA = 'empresas_busca'
+TABELA_PENDENTES = 'empresas_busca_pendentes'
+
+# Colunas do índice vindas da própria tabela empresas
+COLUNAS_EMPRESA = ['razao_social', 'nome_fantasia', 'cnpj']
+
+# Colunas do índice agregadas das tabelas filhas:
+# coluna -> (tabela filha, expressão SQL agregada, modelo, atributos para o fallback)
+COLUNAS_RELACIONADAS = {
+    'tipos_carga': ('tipos_carga', 'tipo_carga', TipoCarga, ['tipo_carga']),
+    'modalidades': ('modalidades_transporte', 'modalidade', ModalidadeTransporte, ['modalidade']),
+    'certificacoes': ('certificacoes', 'nome_certificacao', Certificacao, ['nome_certificacao']),
+    'abrangencia': ('abrangencia_geografica', "coalesce(tipo_abrangencia, '') || char(10) || coalesce(detalhes, '')",
+                    AbrangenciaGeografica, ['tipo_abrangencia', 'detalhes']),
+    'portos': ('portos_terminais', 'nome_porto_terminal', PortoTerminal, ['nome_porto_terminal']),
+    'regulamentacoes': ('regulamentacoes', 'tipo_regulamentacao', Regulamentacao, ['tipo_regulamentacao']),
+    'tipos_frota': ('frota', 'tipo_frota', Frota, ['tipo_frota']),
+    'tipos_veiculo': ('frota', 'tipo_veiculo', Frota, ['tipo_veiculo']),
+    'tecnologias': ('tecnologias', 'nome_tecnologia', Tecnologia, ['nome_tecnologia']),
+    'segmentos': ('clientes_segmentos', 'segmento', ClienteSegmento, ['segmento']),
+    'certificacoes_ambientais': ('sustentabilidade', 'certificacao_ambiental', Sustentabilidade, ['certificacao_ambiental']),
+}
+
+COLUNAS_INDICE = COLUNAS_EMPRESA + list(COLUNAS_RELACIONADAS)
+
+
+def _sql_documento(filtro):
+    """INSERT ... SELECT que monta o documento indexado das empresas do filtro (ou de todas)"""
+    agregados = [
+        f"(SELECT group_concat({expressao}, char(10)) FROM {tabela} WHERE empresa_id = e.id)"
+        for tabela, expressao, _, _ in COLUNAS_RELACIONADAS.values()
+    ]
+    campos = ', '.join([f'e.{coluna}' for coluna in COLUNAS_EMPRESA] + agregados)
+    sql = f"INSERT INTO {TABELA_BUSCA}(rowid, {', '.join(COLUNAS_INDICE)}) SELECT e.id, {campos} FROM empresas e"
+    if filtro is not None:
+        sql += f" WHERE {filtro}"
+    return sql
+
+
+def _sql_reindexar(alvo):
+    return f"DELETE FROM {TABELA_BUSCA} WHERE rowid = {alvo}; {_sql_documento(f'e.id = {alvo}')};"
+
+
+def _sql_marcar_pendente(alvo):
+    return f"INSERT OR IGNORE INTO {TABELA_PENDENTES}(empresa_id) VALUES ({alvo});"
+
+
+def _sql_triggers():
+    """Gera os triggers que mantêm o índice sincronizado: {nome: CREATE TRIGGER}"""
+    triggers = {
+        f"{TABELA_BUSCA}_empresas_ai": f"AFTER INSERT ON empresas BEGIN {_sql_reindexar('NEW.id')} END",
+        f"{TABELA_BUSCA}_empresas_au": f"AFTER UPDATE OF {', '.join(COLUNAS_EMPRESA)} ON empresas "
+                                       f"BEGIN {_sql_reindexar('NEW.id')} END",
+        f"{TABELA_BUSCA}_empresas_ad": f"AFTER DELETE ON empresas "
+                                       f"BEGIN DELETE FROM {TABELA_BUSCA} WHERE rowid = OLD.id; END",
+    }
+
+    # Tabelas filhas: só anotam a empresa; o documento é remontado uma vez por transação
+    tabelas_filhas = sorted({tabela for tabela, _, _, _ in COLUNAS_RELACIONADAS.values()})
+    for tabela in tabelas_filhas:
+        triggers.update({
+            f"{TABELA_BUSCA}_{tabela}_ai": f"AFTER INSERT ON {tabela} "
+                                           f"BEGIN {_sql_marcar_pendente('NEW.empresa_id')} END",
+            f"{TABELA_BUSCA}_{tabela}_au": f"AFTER UPDATE ON {tabela} "
+                                           f"BEGIN {_sql_marcar_pendente('OLD.empresa_id')} "
+                                           f"{_sql_marcar_pendente('NEW.empresa_id')} END",
+            f"{TABELA_BUSCA}_{tabela}_ad": f"AFTER DELETE ON {tabela} "
+                                           f"BEGIN {_sql_marcar_pendente('OLD.empresa_id')} END",
+        })
+    return {nome: f"CREATE TRIGGER {nome} {corpo}" for nome, corpo in triggers.items()}
+
+
+class IndiceBuscaEmpresa:
+    """Criação, manutenção e consulta do índice de busca das empresas"""
+
+    _disponivel = None
+
+    @staticmethod
+    def inicializar():
+        """Cria o índice e os triggers se não existirem (apenas SQLite com FTS5 trigram)"""
+        if db.engine.dialect.name != 'sqlite':
+            IndiceBuscaEmpresa._disponivel = False
+            return False
+
+        with db.engine.begin() as conn:
+            existe = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                {'nome': TABELA_BUSCA}
+            ).first()
+
+            if not existe:
+                try:
+                    conn.execute(text(
+                        f"CREATE VIRTUAL TABLE {TABELA_BUSCA} USING fts5("
+                        f"{', '.join(COLUNAS_INDICE)}, tokenize = 'trigram')"
+                    ))
+                except OperationalError as e:
+                    # SQLite sem FTS5 ou sem tokenizer trigram (< 3.34): mantém busca via ILIKE
+                    print(f"Índice de busca de empresas indisponível: {e}")
+                    IndiceBuscaEmpresa._disponivel = False
+                    return False
+
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABELA_PENDENTES} (empresa_id INTEGER PRIMARY KEY)"))
+
+            # Recriados sempre, para que bancos existentes recebam a versão atual dos triggers
+            for nome, trigger in _sql_triggers().items():
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {nome}"))
+                conn.execute(text(trigger))
+
+            if not existe:
+                conn.execute(text(_sql_documento(None)))
+            else:
+                IndiceBuscaEmpresa.reindexar_pendentes(conn)
+
+        IndiceBuscaEmpresa._disponivel = True
+        return True
+
+    @staticmethod
+    def reconstruir():
+        """Reconstrói o índice inteiro a partir das tabelas de origem"""
+        if not IndiceBuscaEmpresa.disponivel():
+            return False
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {TABELA_BUSCA}"))
+            conn.execute(text(_sql_documento(None)))
+            conn.execute(text(f"DELETE FROM {TABELA_PENDENTES}"))
+        return True
+
+    @staticmethod
+    def reindexar_pendentes(conexao=None):
+        """Remonta uma única vez o documento de cada empresa anotada pelos triggers das tabelas filhas"""
+        conexao = conexao if conexao is not None else db.session
+        if conexao.execute(text(f"SELECT 1 FROM {TABELA_PENDENTES} LIMIT 1")).first() is None:
+            return False
+        pendentes = f"SELECT empresa_id FROM {TABELA_PENDENTES}"
+        conexao.execute(text(f"DELETE FROM {TABELA_BUSCA} WHERE rowid IN ({pendentes})"))
+        conexao.execute(text(_sql_documento(f"e.id IN ({pendentes})")))
+        conexao.execute(text(f"DELETE FROM {TABELA_PENDENTES}"))
+        return True
+
+    @staticmethod
+    def disponivel():
+        """Indica se o índice FTS5 existe no banco atual"""
+        if IndiceBuscaEmpresa._disponivel is None:
+            IndiceBuscaEmpresa._disponivel = (
+                db.engine.dialect.name == 'sqlite' and
+                db.session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                    {'nome': TABELA_BUSCA}
+                ).first() is not None
+            )
+        return IndiceBuscaEmpresa._disponivel
+
+    @staticmethod
+    def condicao(criterios, termo_livre=None):
+        """
+        Monta a condição de filtro de substring sobre Empresa.id.
+
+        criterios: dict coluna do índice -> texto (ex.: {'tipos_carga': 'refri'})
+        termo_livre: texto procurado em qualquer coluna do índice
+        Retorna None quando não há nada a filtrar.
+        """
+        criterios = {coluna: valor.strip() for coluna, valor in criterios.items() if valor and valor.strip()}
+        termo_livre = termo_livre.strip() if termo_livre else None
+
+        if not criterios and not termo_livre:
+            return None
+
+        if IndiceBuscaEmpresa.disponivel():
+            condicoes = []
+            parametros = []
+            for i, (coluna, valor) in enumerate(criterios.items()):
+                condicoes.append(f"{coluna} LIKE :p{i}")
+                parametros.append(bindparam(f'p{i}', f'%{valor}%', unique=True))
+
+            if termo_livre:
+                if len(termo_livre) >= 3:
+                    condicoes.append(f"{TABELA_BUSCA} MATCH :livre")
+                    parametros.append(bindparam('livre', '"' + termo_livre.replace('"', '""') + '"', unique=True))
+                else:
+                    # Trigramas exigem ao menos 3 caracteres para o MATCH: LIKE em
+                    # todas as colunas do índice, como no fallback
+                    condicoes.append('(' + ' OR '.join(f"{coluna} LIKE :livre" for coluna in COLUNAS_INDICE) + ')')
+                    parametros.append(bindparam('livre', f'%{termo_livre}%', unique=True))
+
+            subquery = text(
+                f"SELECT rowid FROM {TABELA_BUSCA} WHERE {' AND '.join(condicoes)}"
+            ).bindparams(*parametros)
+            return Empresa.id.in_(subquery)
+
+        # Fallback (sem FTS5): subconsultas IN, sem JOIN + DISTINCT
+        condicoes = [_condicao_ilike(coluna, valor) for coluna, valor in criterios.items()]
+        if termo_livre:
+            condicoes.append(or_(*[_condicao_ilike(coluna, termo_livre) for coluna in COLUNAS_INDICE]))
+        return and_(*condicoes)
+
+    @staticmethod
+    def filtrar(query, criterios, termo_livre=None):
+        """Aplica à query de empresas a condição montada por condicao()"""
+        condicao = IndiceBuscaEmpresa.condicao(criterios, termo_livre)
+        if condicao is None:
+            return query
+        return query.filter(condicao)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_escrita_flush(session, flush_context):
+    session.info['busca_empresas_escrita'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_escrita_execute(orm_execute_state):
+    # INSERT/DELETE em massa (session.execute) não passam pelo flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['busca_empresas_escrita'] = True
+
+
+@event.listens_for(Session, 'before_commit')
+def _reindexar_ao_confirmar(session):
+    """Reindexa as empresas anotadas na mesma transação que alterou as tabelas filhas"""
+    # O flush final do commit acontece depois deste evento
+    session.flush()
+    if session.info.pop('busca_empresas_escrita', False) and IndiceBuscaEmpresa.disponivel():
+        IndiceBuscaEmpresa.reindexar_pendentes(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_escrita(session):
+    session.info.pop('busca_empresas_escrita', None)
+
+
+def _condicao_ilike(coluna, valor):
+    """Condição equivalente ao índice usando ILIKE nas tabelas de origem"""
+    padrao = f'%{valor}%'
+    if coluna in COLUNAS_EMPRESA:
+        return getattr(Empresa, coluna).ilike(padrao)
+
+    _, _, modelo, atributos = COLUNAS_RELACIONADAS[coluna]
+    return Empresa.id.in_(
+        select(modelo.empresa_id).where(or_(*[getattr(modelo, a).ilike(padrao) for a in atributos]))
+    )
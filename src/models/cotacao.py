@@ -3,7 +3,17 @@ from datetime import datetime, timedelta
 import pytz
 from enum import Enum
 from . import db
+from sqlalchemy import update
+from sqlalchemy.orm import aliased
 from .usuario import get_brasilia_time, Usuario
+from .unidade_trabalho import unidade_de_trabalho
+
+# Padrão de to_dict(): obter os nomes pelos relacionamentos consultor/operador
+_NOMES_DOS_RELACIONAMENTOS = object()
+
+class CotacaoIndisponivelError(ValueError):
+    """A cotação já foi aceita por outro operador (ou saiu da fila de disponíveis)"""
+
 
 class StatusCotacao(Enum):
     SOLICITADA = "solicitada"  # Consultor solicitou
@@ -20,6 +30,17 @@ class EmpresaCotacao(Enum):
 
 class Cotacao(db.Model):
     __tablename__ = 'cotacoes'
+    # Índices das listas (filtro + ordenação da rota, id como desempate do cursor) e dos painéis
+    __table_args__ = (
+        db.Index('ix_cotacoes_data_solicitacao', 'data_solicitacao', 'id'),
+        db.Index('ix_cotacoes_created_at', 'created_at', 'id'),
+        db.Index('ix_cotacoes_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_cotacoes_empresa_transporte_created_at', 'empresa_transporte', 'created_at', 'id'),
+        db.Index('ix_cotacoes_consultor_created_at', 'consultor_id', 'created_at', 'id'),
+        db.Index('ix_cotacoes_consultor_data_solicitacao', 'consultor_id', 'data_solicitacao', 'id'),
+        db.Index('ix_cotacoes_operador_data_aceite', 'operador_id', 'data_aceite_operador', 'id'),
+        db.Index('ix_cotacoes_empresa_prestadora_status', 'empresa_prestadora_id', 'status'),
+    )
     
     # Identificação
     id = db.Column(db.Integer, primary_key=True)
@@ -113,27 +134,24 @@ class Cotacao(db.Model):
     @staticmethod
     def gerar_numero_cotacao():
         """Gera um número único para a cotação no formato COT-YYYYMMDD-NNNN"""
-        hoje = datetime.now().strftime('%Y%m%d')
+        from .sequencia_cotacao import SequenciaCotacao
         
-        # Buscar o último número do dia
-        ultimo_numero = db.session.query(Cotacao.numero_cotacao)\
-            .filter(Cotacao.numero_cotacao.like(f'COT-{hoje}-%'))\
-            .order_by(Cotacao.numero_cotacao.desc())\
-            .first()
+        hoje = datetime.now().strftime('%Y%m%d')
         
-        if ultimo_numero:
-            # Extrair o número sequencial e incrementar
-            seq = int(ultimo_numero[0].split('-')[-1]) + 1
-        else:
-            seq = 1
+        # Reserva atômica no contador do dia (models/sequencia_cotacao.py)
+        seq = SequenciaCotacao.proximo(hoje)
         
         return f'COT-{hoje}-{seq:04d}'
     
     def pode_ser_aceita_por(self, usuario):
         """Verifica se a cotação pode ser aceita pelo usuário"""
+        return self.status == StatusCotacao.SOLICITADA and Cotacao.usuario_pode_aceitar(usuario)
+    
+    @staticmethod
+    def usuario_pode_aceitar(usuario):
+        """Verifica se o tipo do usuário permite aceitar cotações (sem olhar o status)"""
         from .usuario import TipoUsuario
-        return (self.status == StatusCotacao.SOLICITADA and 
-                usuario.tipo_usuario in [TipoUsuario.OPERADOR, TipoUsuario.ADMINISTRADOR, TipoUsuario.GERENTE])
+        return usuario.tipo_usuario in [TipoUsuario.OPERADOR, TipoUsuario.ADMINISTRADOR, TipoUsuario.GERENTE]
     
     def pode_ser_respondida_por(self, usuario):
         """Verifica se a cotação pode ser respondida pelo usuário"""
@@ -154,14 +172,47 @@ class Cotacao(db.Model):
         from .usuario import TipoUsuario
         return usuario.tipo_usuario in [TipoUsuario.ADMINISTRADOR, TipoUsuario.GERENTE]
     
+    def reivindicar(self, operador_id):
+        """
+        Atribui a cotação ao operador com um UPDATE condicional (compare-and-set):
+        só grava se ela ainda estiver SOLICITADA no banco. Entre operadores que
+        aceitam ao mesmo tempo, apenas um consegue; os demais recebem
+        CotacaoIndisponivelError, sem esperar pelo commit de quem ganhou para
+        descobrir que perderam.
+        """
+        from .estatistica_cotacao import EstatisticaCotacao
+        
+        if self.status != StatusCotacao.SOLICITADA:
+            # Já saiu da fila na leitura: nem tenta gravar
+            raise CotacaoIndisponivelError("Cotação não está mais disponível para aceitação")
+        
+        chave_anterior = EstatisticaCotacao.chave(self.status, self.empresa_transporte, self.operador_id,
+                                                  self.consultor_id, self.created_at)
+        resultado = db.session.execute(
+            update(Cotacao)
+            .where(Cotacao.id == self.id, Cotacao.status == StatusCotacao.SOLICITADA)
+            .values(operador_id=operador_id, status=StatusCotacao.ACEITA_OPERADOR,
+                    data_aceite_operador=get_brasilia_time())
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount != 1:
+            raise CotacaoIndisponivelError("Cotação já foi aceita por outro operador")
+        
+        # O UPDATE não passa pelo flush do ORM: recarregar o objeto e ajustar os contadores
+        db.session.expire(self, ['operador_id', 'status', 'data_aceite_operador', 'updated_at', 'operador'])
+        EstatisticaCotacao.aplicar({
+            chave_anterior: -1,
+            EstatisticaCotacao.chave(StatusCotacao.ACEITA_OPERADOR, self.empresa_transporte, operador_id,
+                                     self.consultor_id, self.created_at): +1,
+        })
+    
     def aceitar(self, operador):
         """Aceita a cotação e atribui ao operador"""
-        if not self.pode_ser_aceita_por(operador):
+        if not Cotacao.usuario_pode_aceitar(operador):
             raise ValueError("Cotação não pode ser aceita por este usuário")
         
-        self.operador_id = operador.id
-        self.status = StatusCotacao.ACEITA_OPERADOR
-        self.data_aceite_operador = get_brasilia_time()
+        # O status é conferido pelo UPDATE condicional: quem perde recebe CotacaoIndisponivelError
+        self.reivindicar(operador.id)
         
         # Registrar no histórico
         HistoricoCotacao.registrar_mudanca(
@@ -273,15 +324,24 @@ class Cotacao(db.Model):
         }
         return color_map.get(self.status, "bg-gray-100 text-gray-800")
     
-    def to_dict(self):
-        """Converte a cotação para dicionário"""
+    def to_dict(self, consultor_nome=_NOMES_DOS_RELACIONAMENTOS, operador_nome=_NOMES_DOS_RELACIONAMENTOS):
+        """
+        Converte a cotação para dicionário.
+        Listas passam os nomes já obtidos na consulta (ver listar_dicts) para
+        não carregar consultor e operador linha a linha.
+        """
+        if consultor_nome is _NOMES_DOS_RELACIONAMENTOS:
+            consultor_nome = self.consultor.nome_completo if self.consultor else None
+        if operador_nome is _NOMES_DOS_RELACIONAMENTOS:
+            operador_nome = self.operador.nome_completo if self.operador else None
+        
         return {
             'id': self.id,
             'numero_cotacao': self.numero_cotacao,
             'consultor_id': self.consultor_id,
-            'consultor_nome': self.consultor.nome_completo if self.consultor else None,
+            'consultor_nome': consultor_nome,
             'operador_id': self.operador_id,
-            'operador_nome': self.operador.nome_completo if self.operador else None,
+            'operador_nome': operador_nome,
             'empresa_transporte': self.empresa_transporte.value,
             'status': self.status.value,
             'status_display': self.get_status_display(),
@@ -338,31 +398,62 @@ class Cotacao(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    @staticmethod
+    def com_nomes_usuarios(query):
+        """Acrescenta à query de cotações os nomes do consultor e do operador (LEFT JOINs)"""
+        consultor = aliased(Usuario)
+        operador = aliased(Usuario)
+        return query\
+            .outerjoin(consultor, Cotacao.consultor_id == consultor.id)\
+            .outerjoin(operador, Cotacao.operador_id == operador.id)\
+            .add_columns(consultor.nome_completo, operador.nome_completo)
+    
+    @staticmethod
+    def linhas_to_dict(linhas):
+        """Serializa linhas (cotacao, consultor_nome, operador_nome) de com_nomes_usuarios()"""
+        return [
+            cotacao.to_dict(consultor_nome=consultor_nome, operador_nome=operador_nome)
+            for cotacao, consultor_nome, operador_nome in linhas
+        ]
+    
+    @staticmethod
+    def listar_dicts(query):
+        """Executa a query de cotações e serializa com um único SELECT, sem carregar os usuários"""
+        return Cotacao.linhas_to_dict(Cotacao.com_nomes_usuarios(query).all())
+    
+    @staticmethod
+    def pagina_dicts(query, coluna, paginacao):
+        """
+        Uma página por cursor da query, ordenada por (coluna, id) decrescentes.
+        paginacao: dicionário de services.paginacao.parametros_cursor().
+        Retorna (cotações serializadas, metadados da paginação).
+        """
+        from src.services.paginacao import paginar_por_cursor
+        linhas, metadados = paginar_por_cursor(
+            query, coluna, Cotacao.id, preparar=Cotacao.com_nomes_usuarios, **paginacao
+        )
+        return Cotacao.linhas_to_dict(linhas), metadados
+    
     # Métodos para integração com sistema de notificações e fluxo completo
     def aceitar_por_operador(self, operador_id, observacoes=None):
-        """Operador aceita a cotação"""
-        if self.status != StatusCotacao.SOLICITADA:
-            raise ValueError("Cotação não está disponível para aceitação")
+        """Operador aceita a cotação (CotacaoIndisponivelError se outro operador aceitou antes)"""
+        with unidade_de_trabalho():
+            status_anterior = StatusCotacao.SOLICITADA
+            self.reivindicar(operador_id)
+        
+            # Registrar no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=self.id,
+                usuario_id=operador_id,
+                status_anterior=status_anterior,
+                status_novo=self.status,
+                observacoes=observacoes
+            )
+        
+            # Notificar consultor
+            from .notificacao import Notificacao
+            Notificacao.notificar_cotacao_aceita(self)
         
-        status_anterior = self.status
-        self.operador_id = operador_id
-        self.status = StatusCotacao.ACEITA_OPERADOR
-        self.data_aceite_operador = get_brasilia_time()
-        
-        # Registrar no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=self.id,
-            usuario_id=operador_id,
-            status_anterior=status_anterior,
-            status_novo=self.status,
-            observacoes=observacoes
-        )
-        
-        # Notificar consultor
-        from .notificacao import Notificacao
-        Notificacao.notificar_cotacao_aceita(self)
-        
-        db.session.commit()
         return True
     
     def enviar_cotacao(self, valor_frete=None, prazo_entrega=None, observacoes=None, empresa_prestadora_id=None):
@@ -370,28 +461,28 @@ class Cotacao(db.Model):
         if self.status != StatusCotacao.ACEITA_OPERADOR:
             raise ValueError("Cotação não está em status adequado para envio")
         
-        status_anterior = self.status
-        self.cotacao_valor_frete = valor_frete
-        self.cotacao_prazo_entrega = prazo_entrega
-        self.cotacao_observacoes = observacoes
-        self.empresa_prestadora_id = empresa_prestadora_id
-        self.status = StatusCotacao.COTACAO_ENVIADA
-        self.data_cotacao_enviada = get_brasilia_time()
-        
-        # Registrar no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=self.id,
-            usuario_id=self.operador_id,
-            status_anterior=status_anterior,
-            status_novo=self.status,
-            observacoes=f"Valor: R$ {valor_frete}, Prazo: {prazo_entrega} dias. {observacoes or ''}"
-        )
+        with unidade_de_trabalho():
+            status_anterior = self.status
+            self.cotacao_valor_frete = valor_frete
+            self.cotacao_prazo_entrega = prazo_entrega
+            self.cotacao_observacoes = observacoes
+            self.empresa_prestadora_id = empresa_prestadora_id
+            self.status = StatusCotacao.COTACAO_ENVIADA
+            self.data_cotacao_enviada = get_brasilia_time()
+        
+            # Registrar no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=self.id,
+                usuario_id=self.operador_id,
+                status_anterior=status_anterior,
+                status_novo=self.status,
+                observacoes=f"Valor: R$ {valor_frete}, Prazo: {prazo_entrega} dias. {observacoes or ''}"
+            )
+        
+            # Notificar consultor
+            from .notificacao import Notificacao
+            Notificacao.notificar_cotacao_respondida(self)
         
-        # Notificar consultor
-        from .notificacao import Notificacao
-        Notificacao.notificar_cotacao_respondida(self)
-        
-        db.session.commit()
         return True
     
     def aceitar_por_consultor(self, observacoes=None):
@@ -399,24 +490,24 @@ class Cotacao(db.Model):
         if self.status != StatusCotacao.COTACAO_ENVIADA:
             raise ValueError("Cotação não está disponível para aceitação pelo consultor")
         
-        status_anterior = self.status
-        self.status = StatusCotacao.ACEITA_CONSULTOR
-        self.data_resposta_cliente = get_brasilia_time()
+        with unidade_de_trabalho():
+            status_anterior = self.status
+            self.status = StatusCotacao.ACEITA_CONSULTOR
+            self.data_resposta_cliente = get_brasilia_time()
         
-        # Registrar no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=self.id,
-            usuario_id=self.consultor_id,
-            status_anterior=status_anterior,
-            status_novo=self.status,
-            observacoes=observacoes
-        )
+            # Registrar no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=self.id,
+                usuario_id=self.consultor_id,
+                status_anterior=status_anterior,
+                status_novo=self.status,
+                observacoes=observacoes
+            )
         
-        # Notificar operador
-        from .notificacao import Notificacao
-        Notificacao.notificar_cotacao_finalizada(self, aceita=True)
+            # Notificar operador
+            from .notificacao import Notificacao
+            Notificacao.notificar_cotacao_finalizada(self, aceita=True)
         
-        db.session.commit()
         return True
     
     def negar_por_consultor(self, observacoes=None):
@@ -424,51 +515,51 @@ class Cotacao(db.Model):
         if self.status != StatusCotacao.COTACAO_ENVIADA:
             raise ValueError("Cotação não está disponível para negação pelo consultor")
         
-        status_anterior = self.status
-        self.status = StatusCotacao.NEGADA_CONSULTOR
-        self.data_resposta_cliente = get_brasilia_time()
+        with unidade_de_trabalho():
+            status_anterior = self.status
+            self.status = StatusCotacao.NEGADA_CONSULTOR
+            self.data_resposta_cliente = get_brasilia_time()
         
-        # Registrar no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=self.id,
-            usuario_id=self.consultor_id,
-            status_anterior=status_anterior,
-            status_novo=self.status,
-            observacoes=observacoes
-        )
+            # Registrar no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=self.id,
+                usuario_id=self.consultor_id,
+                status_anterior=status_anterior,
+                status_novo=self.status,
+                observacoes=observacoes
+            )
         
-        # Notificar operador
-        from .notificacao import Notificacao
-        Notificacao.notificar_cotacao_finalizada(self, aceita=False)
+            # Notificar operador
+            from .notificacao import Notificacao
+            Notificacao.notificar_cotacao_finalizada(self, aceita=False)
         
-        db.session.commit()
         return True
     
     @staticmethod
     def criar_cotacao(dados, consultor_id):
         """Cria uma nova cotação e notifica operadores"""
-        cotacao = Cotacao(
-            consultor_id=consultor_id,
-            **dados
-        )
-        
-        db.session.add(cotacao)
-        db.session.flush()  # Para obter o ID
-        
-        # Registrar criação no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=cotacao.id,
-            usuario_id=consultor_id,
-            status_anterior=None,
-            status_novo=cotacao.status,
-            observacoes="Cotação criada"
-        )
-        
-        # Notificar operadores
-        from .notificacao import Notificacao
-        Notificacao.notificar_nova_cotacao(cotacao)
+        with unidade_de_trabalho():
+            cotacao = Cotacao(
+                consultor_id=consultor_id,
+                **dados
+            )
+            
+            db.session.add(cotacao)
+            db.session.flush()  # Para obter o ID
+            
+            # Registrar criação no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=cotacao.id,
+                usuario_id=consultor_id,
+                status_anterior=None,
+                status_novo=cotacao.status,
+                observacoes="Cotação criada"
+            )
+            
+            # Notificar operadores
+            from .notificacao import Notificacao
+            Notificacao.notificar_nova_cotacao(cotacao)
         
-        db.session.commit()
         return cotacao
     
     def __repr__(self):
@@ -477,6 +568,9 @@ class Cotacao(db.Model):
 
 class HistoricoCotacao(db.Model):
     __tablename__ = 'historico_cotacoes'
+    __table_args__ = (
+        db.Index('ix_historico_cotacoes_cotacao_timestamp', 'cotacao_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cotacao_id = db.Column(db.Integer, db.ForeignKey('cotacoes.id'), nullable=False)
@@ -491,7 +585,7 @@ class HistoricoCotacao(db.Model):
     
     @staticmethod
     def registrar_mudanca(cotacao_id, usuario_id, status_anterior, status_novo, observacoes=None):
-        """Registra uma mudança no histórico da cotação"""
+        """Registra uma mudança no histórico da cotação (gravada no commit de quem chamou)"""
         historico = HistoricoCotacao(
             cotacao_id=cotacao_id,
             usuario_id=usuario_id,
@@ -500,7 +594,6 @@ class HistoricoCotacao(db.Model):
             observacoes=observacoes
         )
         db.session.add(historico)
-        db.session.commit()
         return historico
     
     @staticmethod
@@ -1,9 +1,37 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates, selectinload
 from datetime import datetime
 
 # Importar instância do SQLAlchemy do __init__.py
 from . import db
 
+REGIAO_NAO_INFORMADA = 'Não Informado'
+
+# Mapeamento de estados e cidades para regiões
+REGIOES_KEYWORDS = {
+    'Sudeste': ['SP', 'SÃO PAULO', 'RJ', 'RIO DE JANEIRO', 'MG', 'MINAS GERAIS', 'BELO HORIZONTE', 'ES', 'ESPÍRITO SANTO', 'VITÓRIA'],
+    'Sul': ['RS', 'RIO GRANDE DO SUL', 'PORTO ALEGRE', 'SC', 'SANTA CATARINA', 'FLORIANÓPOLIS', 'PR', 'PARANÁ', 'CURITIBA'],
+    'Nordeste': ['BA', 'BAHIA', 'SALVADOR', 'PE', 'PERNAMBUCO', 'RECIFE', 'CE', 'CEARÁ', 'FORTALEZA', 'PB', 'PARAÍBA', 'JOÃO PESSOA', 'RN', 'RIO GRANDE DO NORTE', 'NATAL', 'AL', 'ALAGOAS', 'MACEIÓ', 'SE', 'SERGIPE', 'ARACAJU', 'MA', 'MARANHÃO', 'SÃO LUÍS', 'PI', 'PIAUÍ', 'TERESINA'],
+    'Centro-Oeste': ['MT', 'MATO GROSSO', 'CUIABÁ', 'MS', 'MATO GROSSO DO SUL', 'CAMPO GRANDE', 'GO', 'GOIÁS', 'GOIÂNIA', 'DF', 'DISTRITO FEDERAL', 'BRASÍLIA'],
+    'Norte': ['AM', 'AMAZONAS', 'MANAUS', 'PA', 'PARÁ', 'BELÉM', 'AC', 'ACRE', 'RIO BRANCO', 'RR', 'RORAIMA', 'BOA VISTA', 'RO', 'RONDÔNIA', 'PORTO VELHO', 'AP', 'AMAPÁ', 'MACAPÁ', 'TO', 'TOCANTINS', 'PALMAS']
+}
+
+
+def extrair_regiao_do_endereco(endereco):
+    """Extrai a região do endereço completo baseado em palavras-chave"""
+    if not endereco or endereco == 'Não informado' or endereco.strip() == '':
+        return REGIAO_NAO_INFORMADA
+    
+    endereco_upper = endereco.upper()
+    
+    for regiao, keywords in REGIOES_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in endereco_upper:
+                return regiao
+    
+    return REGIAO_NAO_INFORMADA
+
+
 class Empresa(db.Model):
     __tablename__ = 'empresas'
     id = db.Column(db.Integer, primary_key=True)
@@ -20,6 +48,7 @@ class Empresa(db.Model):
     observacoes = db.Column(db.Text)  # Campo para observações gerais
     link_cotacao = db.Column(db.String(200))  # Link para cotação da transportadora
     etiqueta = db.Column(db.String(50), default='CADASTRADA') # PARCEIRA, CADASTRADA, ENCERRADO
+    regiao = db.Column(db.String(20), default=REGIAO_NAO_INFORMADA) # Derivada de endereco_completo
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -38,6 +67,53 @@ class Empresa(db.Model):
     recursos_humanos = db.relationship('RecursoHumano', backref='empresa', lazy=True, cascade='all, delete-orphan')
     sustentabilidade = db.relationship('Sustentabilidade', backref='empresa', lazy=True, cascade='all, delete-orphan')
 
+    @validates('endereco_completo')
+    def _atualizar_regiao(self, key, endereco):
+        """Mantém a região pré-calculada sempre que o endereço muda"""
+        self.regiao = extrair_regiao_do_endereco(endereco)
+        return endereco
+
+    @staticmethod
+    def classificar_regioes_pendentes():
+        """Preenche a região de empresas gravadas sem passar pelo ORM (ex.: scripts SQL)"""
+        pendentes = db.session.execute(
+            db.select(Empresa.id, Empresa.endereco_completo).where(Empresa.regiao.is_(None))
+        ).all()
+        if not pendentes:
+            return 0
+        
+        tabela = Empresa.__table__
+        db.session.execute(
+            # updated_at reatribuído a si mesmo para não disparar o onupdate
+            tabela.update()
+            .where(tabela.c.id == db.bindparam('b_id'))
+            .values(regiao=db.bindparam('b_regiao'), updated_at=tabela.c.updated_at),
+            [{'b_id': id, 'b_regiao': extrair_regiao_do_endereco(endereco)} for id, endereco in pendentes]
+        )
+        db.session.commit()
+        return len(pendentes)
+
+    # Relacionamentos serializados por to_dict_complete()
+    RELACIONAMENTOS_COMPLETOS = (
+        'regulamentacoes', 'certificacoes', 'modalidades_transporte', 'tipos_carga',
+        'abrangencia_geografica', 'frota', 'armazenagem', 'portos_terminais',
+        'seguros_coberturas', 'tecnologias', 'desempenho_qualidade',
+        'clientes_segmentos', 'recursos_humanos', 'sustentabilidade'
+    )
+
+    @staticmethod
+    def opcoes_grafo_completo():
+        """Opções de carregamento que trazem todos os relacionamentos com um SELECT ... IN por tabela"""
+        return [selectinload(getattr(Empresa, nome)) for nome in Empresa.RELACIONAMENTOS_COMPLETOS]
+
+    @staticmethod
+    def consulta_completa():
+        """
+        Query de empresas com o grafo completo: 1 SELECT de empresas + 1 por
+        relacionamento, independente da quantidade de empresas e de linhas filhas
+        """
+        return Empresa.query.options(*Empresa.opcoes_grafo_completo())
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -93,13 +169,16 @@ class Empresa(db.Model):
 class Regulamentacao(db.Model):
     __tablename__ = 'regulamentacoes'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     tipo_regulamentacao = db.Column(db.String(100), nullable=False)
     numero_registro = db.Column(db.String(100))
     data_emissao = db.Column(db.Date)
     data_validade = db.Column(db.Date)
     orgao_emissor = db.Column(db.String(100))
 
+    # Campos que identificam o registro ao reconciliar alterações (vazio: registro único por empresa)
+    CHAVE_NATURAL = ('tipo_regulamentacao', 'numero_registro')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -113,13 +192,15 @@ class Regulamentacao(db.Model):
 class Certificacao(db.Model):
     __tablename__ = 'certificacoes'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     nome_certificacao = db.Column(db.String(100), nullable=False)
     numero_certificacao = db.Column(db.String(100))
     data_emissao = db.Column(db.Date)
     data_validade = db.Column(db.Date)
     orgao_certificador = db.Column(db.String(100))
 
+    CHAVE_NATURAL = ('nome_certificacao', 'numero_certificacao')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -133,9 +214,11 @@ class Certificacao(db.Model):
 class ModalidadeTransporte(db.Model):
     __tablename__ = 'modalidades_transporte'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     modalidade = db.Column(db.String(100), nullable=False)
 
+    CHAVE_NATURAL = ('modalidade',)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -145,9 +228,11 @@ class ModalidadeTransporte(db.Model):
 class TipoCarga(db.Model):
     __tablename__ = 'tipos_carga'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     tipo_carga = db.Column(db.String(100), nullable=False)
 
+    CHAVE_NATURAL = ('tipo_carga',)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -157,10 +242,12 @@ class TipoCarga(db.Model):
 class AbrangenciaGeografica(db.Model):
     __tablename__ = 'abrangencia_geografica'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     tipo_abrangencia = db.Column(db.String(100), nullable=False) # Ex: Nacional, Regional, Internacional
     detalhes = db.Column(db.String(500)) # Ex: Estados atendidos, rotas específicas
 
+    CHAVE_NATURAL = ('tipo_abrangencia', 'detalhes')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -171,7 +258,7 @@ class AbrangenciaGeografica(db.Model):
 class Frota(db.Model):
     __tablename__ = 'frota'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     tipo_frota = db.Column(db.String(100), nullable=False) # Ex: Própria, Terceirizada
     quantidade = db.Column(db.Integer)
     tipo_veiculo = db.Column(db.String(100)) # Ex: Carreta, Caminhão, Van
@@ -179,6 +266,8 @@ class Frota(db.Model):
     capacidade = db.Column(db.Float) # Capacidade em toneladas
     ano_medio = db.Column(db.Integer) # Ano médio da frota
 
+    CHAVE_NATURAL = ('tipo_frota', 'tipo_veiculo', 'tipo_carroceria')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -193,7 +282,7 @@ class Frota(db.Model):
 class Armazenagem(db.Model):
     __tablename__ = 'armazenagem'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     possui_armazem = db.Column(db.Boolean, nullable=False)
     localizacao = db.Column(db.String(255))
     capacidade_m2 = db.Column(db.Float)
@@ -201,6 +290,8 @@ class Armazenagem(db.Model):
     tipos_armazenagem = db.Column(db.String(255)) # Ex: Seca, Refrigerada, Climatizada
     servicos_oferecidos = db.Column(db.String(500)) # Ex: Cross-docking, Picking, Packing, Controle de inventário
 
+    CHAVE_NATURAL = ('localizacao',)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -215,10 +306,12 @@ class Armazenagem(db.Model):
 class PortoTerminal(db.Model):
     __tablename__ = 'portos_terminais'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     nome_porto_terminal = db.Column(db.String(255), nullable=False)
     tipo_terminal = db.Column(db.String(100)) # Ex: Marítimo, Ferroviário, Rodoviário
 
+    CHAVE_NATURAL = ('nome_porto_terminal', 'tipo_terminal')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -229,13 +322,15 @@ class PortoTerminal(db.Model):
 class SeguroCobertura(db.Model):
     __tablename__ = 'seguros_coberturas'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     tipo_seguro = db.Column(db.String(100), nullable=False) # Ex: RCTR-C, RC-DC, RCTF-DA
     numero_apolice = db.Column(db.String(100))
     data_validade = db.Column(db.Date)
     seguradora = db.Column(db.String(100))
     valor_cobertura = db.Column(db.String(50))  # Valor da cobertura como string formatada
 
+    CHAVE_NATURAL = ('tipo_seguro', 'seguradora')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -249,10 +344,12 @@ class SeguroCobertura(db.Model):
 class Tecnologia(db.Model):
     __tablename__ = 'tecnologias'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     nome_tecnologia = db.Column(db.String(100), nullable=False) # Ex: Rastreamento GPS, Telemetria, TMS, WMS
     detalhes = db.Column(db.String(500))
 
+    CHAVE_NATURAL = ('nome_tecnologia',)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -263,12 +360,14 @@ class Tecnologia(db.Model):
 class DesempenhoQualidade(db.Model):
     __tablename__ = 'desempenho_qualidade'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     prazo_medio_atendimento = db.Column(db.String(100)) # Em dias ou horas
     unidade_prazo = db.Column(db.String(10), default='dias') # 'horas' ou 'dias'
     indice_avarias_extravios = db.Column(db.Float) # Percentual
     indice_entregas_prazo = db.Column(db.Float) # Percentual
 
+    CHAVE_NATURAL = ()
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -281,10 +380,12 @@ class DesempenhoQualidade(db.Model):
 class ClienteSegmento(db.Model):
     __tablename__ = 'clientes_segmentos'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     segmento = db.Column(db.String(100), nullable=False) # Ex: Varejo, Indústria, Agronegócio
     principais_clientes = db.Column(db.String(500)) # Lista dos principais clientes
 
+    CHAVE_NATURAL = ('segmento',)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -295,10 +396,12 @@ class ClienteSegmento(db.Model):
 class RecursoHumano(db.Model):
     __tablename__ = 'recursos_humanos'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     numero_funcionarios = db.Column(db.Integer)
     programas_treinamento = db.Column(db.String(500)) # Ex: Direção defensiva, Produtos perigosos
 
+    CHAVE_NATURAL = ()
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -309,10 +412,12 @@ class RecursoHumano(db.Model):
 class Sustentabilidade(db.Model):
     __tablename__ = 'sustentabilidade'
     id = db.Column(db.Integer, primary_key=True)
-    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False, index=True)
     certificacao_ambiental = db.Column(db.String(100)) # Ex: ISO 14001
     programas_reducao_emissoes = db.Column(db.String(500)) # Ex: Frota Euro 5/6, Biodiesel
 
+    CHAVE_NATURAL = ('certificacao_ambiental',)
+
     def to_dict(self):
         return {
             'id': self.id,
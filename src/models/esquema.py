@@ -0,0 +1,36 @@
+"""
+Atualização incremental do esquema do banco
+
+O db.create_all() cria as tabelas que ainda não existem; colunas, índices
+e tabelas acrescentados depois do esquema inicial são descritos pelas
+revisões do Alembic em src/migrations/versions. Esse é o único mecanismo:
+atualizar_esquema() aplica as revisões pendentes na inicialização da
+aplicação (o mesmo que `flask db upgrade`) e em seguida preenche os dados
+derivados que dependem de código Python. Cada revisão é idempotente, pois o
+banco pode ter sido criado pelo create_all() com os modelos atuais.
+"""
+
+import os
+
+from alembic import command
+from flask import current_app
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+def aplicar_migracoes():
+    """Aplica as revisões do Alembic ainda não registradas em alembic_version"""
+    config = current_app.extensions['migrate'].migrate.get_config(DIRETORIO_MIGRACOES)
+    # O logging da aplicação já está configurado: o env.py não deve reconfigurá-lo
+    config.attributes['logging_configurado'] = True
+    command.upgrade(config, 'head')
+
+
+def atualizar_esquema():
+    """Aplica as alterações de esquema pendentes e preenche os dados derivados"""
+    from .empresa import Empresa
+
+    aplicar_migracoes()
+
+    # Empresas existentes (ou gravadas via SQL direto) sem região calculada
+    Empresa.classificar_regioes_pendentes()
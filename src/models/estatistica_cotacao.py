@@ -0,0 +1,181 @@
+"""
+Contadores materializados de cotações
+
+Cada linha guarda quantas cotações existem para uma combinação de
+(status, empresa de transporte, operador, consultor, dia de criação).
+Os contadores são atualizados na mesma transação que grava a cotação,
+por meio de eventos da sessão: qualquer criação, mudança de status,
+atribuição de operador ou exclusão feita pelo ORM (inclusive pelos métodos
+de transição de Cotacao) ajusta os contadores no flush. Assim os
+dashboards leem poucas linhas agregadas em vez de varrer a tabela cotacoes.
+"""
+
+from datetime import date
+
+from sqlalchemy import event, func, insert, update, delete, select, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import db
+from .cotacao import Cotacao, StatusCotacao, EmpresaCotacao
+
+# Cotações sem operador são contadas com operador_id = 0
+SEM_OPERADOR = 0
+# Dia usado para cotações antigas sem data de criação
+DIA_DESCONHECIDO = date(1970, 1, 1)
+
+# Atributos de Cotacao que compõem a chave dos contadores
+CAMPOS_CHAVE = ('status', 'empresa_transporte', 'operador_id', 'consultor_id', 'created_at')
+
+
+class EstatisticaCotacao(db.Model):
+    __tablename__ = 'estatisticas_cotacoes'
+
+    status = db.Column(db.Enum(StatusCotacao), primary_key=True)
+    empresa_transporte = db.Column(db.Enum(EmpresaCotacao), primary_key=True)
+    operador_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    consultor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    dia = db.Column(db.Date, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def chave(status, empresa_transporte, operador_id, consultor_id, created_at):
+        """Monta a chave do contador a partir dos campos de uma cotação"""
+        return (
+            status or StatusCotacao.SOLICITADA,
+            empresa_transporte or EmpresaCotacao.BRCARGO_RODOVIARIO,
+            operador_id or SEM_OPERADOR,
+            consultor_id,
+            created_at.date() if created_at else DIA_DESCONHECIDO
+        )
+
+    @staticmethod
+    def aplicar(deltas, conexao=None):
+        """
+        Aplica variações aos contadores: {chave: +n/-n}.
+        Usado pelos eventos da sessão e por caminhos que alteram cotações
+        sem passar pelo ORM (ex.: UPDATE em massa).
+        """
+        deltas = {chave: valor for chave, valor in deltas.items() if valor}
+        if not deltas:
+            return
+
+        executar = (conexao or db.session).execute
+        tabela = EstatisticaCotacao.__table__
+        dialeto = (conexao or db.session).get_bind().dialect.name
+
+        for (status, empresa, operador_id, consultor_id, dia), valor in deltas.items():
+            chave = dict(status=status, empresa_transporte=empresa, operador_id=operador_id,
+                         consultor_id=consultor_id, dia=dia)
+
+            if dialeto in ('sqlite', 'postgresql'):
+                if dialeto == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert as upsert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert as upsert
+                stmt = upsert(tabela).values(quantidade=valor, **chave)
+                executar(stmt.on_conflict_do_update(
+                    index_elements=[c.name for c in tabela.primary_key.columns],
+                    set_={'quantidade': tabela.c.quantidade + stmt.excluded.quantidade}
+                ))
+            else:
+                filtro = [tabela.c[coluna] == v for coluna, v in chave.items()]
+                resultado = executar(
+                    update(tabela).where(*filtro).values(quantidade=tabela.c.quantidade + valor)
+                )
+                if resultado.rowcount == 0:
+                    executar(insert(tabela).values(quantidade=valor, **chave))
+
+        # Remover combinações que zeraram
+        executar(delete(tabela).where(tabela.c.quantidade <= 0))
+
+    @staticmethod
+    def reconstruir():
+        """Recalcula todos os contadores a partir da tabela cotacoes"""
+        tabela = EstatisticaCotacao.__table__
+        dia = func.coalesce(func.date(Cotacao.created_at), literal(DIA_DESCONHECIDO))
+        operador = func.coalesce(Cotacao.operador_id, SEM_OPERADOR)
+
+        agregado = select(
+            Cotacao.status, Cotacao.empresa_transporte, operador, Cotacao.consultor_id,
+            dia, func.count(Cotacao.id)
+        ).group_by(Cotacao.status, Cotacao.empresa_transporte, operador, Cotacao.consultor_id, dia)
+
+        db.session.execute(delete(tabela))
+        db.session.execute(insert(tabela).from_select(
+            ['status', 'empresa_transporte', 'operador_id', 'consultor_id', 'dia', 'quantidade'],
+            agregado
+        ))
+        db.session.commit()
+
+    @staticmethod
+    def contagens(agrupar_por, consultor_id=None, dia=None, status=None):
+        """Soma os contadores agrupados por uma coluna: {valor: quantidade}"""
+        coluna = EstatisticaCotacao.__table__.c[agrupar_por]
+        query = select(coluna, func.sum(EstatisticaCotacao.quantidade)).group_by(coluna)
+        if consultor_id is not None:
+            query = query.where(EstatisticaCotacao.consultor_id == consultor_id)
+        if dia is not None:
+            query = query.where(EstatisticaCotacao.dia == dia)
+        if status is not None:
+            query = query.where(EstatisticaCotacao.status.in_(status))
+        return {valor: int(quantidade) for valor, quantidade in db.session.execute(query)}
+
+
+def _chave_cotacao(cotacao, anterior):
+    """Chave do contador da cotação antes (anterior=True) ou depois da alteração"""
+    valores = []
+    for campo in CAMPOS_CHAVE:
+        historico = get_history(cotacao, campo)
+        if anterior and historico.deleted:
+            valores.append(historico.deleted[0])
+        elif anterior and historico.added:
+            # Valor anterior era nulo
+            valores.append(None)
+        else:
+            valores.append(getattr(cotacao, campo))
+    return EstatisticaCotacao.chave(*valores)
+
+
+def _somar(deltas, chave, valor):
+    deltas[chave] = deltas.get(chave, 0) + valor
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_alteracoes(session, flush_context, instances):
+    """Captura a chave anterior das cotações alteradas ou excluídas (ainda no banco)"""
+    deltas = session.info.setdefault('estatisticas_cotacoes', {})
+
+    for obj in session.dirty:
+        if isinstance(obj, Cotacao) and obj not in session.deleted:
+            if any(get_history(obj, campo).has_changes() for campo in CAMPOS_CHAVE):
+                _somar(deltas, _chave_cotacao(obj, anterior=True), -1)
+                _somar(deltas, _chave_cotacao(obj, anterior=False), +1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Cotacao):
+            _somar(deltas, _chave_cotacao(obj, anterior=True), -1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_contadores(session, flush_context):
+    """Soma as cotações novas (com defaults já aplicados) e grava os contadores"""
+    deltas = session.info.pop('estatisticas_cotacoes', {})
+
+    for obj in session.new:
+        if isinstance(obj, Cotacao):
+            _somar(deltas, _chave_cotacao(obj, anterior=False), +1)
+
+    EstatisticaCotacao.aplicar(deltas, conexao=session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(session):
+    session.info.pop('estatisticas_cotacoes', None)
+
+
+# Carregar sempre o valor anterior ao alterar os campos da chave, mesmo que
+# o atributo esteja expirado, para que o contador antigo possa ser decrementado
+for _campo in CAMPOS_CHAVE:
+    event.listen(getattr(Cotacao, _campo), 'set', lambda target, value, oldvalue, initiator: value,
+                 active_history=True, retval=True)
@@ -0,0 +1,181 @@
+"""
+Tarefas em segundo plano (importações e exportações longas)
+
+Cada tarefa é uma linha da tabela jobs: o endpoint cria a tarefa e devolve
+o id imediatamente, o executor (services/jobs.py) atualiza status e
+progresso, e o cliente consulta o andamento e baixa o resultado ao final.
+
+A tarefa guarda o pid do worker que a executa, e esse worker renova
+heartbeat_em periodicamente. Se o worker for reciclado ou morto no meio da
+tarefa, o heartbeat para e marcar_abandonados() a encerra com erro.
+"""
+
+import os
+import json
+import uuid
+from datetime import timedelta
+from enum import Enum
+
+from sqlalchemy import func, update
+
+from . import db
+from .usuario import get_brasilia_time
+
+# Diretório onde ficam os arquivos gerados pelas tarefas (ex.: exportações)
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'jobs')
+
+
+class StatusJob(Enum):
+    PENDENTE = "pendente"  # Aguardando uma thread livre
+    EXECUTANDO = "executando"
+    CONCLUIDO = "concluido"
+    ERRO = "erro"
+
+
+def _novo_id():
+    return uuid.uuid4().hex
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(32), primary_key=True, default=_novo_id)
+    tipo = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.Enum(StatusJob), nullable=False, default=StatusJob.PENDENTE, index=True)
+    progresso = db.Column(db.Integer, nullable=False, default=0)
+    mensagem = db.Column(db.String(255))
+    resultado = db.Column(db.Text)  # JSON com o resumo da tarefa (ex.: estatísticas da importação)
+    arquivo = db.Column(db.String(500))  # Caminho do arquivo gerado, quando houver
+    erro = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    pid = db.Column(db.Integer)  # Processo (worker) responsável pela tarefa
+    heartbeat_em = db.Column(db.DateTime)  # Último sinal de vida desse processo
+
+    created_at = db.Column(db.DateTime, default=get_brasilia_time, index=True)
+    iniciado_em = db.Column(db.DateTime)
+    finalizado_em = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.tipo}: {self.status.value if self.status else None}>'
+
+    @property
+    def finalizado(self):
+        return self.status in (StatusJob.CONCLUIDO, StatusJob.ERRO)
+
+    def pode_ser_acessado_por(self, usuario):
+        """Tarefas sem dono são acessíveis a quem conhece o id; as demais, ao dono e administradores"""
+        if self.usuario_id is None:
+            return True
+        if usuario is None or not getattr(usuario, 'is_authenticated', False):
+            return False
+        from .usuario import TipoUsuario
+        return usuario.id == self.usuario_id or usuario.tipo_usuario == TipoUsuario.ADMINISTRADOR
+
+    def to_dict(self):
+        """Converte a tarefa para dicionário"""
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'status': self.status.value if self.status else None,
+            'progresso': self.progresso,
+            'mensagem': self.mensagem,
+            'resultado': json.loads(self.resultado) if self.resultado else None,
+            'possui_arquivo': bool(self.arquivo) and self.status == StatusJob.CONCLUIDO,
+            'erro': self.erro,
+            'usuario_id': self.usuario_id,
+            'pid': self.pid,
+            'heartbeat_em': self.heartbeat_em.isoformat() if self.heartbeat_em else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+            'finalizado_em': self.finalizado_em.isoformat() if self.finalizado_em else None
+        }
+
+    @staticmethod
+    def caminho_resultado(job_id, extensao):
+        """Caminho do arquivo de resultado de uma tarefa"""
+        os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+        return os.path.join(DIRETORIO_RESULTADOS, f'{job_id}.{extensao}')
+
+    @staticmethod
+    def atualizar(job_id, **valores):
+        """
+        Atualiza a tarefa em uma conexão própria, fora da transação de quem a
+        executa, para que o progresso fique visível imediatamente para os
+        outros workers.
+        """
+        with db.engine.begin() as conn:
+            conn.execute(update(Job.__table__).where(Job.__table__.c.id == job_id).values(**valores))
+
+    @staticmethod
+    def marcar_interrompidos():
+        """Marca como erro as tarefas que estavam em andamento quando a aplicação parou"""
+        with db.engine.begin() as conn:
+            resultado = conn.execute(
+                update(Job.__table__)
+                .where(Job.__table__.c.status.in_([StatusJob.PENDENTE, StatusJob.EXECUTANDO]))
+                .values(status=StatusJob.ERRO, erro='Tarefa interrompida pela reinicialização do servidor',
+                        finalizado_em=get_brasilia_time())
+            )
+        return resultado.rowcount
+
+    @staticmethod
+    def registrar_heartbeat(pid):
+        """Renova o sinal de vida das tarefas em aberto do processo"""
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job.__table__)
+                .where(Job.__table__.c.pid == pid,
+                       Job.__table__.c.status.in_([StatusJob.PENDENTE, StatusJob.EXECUTANDO]))
+                .values(heartbeat_em=get_brasilia_time())
+            )
+
+    @staticmethod
+    def marcar_do_processo(pid, mensagem):
+        """Marca como erro as tarefas em aberto de um processo que está encerrando"""
+        with db.engine.begin() as conn:
+            resultado = conn.execute(
+                update(Job.__table__)
+                .where(Job.__table__.c.pid == pid,
+                       Job.__table__.c.status.in_([StatusJob.PENDENTE, StatusJob.EXECUTANDO]))
+                .values(status=StatusJob.ERRO, erro=mensagem, finalizado_em=get_brasilia_time())
+            )
+        return resultado.rowcount
+
+    @staticmethod
+    def marcar_abandonados(segundos, job_id=None):
+        """
+        Marca como erro as tarefas em aberto sem heartbeat há mais de
+        `segundos`: o worker que as executava foi encerrado (reciclagem,
+        timeout ou falha) sem finalizá-las. Com job_id, verifica só essa tarefa.
+        """
+        tabela = Job.__table__
+        limite = get_brasilia_time() - timedelta(seconds=segundos)
+        condicoes = [
+            tabela.c.status.in_([StatusJob.PENDENTE, StatusJob.EXECUTANDO]),
+            func.coalesce(tabela.c.heartbeat_em, tabela.c.created_at) < limite,
+        ]
+        if job_id is not None:
+            condicoes.append(tabela.c.id == job_id)
+        with db.engine.begin() as conn:
+            resultado = conn.execute(
+                update(tabela).where(*condicoes)
+                .values(status=StatusJob.ERRO,
+                        erro='Tarefa interrompida: o processo que a executava foi encerrado',
+                        finalizado_em=get_brasilia_time())
+            )
+        return resultado.rowcount
+
+    @staticmethod
+    def remover_antigos(dias=7):
+        """Remove tarefas finalizadas há mais de `dias` dias e seus arquivos"""
+        limite = get_brasilia_time() - timedelta(days=dias)
+        antigos = Job.query.filter(
+            Job.status.in_([StatusJob.CONCLUIDO, StatusJob.ERRO]),
+            Job.created_at < limite
+        ).all()
+        for job in antigos:
+            if job.arquivo and os.path.exists(job.arquivo):
+                os.remove(job.arquivo)
+            db.session.delete(job)
+        db.session.commit()
+        return len(antigos)
@@ -2,9 +2,11 @@
 Modelo para sistema de notificações
 """
 
+from collections import Counter
 from enum import Enum
+from sqlalchemy import insert, select, update
 from . import db
-from .usuario import get_brasilia_time
+from .usuario import Usuario, get_brasilia_time
 
 class TipoNotificacao(Enum):
     NOVA_COTACAO = "nova_cotacao"  # Para operadores: nova cotação disponível
@@ -14,6 +16,10 @@ class TipoNotificacao(Enum):
 
 class Notificacao(db.Model):
     __tablename__ = 'notificacoes'
+    # Listagem e contagem de não lidas por usuário
+    __table_args__ = (
+        db.Index('ix_notificacoes_usuario_lida_created_at', 'usuario_id', 'lida', 'created_at'),
+    )
     
     # Identificação
     id = db.Column(db.Integer, primary_key=True)
@@ -54,7 +60,7 @@ class Notificacao(db.Model):
     
     @staticmethod
     def criar_notificacao(usuario_id, cotacao_id, tipo, titulo, mensagem):
-        """Cria uma nova notificação"""
+        """Cria uma nova notificação (gravada no commit de quem chamou)"""
         notificacao = Notificacao(
             usuario_id=usuario_id,
             cotacao_id=cotacao_id,
@@ -64,24 +70,46 @@ class Notificacao(db.Model):
         )
         
         db.session.add(notificacao)
-        db.session.commit()
+        Usuario.ajustar_notificacoes_nao_lidas([usuario_id], 1)
         
         return notificacao
     
     @staticmethod
     def marcar_como_lida(notificacao_id, usuario_id):
         """Marca uma notificação como lida"""
-        notificacao = Notificacao.query.filter_by(
-            id=notificacao_id,
-            usuario_id=usuario_id
-        ).first()
+        # Só a transição não lida -> lida desconta do contador (cliques repetidos não)
+        marcadas = db.session.execute(
+            update(Notificacao)
+            .where(Notificacao.id == notificacao_id, Notificacao.usuario_id == usuario_id,
+                   Notificacao.lida.is_(False))
+            .values(lida=True),
+            execution_options={'synchronize_session': False}
+        ).rowcount
         
-        if notificacao:
-            notificacao.lida = True
+        if marcadas:
+            Usuario.ajustar_notificacoes_nao_lidas([usuario_id], -1)
             db.session.commit()
             return True
         
-        return False
+        return db.session.scalar(
+            select(Notificacao.id).where(Notificacao.id == notificacao_id, Notificacao.usuario_id == usuario_id)
+        ) is not None
+    
+    @staticmethod
+    def marcar_todas_como_lidas(usuario_id):
+        """Marca todas as notificações do usuário como lidas e retorna quantas mudaram"""
+        marcadas = db.session.execute(
+            update(Notificacao)
+            .where(Notificacao.usuario_id == usuario_id, Notificacao.lida.is_(False))
+            .values(lida=True),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        
+        # Subtrai em vez de zerar: notificações gravadas por outra transação
+        # depois deste UPDATE continuam contadas
+        Usuario.ajustar_notificacoes_nao_lidas([usuario_id], -marcadas)
+        db.session.commit()
+        return marcadas
     
     @staticmethod
     def obter_nao_lidas(usuario_id):
@@ -93,32 +121,68 @@ class Notificacao(db.Model):
     
     @staticmethod
     def contar_nao_lidas(usuario_id):
-        """Conta notificações não lidas de um usuário"""
-        return Notificacao.query.filter_by(
-            usuario_id=usuario_id,
-            lida=False
-        ).count()
+        """Total de notificações não lidas de um usuário (contador em usuarios)"""
+        # Nas requisições o usuário logado já está na sessão: sem consulta extra
+        usuario = db.session.get(Usuario, usuario_id)
+        return usuario.notificacoes_nao_lidas if usuario else 0
+    
+    @staticmethod
+    def notificar_usuarios(usuario_ids, cotacao_id, tipo, titulo, mensagem):
+        """Cria a mesma notificação para vários usuários com um único INSERT
+
+        A mensagem é montada uma vez e as linhas são gravadas na transação
+        de quem chamou, sem carregar objetos Usuario/Notificacao.
+        """
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids:
+            return 0
+        
+        agora = get_brasilia_time()
+        db.session.execute(insert(Notificacao), [
+            {
+                'usuario_id': usuario_id,
+                'cotacao_id': cotacao_id,
+                'tipo': tipo,
+                'titulo': titulo,
+                'mensagem': mensagem,
+                'lida': False,
+                'created_at': agora
+            }
+            for usuario_id in usuario_ids
+        ])
+        
+        por_quantidade = {}
+        for usuario_id, quantidade in Counter(usuario_ids).items():
+            por_quantidade.setdefault(quantidade, []).append(usuario_id)
+        for quantidade, ids in por_quantidade.items():
+            Usuario.ajustar_notificacoes_nao_lidas(ids, quantidade)
+        
+        # INSERT fora do flush do ORM: avisar as conexões SSE após o commit
+        from src.services.eventos import marcar_pendente
+        marcar_pendente(db.session)
+        return len(usuario_ids)
     
     @staticmethod
     def notificar_nova_cotacao(cotacao):
-        """Notifica todos os operadores sobre nova cotação"""
-        from .usuario import Usuario
+        """Notifica todos os operadores ativos sobre nova cotação"""
+        from .usuario import TipoUsuario
+        
+        operador_ids = db.session.scalars(
+            select(Usuario.id).where(Usuario.tipo_usuario == TipoUsuario.OPERADOR, Usuario.ativo.is_(True))
+        ).all()
         
-        operadores = Usuario.query.filter_by(tipo='operador', ativo=True).all()
+        titulo = f"Nova Cotação Disponível - {cotacao.numero_cotacao}"
+        mensagem = f"Uma nova cotação foi solicitada por {cotacao.consultor.nome_completo}. " \
+                  f"Empresa: {cotacao.empresa_transporte.value}. " \
+                  f"Cliente: {cotacao.cliente_nome}."
         
-        for operador in operadores:
-            titulo = f"Nova Cotação Disponível - {cotacao.numero_cotacao}"
-            mensagem = f"Uma nova cotação foi solicitada por {cotacao.consultor.nome_completo}. " \
-                      f"Empresa: {cotacao.empresa_transporte.value}. " \
-                      f"Cliente: {cotacao.cliente_nome}."
-            
-            Notificacao.criar_notificacao(
-                usuario_id=operador.id,
-                cotacao_id=cotacao.id,
-                tipo=TipoNotificacao.NOVA_COTACAO,
-                titulo=titulo,
-                mensagem=mensagem
-            )
+        return Notificacao.notificar_usuarios(
+            operador_ids,
+            cotacao_id=cotacao.id,
+            tipo=TipoNotificacao.NOVA_COTACAO,
+            titulo=titulo,
+            mensagem=mensagem
+        )
     
     @staticmethod
     def notificar_cotacao_aceita(cotacao):
@@ -0,0 +1,83 @@
+"""
+Perfil de conexão do SQLite
+
+Os PRAGMAs abaixo valem por conexão (exceto journal_mode, que fica gravado
+no arquivo) e são aplicados no evento 'connect' do engine, ou seja, em cada
+conexão nova do pool de cada worker do gunicorn.
+
+Perfis (variável SQLITE_PERFIL):
+- concorrente (padrão): WAL, para leitores não bloquearem o escritor nem o
+  escritor bloquear os leitores; synchronous=NORMAL (seguro em WAL, fsync
+  só no checkpoint); busy_timeout para o escritor aguardar a vez em vez de
+  falhar com "database is locked"; mmap/cache/temp_store em memória.
+- padrao: não altera nada (comportamento original do SQLite, journal
+  DELETE), usado para comparação no benchmark.
+
+Cada valor pode ser sobrescrito por variável de ambiente (SQLITE_BUSY_TIMEOUT_MS,
+SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_TEMP_STORE).
+"""
+
+import os
+
+from sqlalchemy import event
+
+PERFIS = {
+    'padrao': {},
+    'concorrente': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negativo = KiB
+        'temp_store': 'MEMORY',
+    },
+}
+
+# (pragma, variável de ambiente, conversão)
+SOBRESCRITAS = [
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT_MS', int),
+    ('synchronous', 'SQLITE_SYNCHRONOUS', str),
+    ('mmap_size', 'SQLITE_MMAP_SIZE', int),
+    ('cache_size', 'SQLITE_CACHE_SIZE_KB', lambda valor: -abs(int(valor))),
+    ('temp_store', 'SQLITE_TEMP_STORE', str),
+]
+
+
+def pragmas_do_perfil(nome=None):
+    """PRAGMAs do perfil (SQLITE_PERFIL por padrão) com as sobrescritas do ambiente"""
+    nome = nome or os.getenv('SQLITE_PERFIL', 'concorrente')
+    if nome not in PERFIS:
+        raise ValueError(f"Perfil SQLite desconhecido: {nome} (use {', '.join(PERFIS)})")
+    pragmas = dict(PERFIS[nome])
+    if pragmas:
+        for pragma, variavel, converter in SOBRESCRITAS:
+            if os.getenv(variavel):
+                pragmas[pragma] = converter(os.getenv(variavel))
+    return pragmas
+
+
+def aplicar_pragmas(conexao_dbapi, pragmas):
+    """Executa os PRAGMAs em uma conexão sqlite3"""
+    cursor = conexao_dbapi.cursor()
+    try:
+        journal_mode = pragmas.get('journal_mode')
+        # Trocar o journal_mode exige lock exclusivo; só tentar se ainda não estiver no modo
+        if journal_mode and cursor.execute('PRAGMA journal_mode').fetchone()[0].upper() != journal_mode.upper():
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        for pragma, valor in pragmas.items():
+            if pragma != 'journal_mode':
+                cursor.execute(f'PRAGMA {pragma}={valor}')
+    finally:
+        cursor.close()
+
+
+def configurar_engine(engine, perfil=None):
+    """Registra o perfil no evento de conexão do engine (apenas SQLite)"""
+    if engine.dialect.name != 'sqlite':
+        return {}
+    pragmas = pragmas_do_perfil(perfil)
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def _ao_conectar(conexao_dbapi, registro):
+            aplicar_pragmas(conexao_dbapi, pragmas)
+    return pragmas
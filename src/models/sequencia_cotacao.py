@@ -0,0 +1,79 @@
+"""
+Contador diário da numeração de cotações (COT-YYYYMMDD-NNNN)
+
+Cada dia tem uma linha com o último número usado. Um número é reservado
+com um único UPDATE ... RETURNING na linha do dia, que o banco serializa:
+workers diferentes nunca recebem o mesmo número e não é preciso varrer a
+tabela cotacoes nem tentar de novo após violar a constraint única.
+
+No SQLite (um escritor por vez) a reserva acontece na própria transação
+de quem cria a cotação, sem commit extra, e um rollback devolve o número.
+Nos bancos servidor ela roda em uma transação curta própria, para que o
+bloqueio da linha do dia não dure até o commit da cotação; uma criação
+que falhar depois deixa um número sem uso.
+"""
+
+from sqlalchemy import update, insert, select
+
+from . import db
+
+
+class SequenciaCotacao(db.Model):
+    __tablename__ = 'sequencias_cotacoes'
+
+    dia = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    ultimo = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def proximo(dia):
+        """Reserva e retorna o próximo número sequencial do dia"""
+        if db.session.get_bind().dialect.name == 'sqlite':
+            return SequenciaCotacao._reservar(db.session.connection(), dia)
+        with db.engine.begin() as conexao:
+            return SequenciaCotacao._reservar(conexao, dia)
+
+    @staticmethod
+    def _reservar(conexao, dia):
+        numero = SequenciaCotacao._incrementar(conexao, dia)
+        if numero is None:
+            # Primeira cotação do dia desde a criação do contador
+            SequenciaCotacao._criar_dia(conexao, dia)
+            numero = SequenciaCotacao._incrementar(conexao, dia)
+        return numero
+
+    @staticmethod
+    def _incrementar(conexao, dia):
+        """Soma 1 ao contador do dia e retorna o novo valor (None se o dia não existe)"""
+        tabela = SequenciaCotacao.__table__
+        incrementar = update(tabela).where(tabela.c.dia == dia).values(ultimo=tabela.c.ultimo + 1)
+        if conexao.dialect.update_returning:
+            return conexao.execute(incrementar.returning(tabela.c.ultimo)).scalar()
+        # Sem RETURNING: a linha fica bloqueada pelo UPDATE até o fim da transação
+        if conexao.execute(incrementar).rowcount == 0:
+            return None
+        return conexao.execute(select(tabela.c.ultimo).where(tabela.c.dia == dia)).scalar()
+
+    @staticmethod
+    def _criar_dia(conexao, dia):
+        """Cria a linha do dia partindo do maior número já gravado (se houver)"""
+        from .cotacao import Cotacao
+
+        tabela = SequenciaCotacao.__table__
+        prefixo = f'COT-{dia}-'
+        numeros = conexao.execute(
+            select(Cotacao.numero_cotacao).where(Cotacao.numero_cotacao.like(f'{prefixo}%'))
+        ).scalars()
+        ultimo = max((int(n[len(prefixo):]) for n in numeros if n[len(prefixo):].isdigit()), default=0)
+
+        # Outro worker pode ter criado a linha ao mesmo tempo: ignorar o conflito
+        dialeto = conexao.dialect.name
+        if dialeto in ('sqlite', 'postgresql'):
+            if dialeto == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            conexao.execute(upsert(tabela).values(dia=dia, ultimo=ultimo).on_conflict_do_nothing())
+        else:
+            existe = conexao.execute(select(tabela.c.dia).where(tabela.c.dia == dia)).first()
+            if not existe:
+                conexao.execute(insert(tabela).values(dia=dia, ultimo=ultimo))
@@ -0,0 +1,36 @@
+"""
+Unidade de trabalho: várias escritas gravadas em uma única transação
+
+    with unidade_de_trabalho():
+        cotacao.aceitar(operador)                     # status + histórico + notificações
+        LogAuditoria.registrar_acao(..., na_transacao=True)
+
+Os métodos dos modelos apenas adicionam à sessão; quem abriu o bloco mais
+externo faz um único commit ao sair (um fsync por ação) ou o rollback de
+tudo se algo falhar. Blocos aninhados, como o de uma transição chamada de
+dentro de uma rota que também abriu o seu, participam da transação externa.
+"""
+
+from contextlib import contextmanager
+
+from . import db
+
+_CHAVE = 'unidade_de_trabalho'
+
+
+@contextmanager
+def unidade_de_trabalho():
+    """Abre (ou participa de) uma transação; commit ao sair, rollback em caso de erro"""
+    sessao = db.session
+    profundidade = sessao.info.get(_CHAVE, 0)
+    sessao.info[_CHAVE] = profundidade + 1
+    try:
+        yield sessao
+        if profundidade == 0:
+            sessao.commit()
+    except BaseException:
+        if profundidade == 0:
+            sessao.rollback()
+        raise
+    finally:
+        sessao.info[_CHAVE] = profundidade
@@ -2,8 +2,11 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime, timedelta
+from functools import lru_cache
+import os
 import pytz
 from enum import Enum
+from sqlalchemy import update, select, func
 from . import db
 
 # Configurar fuso horário de Brasília
@@ -13,6 +16,15 @@ def get_brasilia_time():
     """Retorna o horário atual de Brasília"""
     return datetime.now(BRASILIA_TZ)  # Usar a mesma instância do SQLAlchemy
 
+# Algoritmo e custo do hash de senha, no formato do werkzeug (ex.: scrypt:32768:8:1,
+# pbkdf2:sha256:600000). Hashes gravados com outro método são refeitos no próximo login.
+METODO_HASH_SENHA = os.getenv('SENHA_HASH_METODO', 'scrypt:32768:8:1')
+
+@lru_cache(maxsize=None)
+def _metodo_gravado(metodo):
+    """Prefixo que o werkzeug grava no hash para o método (completa os parâmetros padrão)"""
+    return generate_password_hash('', method=metodo, salt_length=1).split('$', 1)[0]
+
 class TipoUsuario(Enum):
     ADMINISTRADOR = "administrador"
     GERENTE = "gerente"
@@ -33,15 +45,21 @@ class Usuario(UserMixin, db.Model):
     ultimo_login = db.Column(db.DateTime)
     tentativas_login = db.Column(db.Integer, default=0)
     bloqueado_ate = db.Column(db.DateTime)
+    # Notificações não lidas (contador mantido por Notificacao, lido pelo badge)
+    notificacoes_nao_lidas = db.Column(db.Integer, default=0, nullable=False, server_default='0')
     
     def set_password(self, password):
         """Define a senha do usuário com hash seguro"""
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
+        self.password_hash = generate_password_hash(password, method=METODO_HASH_SENHA, salt_length=16)
     
     def check_password(self, password):
         """Verifica se a senha fornecida está correta"""
         return check_password_hash(self.password_hash, password)
     
+    def precisa_rehash(self):
+        """Indica se o hash foi gravado com método/custo diferente da política atual"""
+        return self.password_hash.split('$', 1)[0] != _metodo_gravado(METODO_HASH_SENHA)
+    
     def is_active(self):
         """Verifica se o usuário está ativo"""
         return self.ativo and (self.bloqueado_ate is None or self.bloqueado_ate < datetime.utcnow())
@@ -125,19 +143,44 @@ class Usuario(UserMixin, db.Model):
         return permissoes.get(self.tipo_usuario, {}).get(recurso, False)
     
     def incrementar_tentativas_login(self):
-        """Incrementa o contador de tentativas de login falhadas"""
-        self.tentativas_login += 1
+        """Incrementa o contador de tentativas de login falhadas (gravado no commit de quem chamou)"""
+        self.tentativas_login = (self.tentativas_login or 0) + 1
         if self.tentativas_login >= 5:
             # Bloqueia por 30 minutos após 5 tentativas
-            from datetime import timedelta
             self.bloqueado_ate = datetime.utcnow() + timedelta(minutes=30)
-        db.session.commit()
     
     def resetar_tentativas_login(self):
-        """Reseta o contador de tentativas de login"""
+        """Reseta o contador de tentativas de login (gravado no commit de quem chamou)"""
         self.tentativas_login = 0
         self.bloqueado_ate = None
         self.ultimo_login = get_brasilia_time()
+    
+    @staticmethod
+    def ajustar_notificacoes_nao_lidas(usuario_ids, delta):
+        """Soma delta ao contador de não lidas dos usuários, na transação de quem chamou"""
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids or not delta:
+            return
+        db.session.execute(
+            update(Usuario)
+            .where(Usuario.id.in_(usuario_ids))
+            .values(notificacoes_nao_lidas=Usuario.notificacoes_nao_lidas + delta),
+            execution_options={'synchronize_session': 'evaluate'}
+        )
+    
+    @staticmethod
+    def recalcular_notificacoes_nao_lidas():
+        """Reconstrói os contadores de não lidas a partir da tabela notificacoes"""
+        from .notificacao import Notificacao
+        
+        contagem = select(func.count(Notificacao.id)).where(
+            Notificacao.usuario_id == Usuario.id,
+            Notificacao.lida.is_(False)
+        ).scalar_subquery()
+        db.session.execute(
+            update(Usuario).values(notificacoes_nao_lidas=contagem),
+            execution_options={'synchronize_session': False}
+        )
         db.session.commit()
     
     def to_dict(self):
@@ -158,6 +201,9 @@ class Usuario(UserMixin, db.Model):
 
 class LogAuditoria(db.Model):
     __tablename__ = 'logs_auditoria'
+    __table_args__ = (
+        db.Index('ix_logs_auditoria_timestamp', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
@@ -171,18 +217,38 @@ class LogAuditoria(db.Model):
     usuario = db.relationship('Usuario', backref='logs_auditoria')
     
     @staticmethod
-    def registrar_acao(usuario_id, acao, recurso, detalhes=None, ip_address=None, user_agent=None):
-        """Registra uma ação no log de auditoria"""
+    def registrar_acao(usuario_id, acao, recurso, detalhes=None, ip_address=None, user_agent=None,
+                       na_transacao=False):
+        """Registra uma ação no log de auditoria
+
+        Por padrão o registro vai para a fila de gravação em lote
+        (services/auditoria.py) e a requisição não espera o commit. Com
+        na_transacao=True ele é adicionado à sessão atual e gravado junto com
+        o próximo commit de quem chamou.
+        """
         log = LogAuditoria(
             usuario_id=usuario_id,
             acao=acao,
             recurso=recurso,
             detalhes=detalhes,
             ip_address=ip_address,
-            user_agent=user_agent
+            user_agent=user_agent[:500] if user_agent else user_agent,
+            timestamp=get_brasilia_time()
         )
-        db.session.add(log)
-        db.session.commit()
+        if na_transacao:
+            db.session.add(log)
+            return log
+
+        from src.services.auditoria import registrar
+        registrar({
+            'usuario_id': log.usuario_id,
+            'acao': log.acao,
+            'recurso': log.recurso,
+            'detalhes': log.detalhes,
+            'ip_address': log.ip_address,
+            'user_agent': log.user_agent,
+            'timestamp': log.timestamp,
+        })
         return log
     
     def to_dict(self):
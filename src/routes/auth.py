@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, session, redirect, url_for, render_template_string
 from flask_login import login_user, logout_user, login_required, current_user
 from src.models.usuario import Usuario, LogAuditoria, db
+from src.models.unidade_trabalho import unidade_de_trabalho
+from src.services.paginacao import parametros_cursor, paginar_por_cursor, CursorInvalido
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import re
 
@@ -155,34 +158,41 @@ def login():
             )
             return jsonify({'error': 'Usuário temporariamente bloqueado. Tente novamente mais tarde.'}), 401
         
-        # Verifica a senha
+        # Verifica a senha; tentativas, bloqueio e log são gravados em um único commit
         if not usuario.check_password(password):
-            usuario.incrementar_tentativas_login()
-            LogAuditoria.registrar_acao(
-                usuario_id=usuario.id,
-                acao='LOGIN_FALHA',
-                recurso='AUTH',
-                detalhes='Senha incorreta',
-                ip_address=request.remote_addr,
-                user_agent=request.headers.get('User-Agent')
-            )
+            with unidade_de_trabalho():
+                usuario.incrementar_tentativas_login()
+                LogAuditoria.registrar_acao(
+                    usuario_id=usuario.id,
+                    acao='LOGIN_FALHA',
+                    recurso='AUTH',
+                    detalhes='Senha incorreta',
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent'),
+                    na_transacao=True
+                )
             return jsonify({'error': 'Usuário ou senha incorretos'}), 401
         
         # Login bem-sucedido
         login_user(usuario, remember=False, duration=None)  # Não lembrar login e sem duração específica
-        usuario.resetar_tentativas_login()
         
         # Configurar sessão para expirar ao fechar navegador
         session.permanent = False
         
-        LogAuditoria.registrar_acao(
-            usuario_id=usuario.id,
-            acao='LOGIN_SUCESSO',
-            recurso='AUTH',
-            detalhes='Login realizado com sucesso',
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent')
-        )
+        with unidade_de_trabalho():
+            usuario.resetar_tentativas_login()
+            # Hash antigo (ex.: pbkdf2 com 1.000.000 iterações): refazer com a política atual
+            if usuario.precisa_rehash():
+                usuario.set_password(password)
+            LogAuditoria.registrar_acao(
+                usuario_id=usuario.id,
+                acao='LOGIN_SUCESSO',
+                recurso='AUTH',
+                detalhes='Login realizado com sucesso',
+                ip_address=request.remote_addr,
+                user_agent=request.headers.get('User-Agent'),
+                na_transacao=True
+            )
         
         return jsonify({
             'message': 'Login realizado com sucesso',
@@ -572,70 +582,179 @@ def exportar_usuarios():
         except:
             pass
 
-@auth_bp.route('/api/auth/logs/export', methods=['GET'])
-@login_required
-def exportar_logs():
-    """Exporta logs de auditoria (apenas administradores)"""
-    if not current_user.pode_acessar('gerenciar_usuarios'):
-        return jsonify({'error': 'Acesso negado'}), 403
-    
+# Linhas lidas por consulta na exportação de logs (memória constante por lote)
+LOTE_EXPORTACAO_LOGS = 1000
+CAMPOS_EXPORTACAO_LOGS = ['id', 'usuario', 'acao', 'recurso', 'detalhes', 'ip_address', 'user_agent', 'timestamp']
+FORMATOS_EXPORTACAO_LOGS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def _data_do_filtro(valor, fim_do_dia=False):
+    """Converte AAAA-MM-DD ou data/hora ISO; datas sem hora no fim do período incluem o dia todo"""
+    from datetime import timedelta
     try:
-        from flask import send_file
-        import json
-        import tempfile
-        import os
-        
-        logs = LogAuditoria.query.order_by(LogAuditoria.timestamp.desc()).all()
-        
-        logs_data = []
-        for log in logs:
-            logs_data.append({
+        data = datetime.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'Data inválida: {valor} (use AAAA-MM-DD ou AAAA-MM-DDTHH:MM:SS)')
+    if fim_do_dia and len(valor) == 10:
+        data += timedelta(days=1)
+    return data.replace(tzinfo=None)
+
+
+def _filtros_exportacao_logs(args):
+    """Condições de ?inicio=, ?fim=, ?usuario_id= e ?acao= (várias separadas por vírgula)"""
+    condicoes = []
+    if args.get('inicio'):
+        condicoes.append(LogAuditoria.timestamp >= _data_do_filtro(args['inicio']))
+    if args.get('fim'):
+        fim = args['fim']
+        limite = _data_do_filtro(fim, fim_do_dia=True)
+        condicoes.append(LogAuditoria.timestamp < limite if len(fim) == 10 else LogAuditoria.timestamp <= limite)
+    if args.get('usuario_id'):
+        try:
+            condicoes.append(LogAuditoria.usuario_id == int(args['usuario_id']))
+        except ValueError:
+            raise ValueError('usuario_id deve ser um número')
+    acoes = [acao.strip() for acao in args.get('acao', '').split(',') if acao.strip()]
+    if acoes:
+        condicoes.append(LogAuditoria.acao.in_(acoes))
+    return condicoes
+
+
+def _lotes_logs(condicoes):
+    """Percorre os logs filtrados em lotes (timestamp, id decrescentes) com o usuário na mesma consulta"""
+    query = LogAuditoria.query.filter(*condicoes)
+    
+    def com_usuario(query):
+        return query.outerjoin(Usuario, LogAuditoria.usuario_id == Usuario.id).add_columns(Usuario.username)
+    
+    cursor = None
+    while True:
+        linhas, metadados = paginar_por_cursor(
+            query, LogAuditoria.timestamp, LogAuditoria.id,
+            cursor=cursor, limite=LOTE_EXPORTACAO_LOGS, preparar=com_usuario
+        )
+        if linhas:
+            yield [{
                 'id': log.id,
-                'usuario': log.usuario.username if log.usuario else 'Sistema',
+                'usuario': username or 'Sistema',
                 'acao': log.acao,
                 'recurso': log.recurso,
                 'detalhes': log.detalhes,
                 'ip_address': log.ip_address,
                 'user_agent': log.user_agent,
                 'timestamp': log.timestamp.isoformat() if log.timestamp else None
-            })
+            } for log, username in linhas]
         
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as f:
-            json.dump({
-                'logs_auditoria': logs_data,
-                'total_logs': len(logs_data),
-                'data_exportacao': datetime.utcnow().isoformat(),
-                'exportado_por': current_user.username
-            }, f, indent=2, ensure_ascii=False)
-            temp_path = f.name
+        # Liberar o lote e encerrar a leitura para manter memória e transação curtas
+        db.session.expunge_all()
+        db.session.rollback()
+        cursor = metadados['proximo_cursor']
+        if not cursor:
+            return
+
+
+def _gerar_exportacao_logs(formato, condicoes, metadata, serializar):
+    """Gera a exportação de logs em trechos de texto, lote a lote"""
+    if formato == 'ndjson':
+        for lote in _lotes_logs(condicoes):
+            yield ''.join(serializar(log) + '\n' for log in lote)
+        return
+    
+    if formato == 'csv':
+        import csv
+        import io
+        buffer = io.StringIO()
+        escritor = csv.DictWriter(buffer, fieldnames=CAMPOS_EXPORTACAO_LOGS)
+        buffer.write('\ufeff')  # BOM: acentos corretos ao abrir no Excel
+        escritor.writeheader()
+        for lote in _lotes_logs(condicoes):
+            escritor.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+        return
+    
+    # Mesma estrutura da exportação anterior, com o total ao final
+    yield '{"logs_auditoria": ['
+    total = 0
+    for lote in _lotes_logs(condicoes):
+        yield ('' if total == 0 else ', ') + ', '.join(serializar(log) for log in lote)
+        total += len(lote)
+    metadata = dict(metadata, total_logs=total)
+    yield '], ' + serializar(metadata)[1:]
+
+
+def _compactar_gzip(trechos):
+    """Comprime o fluxo de texto em gzip sem montar o arquivo em memória"""
+    import zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: cabeçalho gzip
+    for trecho in trechos:
+        dados = compressor.compress(trecho.encode('utf-8'))
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+@auth_bp.route('/api/auth/logs/export', methods=['GET'])
+@login_required
+def exportar_logs():
+    """
+    Exporta logs de auditoria (apenas administradores) via streaming
+    
+    ?formato=json|ndjson|csv, ?gzip=1 e filtros ?inicio=, ?fim= (AAAA-MM-DD
+    ou data/hora ISO), ?usuario_id= e ?acao= (várias separadas por vírgula)
+    """
+    if not current_user.pode_acessar('gerenciar_usuarios'):
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    try:
+        from flask import Response, stream_with_context, current_app
+        
+        formato = (request.args.get('formato') or request.args.get('format') or 'json').lower()
+        if formato not in FORMATOS_EXPORTACAO_LOGS:
+            return jsonify({'error': "Formato inválido. Use 'json', 'ndjson' ou 'csv'"}), 400
+        compactar = request.args.get('gzip', '').lower() in ('1', 'true', 'sim')
+        
+        try:
+            condicoes = _filtros_exportacao_logs(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        filtros = {chave: request.args[chave] for chave in ('inicio', 'fim', 'usuario_id', 'acao') if request.args.get(chave)}
+        metadata = {
+            'data_exportacao': datetime.utcnow().isoformat(),
+            'exportado_por': current_user.username,
+            'filtros': filtros
+        }
         
         # Registrar log da exportação
         LogAuditoria.registrar_acao(
             usuario_id=current_user.id,
             acao='EXPORTAR_LOGS',
             recurso='LOGS',
-            detalhes=f'Exportação de {len(logs_data)} logs de auditoria',
+            detalhes=f'Exportação de logs de auditoria ({formato}{", gzip" if compactar else ""}; filtros: {filtros or "nenhum"})',
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent')
         )
         
-        return send_file(
-            temp_path,
-            as_attachment=True,
-            download_name=f'logs_auditoria_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json',
-            mimetype='application/json'
-        )
+        mimetype, extensao = FORMATOS_EXPORTACAO_LOGS[formato]
+        trechos = _gerar_exportacao_logs(formato, condicoes, metadata, current_app.json.dumps)
+        if compactar:
+            trechos = _compactar_gzip(trechos)
+            mimetype, extensao = 'application/gzip', f'{extensao}.gz'
+        
+        response = Response(stream_with_context(trechos), mimetype=mimetype)
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename=logs_auditoria_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{extensao}'
+        return response
         
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
-    finally:
-        # Limpar arquivo temporário
-        try:
-            if 'temp_path' in locals():
-                os.unlink(temp_path)
-        except:
-            pass
 
 @auth_bp.route('/api/auth/logs', methods=['GET'])
 @login_required
@@ -647,8 +766,18 @@ def listar_logs():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
-        
-        logs = LogAuditoria.query.order_by(LogAuditoria.timestamp.desc()).paginate(
+        query = LogAuditoria.query.options(joinedload(LogAuditoria.usuario))
+        
+        # Paginação por cursor (?cursor= / ?limite=): custo fixo por página, sem COUNT
+        paginacao = parametros_cursor(request.args, limite_padrao=per_page)
+        if paginacao is not None:
+            logs, metadados = paginar_por_cursor(query, LogAuditoria.timestamp, LogAuditoria.id, **paginacao)
+            return jsonify({
+                'logs': [log.to_dict() for log in logs],
+                'paginacao': metadados
+            }), 200
+        
+        logs = query.order_by(LogAuditoria.timestamp.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -659,6 +788,8 @@ def listar_logs():
             'current_page': page
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
@@ -6,8 +6,12 @@ from datetime import datetime, date
 import re
 
 from src.models import db
-from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, EmpresaCotacao
+from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, EmpresaCotacao, CotacaoIndisponivelError
+from src.models.estatistica_cotacao import EstatisticaCotacao, SEM_OPERADOR
 from src.models.usuario import Usuario, TipoUsuario, LogAuditoria
+from src.models.notificacao import Notificacao
+from src.models.unidade_trabalho import unidade_de_trabalho
+from src.services.paginacao import parametros_cursor, CursorInvalido
 
 cotacao_bp = Blueprint("cotacao", __name__)
 CORS(cotacao_bp)
@@ -136,18 +140,28 @@ def listar_cotacoes():
             except ValueError:
                 pass
         
+        # Paginação por cursor (?cursor= / ?limite=): custo fixo por página, sem COUNT
+        paginacao = parametros_cursor(request.args, limite_padrao=per_page)
+        if paginacao is not None:
+            cotacoes_data, metadados = Cotacao.pagina_dicts(query, Cotacao.data_solicitacao, paginacao)
+            return jsonify({
+                'success': True,
+                'cotacoes': cotacoes_data,
+                'paginacao': metadados
+            })
+        
         # Ordenar por data de solicitação (mais recentes primeiro)
         query = query.order_by(desc(Cotacao.data_solicitacao))
         
-        # Paginação
-        cotacoes_paginadas = query.paginate(
+        # Paginação (nomes de consultor/operador no mesmo SELECT)
+        cotacoes_paginadas = Cotacao.com_nomes_usuarios(query).paginate(
             page=page, 
             per_page=per_page, 
             error_out=False
         )
         
         # Converter para dicionário
-        cotacoes_data = [cotacao.to_dict() for cotacao in cotacoes_paginadas.items]
+        cotacoes_data = Cotacao.linhas_to_dict(cotacoes_paginadas.items)
         
         return jsonify({
             'success': True,
@@ -160,6 +174,11 @@ def listar_cotacoes():
             'has_prev': cotacoes_paginadas.has_prev
         })
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -392,25 +411,31 @@ def criar_cotacao():
             porto_destino=data.get('porto_destino')
         )
         
-        db.session.add(cotacao)
-        db.session.commit()
-        
-        # Registrar no histórico
-        HistoricoCotacao.registrar_mudanca(
-            cotacao_id=cotacao.id,
-            usuario_id=current_user.id,
-            status_anterior=None,
-            status_novo=StatusCotacao.SOLICITADA,
-            observacoes=f"Cotação criada pelo consultor {current_user.nome_completo}"
-        )
-        
-        # Registrar log de auditoria
-        LogAuditoria.registrar_acao(
-            usuario_id=current_user.id,
-            acao='CRIAR',
-            recurso='COTACAO',
-            detalhes=f'Cotação {cotacao.numero_cotacao} criada para cliente {cotacao.cliente_nome}'
-        )
+        # Cotação, histórico e log de auditoria em uma única transação
+        with unidade_de_trabalho():
+            db.session.add(cotacao)
+            db.session.flush()  # Para obter o ID
+            
+            # Registrar no histórico
+            HistoricoCotacao.registrar_mudanca(
+                cotacao_id=cotacao.id,
+                usuario_id=current_user.id,
+                status_anterior=None,
+                status_novo=StatusCotacao.SOLICITADA,
+                observacoes=f"Cotação criada pelo consultor {current_user.nome_completo}"
+            )
+            
+            # Notificar operadores (um INSERT para todos)
+            Notificacao.notificar_nova_cotacao(cotacao)
+            
+            # Registrar log de auditoria
+            LogAuditoria.registrar_acao(
+                usuario_id=current_user.id,
+                acao='CRIAR',
+                recurso='COTACAO',
+                detalhes=f'Cotação {cotacao.numero_cotacao} criada para cliente {cotacao.cliente_nome}',
+                na_transacao=True
+            )
         
         return jsonify({
             'success': True,
@@ -463,25 +488,26 @@ def obter_cotacao(cotacao_id):
 def aceitar_cotacao(cotacao_id):
     """Aceita uma cotação (operadores, gerentes, administradores)"""
     try:
-        cotacao = Cotacao.query.get_or_404(cotacao_id)
-        
-        # Verificar se pode aceitar
-        if not cotacao.pode_ser_aceita_por(current_user):
+        # Verificar permissão; o status é conferido na reivindicação (409 para quem perde)
+        if not Cotacao.usuario_pode_aceitar(current_user):
             return jsonify({
                 'success': False,
                 'message': 'Você não pode aceitar esta cotação'
             }), 403
         
-        cotacao.aceitar(current_user)
-        db.session.commit()
+        cotacao = Cotacao.query.get_or_404(cotacao_id)
         
-        # Registrar log de auditoria
-        LogAuditoria.registrar_acao(
-            usuario_id=current_user.id,
-            acao='ACEITAR',
-            recurso='COTACAO',
-            detalhes=f'Cotação {cotacao.numero_cotacao} aceita'
-        )
+        with unidade_de_trabalho():
+            cotacao.aceitar(current_user)
+            
+            # Registrar log de auditoria
+            LogAuditoria.registrar_acao(
+                usuario_id=current_user.id,
+                acao='ACEITAR',
+                recurso='COTACAO',
+                detalhes=f'Cotação {cotacao.numero_cotacao} aceita',
+                na_transacao=True
+            )
         
         return jsonify({
             'success': True,
@@ -489,6 +515,12 @@ def aceitar_cotacao(cotacao_id):
             'cotacao': cotacao.to_dict()
         })
         
+    except CotacaoIndisponivelError as e:
+        # Outro operador aceitou primeiro
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -530,21 +562,22 @@ def responder_cotacao(cotacao_id):
                 'message': 'Valor do frete e prazo devem ser números positivos'
             }), 400
         
-        cotacao.responder(
-            operador=current_user,
-            valor_frete=valor_frete,
-            prazo_entrega=prazo_entrega,
-            observacoes=data.get('observacoes')
-        )
-        db.session.commit()
-        
-        # Registrar log de auditoria
-        LogAuditoria.registrar_acao(
-            usuario_id=current_user.id,
-            acao='RESPONDER',
-            recurso='COTACAO',
-            detalhes=f'Cotação {cotacao.numero_cotacao} respondida com valor R$ {valor_frete}'
-        )
+        with unidade_de_trabalho():
+            cotacao.responder(
+                operador=current_user,
+                valor_frete=valor_frete,
+                prazo_entrega=prazo_entrega,
+                observacoes=data.get('observacoes')
+            )
+            
+            # Registrar log de auditoria
+            LogAuditoria.registrar_acao(
+                usuario_id=current_user.id,
+                acao='RESPONDER',
+                recurso='COTACAO',
+                detalhes=f'Cotação {cotacao.numero_cotacao} respondida com valor R$ {valor_frete}',
+                na_transacao=True
+            )
         
         return jsonify({
             'success': True,
@@ -576,27 +609,26 @@ def finalizar_cotacao(cotacao_id):
         
         acao = data.get('acao')  # 'aprovar', 'recusar', 'marcar_finalizada'
         
-        if acao == 'aprovar':
-            cotacao.finalizar(current_user, aprovada=True, observacoes=data.get('observacoes'))
-        elif acao == 'recusar':
-            cotacao.finalizar(current_user, aprovada=False, observacoes=data.get('observacoes'))
-        elif acao == 'marcar_finalizada':
-            cotacao.marcar_finalizada(current_user, observacoes=data.get('observacoes'))
-        else:
+        if acao not in ('aprovar', 'recusar', 'marcar_finalizada'):
             return jsonify({
                 'success': False,
                 'message': 'Ação inválida. Use: aprovar, recusar ou marcar_finalizada'
             }), 400
         
-        db.session.commit()
-        
-        # Registrar log de auditoria
-        LogAuditoria.registrar_acao(
-            usuario_id=current_user.id,
-            acao='FINALIZAR',
-            recurso='COTACAO',
-            detalhes=f'Cotação {cotacao.numero_cotacao} finalizada - {acao}'
-        )
+        with unidade_de_trabalho():
+            if acao == 'marcar_finalizada':
+                cotacao.marcar_finalizada(current_user, observacoes=data.get('observacoes'))
+            else:
+                cotacao.finalizar(current_user, aprovada=(acao == 'aprovar'), observacoes=data.get('observacoes'))
+            
+            # Registrar log de auditoria
+            LogAuditoria.registrar_acao(
+                usuario_id=current_user.id,
+                acao='FINALIZAR',
+                recurso='COTACAO',
+                detalhes=f'Cotação {cotacao.numero_cotacao} finalizada - {acao}',
+                na_transacao=True
+            )
         
         return jsonify({
             'success': True,
@@ -640,16 +672,17 @@ def reatribuir_cotacao(cotacao_id):
                 'message': 'Operador inválido'
             }), 400
         
-        cotacao.reatribuir(current_user, novo_operador)
-        db.session.commit()
-        
-        # Registrar log de auditoria
-        LogAuditoria.registrar_acao(
-            usuario_id=current_user.id,
-            acao='REATRIBUIR',
-            recurso='COTACAO',
-            detalhes=f'Cotação {cotacao.numero_cotacao} reatribuída para {novo_operador.nome_completo}'
-        )
+        with unidade_de_trabalho():
+            cotacao.reatribuir(current_user, novo_operador)
+            
+            # Registrar log de auditoria
+            LogAuditoria.registrar_acao(
+                usuario_id=current_user.id,
+                acao='REATRIBUIR',
+                recurso='COTACAO',
+                detalhes=f'Cotação {cotacao.numero_cotacao} reatribuída para {novo_operador.nome_completo}',
+                na_transacao=True
+            )
         
         return jsonify({
             'success': True,
@@ -669,39 +702,34 @@ def reatribuir_cotacao(cotacao_id):
 def obter_estatisticas():
     """Obtém estatísticas das cotações"""
     try:
-        # Query base dependendo do tipo de usuário
-        if current_user.tipo_usuario == TipoUsuario.CONSULTOR:
-            base_query = Cotacao.query.filter(Cotacao.consultor_id == current_user.id)
-        else:
-            base_query = Cotacao.query
-        
-        # Estatísticas gerais
-        total_cotacoes = base_query.count()
+        # Contadores materializados, filtrados pelo consultor quando necessário
+        consultor_id = current_user.id if current_user.tipo_usuario == TipoUsuario.CONSULTOR else None
         
         # Por status
-        stats_por_status = {}
-        for status in StatusCotacao:
-            count = base_query.filter(Cotacao.status == status).count()
-            stats_por_status[status.value] = count
+        contagem_status = EstatisticaCotacao.contagens('status', consultor_id=consultor_id)
+        stats_por_status = {status.value: contagem_status.get(status, 0) for status in StatusCotacao}
+        
+        # Estatísticas gerais
+        total_cotacoes = sum(contagem_status.values())
         
         # Por empresa de transporte
-        stats_por_empresa = {}
-        for empresa in EmpresaCotacao:
-            count = base_query.filter(Cotacao.empresa_transporte == empresa).count()
-            stats_por_empresa[empresa.value] = count
+        contagem_empresa = EstatisticaCotacao.contagens('empresa_transporte', consultor_id=consultor_id)
+        stats_por_empresa = {empresa.value: contagem_empresa.get(empresa, 0) for empresa in EmpresaCotacao}
         
         # Estatísticas específicas para operadores/administradores
         stats_operadores = {}
         if current_user.tipo_usuario != TipoUsuario.CONSULTOR:
             # Cotações por operador
-            operadores = Usuario.query.filter(
-                Usuario.tipo_usuario.in_([TipoUsuario.OPERADOR, TipoUsuario.GERENTE, TipoUsuario.ADMINISTRADOR])
+            contagem_operador = EstatisticaCotacao.contagens('operador_id')
+            operadores = db.session.execute(
+                db.select(Usuario.id, Usuario.nome_completo)
+                .where(Usuario.id.in_([id for id in contagem_operador if id != SEM_OPERADOR]))
+                .where(Usuario.tipo_usuario.in_([TipoUsuario.OPERADOR, TipoUsuario.GERENTE, TipoUsuario.ADMINISTRADOR]))
+                .order_by(Usuario.id)
             ).all()
             
-            for operador in operadores:
-                count = Cotacao.query.filter(Cotacao.operador_id == operador.id).count()
-                if count > 0:
-                    stats_operadores[operador.nome_completo] = count
+            for operador_id, nome_completo in operadores:
+                stats_operadores[nome_completo] = contagem_operador[operador_id]
         
         return jsonify({
             'success': True,
@@ -3,22 +3,37 @@ Rotas adicionais para BRCcSis v1.3.3
 Sistema completo de fluxo de cotações
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app
 from flask_cors import CORS
 from flask_login import login_required, current_user
 from sqlalchemy import or_, and_, desc, func
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date
+import json
 import re
 
 from src.models import db
-from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, EmpresaCotacao
+from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao, EmpresaCotacao, CotacaoIndisponivelError
 from src.models.usuario import Usuario, TipoUsuario
 from src.models.notificacao import Notificacao, TipoNotificacao
 from src.models.empresa import Empresa
+from src.services.paginacao import parametros_cursor, CursorInvalido
+from src.services import eventos
 
 cotacao_v133_bp = Blueprint("cotacao_v133", __name__)
 CORS(cotacao_v133_bp)
 
+def _lista_cotacoes(query, coluna):
+    """
+    Corpo das listas de cotações. Com ?cursor= ou ?limite= retorna uma página
+    por cursor (keyset) e os metadados em 'paginacao'; sem eles, a lista completa.
+    """
+    paginacao = parametros_cursor(request.args)
+    if paginacao is None:
+        return {'cotacoes': Cotacao.listar_dicts(query)}
+    cotacoes, metadados = Cotacao.pagina_dicts(query, coluna, paginacao)
+    return {'cotacoes': cotacoes, 'paginacao': metadados}
+
 # ==================== ROTAS PARA OPERADORES ====================
 
 @cotacao_v133_bp.route("/cotacoes/disponiveis", methods=["GET"])
@@ -36,13 +51,18 @@ def obter_cotacoes_disponiveis():
         # Buscar cotações com status SOLICITADA
         cotacoes = Cotacao.query.filter_by(
             status=StatusCotacao.SOLICITADA
-        ).order_by(Cotacao.created_at.desc()).all()
+        ).order_by(Cotacao.created_at.desc())
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.created_at)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -75,6 +95,12 @@ def aceitar_cotacao_operador(cotacao_id):
             'cotacao': cotacao.to_dict()
         }), 200
         
+    except CotacaoIndisponivelError as e:
+        # Outro operador aceitou primeiro
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -165,20 +191,29 @@ def obter_minhas_operacoes():
         
         # Para operadores, mostrar apenas suas cotações
         # Para admin/gerente, mostrar todas
+        # Ordem pela data de aceite, que não muda depois de gravada: com
+        # updated_at, cada transição movia a cotação para antes do cursor e as
+        # páginas seguintes pulavam ou repetiam linhas
+        ordem = (Cotacao.data_aceite_operador.desc().nulls_last(), Cotacao.id.desc())
         if current_user.tipo_usuario == TipoUsuario.OPERADOR:
             cotacoes = Cotacao.query.filter_by(
                 operador_id=current_user.id
-            ).order_by(Cotacao.updated_at.desc()).all()
+            ).order_by(*ordem)
         else:
             cotacoes = Cotacao.query.filter(
                 Cotacao.operador_id.isnot(None)
-            ).order_by(Cotacao.updated_at.desc()).all()
+            ).order_by(*ordem)
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.data_aceite_operador)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -294,15 +329,20 @@ def obter_minhas_solicitacoes():
         if current_user.tipo_usuario == TipoUsuario.CONSULTOR:
             cotacoes = Cotacao.query.filter_by(
                 consultor_id=current_user.id
-            ).order_by(Cotacao.created_at.desc()).all()
+            ).order_by(Cotacao.created_at.desc())
         else:
-            cotacoes = Cotacao.query.order_by(Cotacao.created_at.desc()).all()
+            cotacoes = Cotacao.query.order_by(Cotacao.created_at.desc())
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.created_at)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -318,13 +358,18 @@ def obter_cotacoes_rodoviarias():
     try:
         cotacoes = Cotacao.query.filter_by(
             empresa_transporte=EmpresaCotacao.BRCARGO_RODOVIARIO
-        ).order_by(Cotacao.created_at.desc()).all()
+        ).order_by(Cotacao.created_at.desc())
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.created_at)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -338,13 +383,18 @@ def obter_cotacoes_maritimas():
     try:
         cotacoes = Cotacao.query.filter_by(
             empresa_transporte=EmpresaCotacao.BRCARGO_MARITIMO
-        ).order_by(Cotacao.created_at.desc()).all()
+        ).order_by(Cotacao.created_at.desc())
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.created_at)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -358,13 +408,18 @@ def obter_cotacoes_aereas():
     try:
         cotacoes = Cotacao.query.filter_by(
             empresa_transporte=EmpresaCotacao.FRETE_AEREO
-        ).order_by(Cotacao.created_at.desc()).all()
+        ).order_by(Cotacao.created_at.desc())
         
         return jsonify({
             'success': True,
-            'cotacoes': [cotacao.to_dict() for cotacao in cotacoes]
+            **_lista_cotacoes(cotacoes, Cotacao.created_at)
         }), 200
         
+    except CursorInvalido as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -382,7 +437,8 @@ def obter_notificacoes():
         apenas_nao_lidas = request.args.get('apenas_nao_lidas', 'false').lower() == 'true'
         limit = int(request.args.get('limit', 50))
         
-        query = Notificacao.query.filter_by(usuario_id=current_user.id)
+        # Número da cotação no mesmo SELECT (to_dict usa notificacao.cotacao)
+        query = Notificacao.query.options(joinedload(Notificacao.cotacao)).filter_by(usuario_id=current_user.id)
         
         if apenas_nao_lidas:
             query = query.filter_by(lida=False)
@@ -432,12 +488,7 @@ def marcar_notificacao_lida(notificacao_id):
 def marcar_todas_notificacoes_lidas():
     """Marca todas as notificações do usuário como lidas"""
     try:
-        Notificacao.query.filter_by(
-            usuario_id=current_user.id,
-            lida=False
-        ).update({'lida': True})
-        
-        db.session.commit()
+        Notificacao.marcar_todas_como_lidas(current_user.id)
         
         return jsonify({
             'success': True,
@@ -451,6 +502,64 @@ def marcar_todas_notificacoes_lidas():
             'message': f'Erro interno: {str(e)}'
         }), 500
 
+@cotacao_v133_bp.route("/notificacoes/stream", methods=["GET"])
+@login_required
+def stream_notificacoes():
+    """
+    Canal SSE do usuário: eventos 'notificacao' e 'nao_lidas' a cada notificação
+    nova e, com ?tempo_real=true, 'tempo_real' quando o fluxo de cotações muda
+    """
+    try:
+        usuario_id = current_user.id
+        tempo_real = request.args.get('tempo_real', 'false').lower() == 'true'
+        # Ponto de partida lido antes do total: notificações gravadas depois
+        # dele são entregues pela conexão, então o total enviado nunca fica para trás
+        ultima_notificacao = db.session.scalar(db.select(func.max(Notificacao.id))) or 0
+        total_nao_lidas = db.session.scalar(
+            db.select(Usuario.notificacoes_nao_lidas).where(Usuario.id == usuario_id)
+        ) or 0
+        
+        # A conexão fica aberta sem usar a sessão do banco
+        db.session.remove()
+        try:
+            assinatura = eventos.assinar(current_app._get_current_object(), usuario_id, tempo_real,
+                                         desde=ultima_notificacao)
+        except eventos.LimiteConexoesError as e:
+            # Sem thread livre para mais uma conexão longa: o cliente volta a consultar periodicamente
+            response = jsonify({'success': False, 'message': str(e)})
+            response.status_code = 503
+            response.headers['Retry-After'] = '30'
+            return response
+        
+        def gerar():
+            try:
+                yield 'retry: 5000\n\n'
+                yield _evento_sse('nao_lidas', {'total_nao_lidas': total_nao_lidas})
+                while True:
+                    evento = assinatura.proximo(eventos.HEARTBEAT)
+                    if evento is None:
+                        yield ': ping\n\n'  # mantém a conexão e detecta clientes desconectados
+                    else:
+                        yield _evento_sse(*evento)
+            finally:
+                eventos.cancelar(assinatura)
+        
+        response = Response(gerar(), mimetype='text/event-stream')
+        # Libera a vaga mesmo se a conexão cair antes do gerador começar
+        response.call_on_close(lambda: eventos.cancelar(assinatura))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # nginx: não acumular o stream
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Erro interno: {str(e)}'
+        }), 500
+
+def _evento_sse(nome, dados):
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
 # ==================== ROTAS PARA HISTÓRICO ====================
 
 @cotacao_v133_bp.route("/cotacoes/<int:cotacao_id>/historico", methods=["GET"])
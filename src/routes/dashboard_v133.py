@@ -6,15 +6,16 @@ Métricas e relatórios por empresa, usuário e sistema
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 from flask_login import login_required, current_user
-from sqlalchemy import func, and_, or_, desc
+from sqlalchemy import func, and_, or_, desc, case, event, select
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import calendar
 
 from src.models import db
 from src.models.cotacao import Cotacao, StatusCotacao, EmpresaCotacao
+from src.models.estatistica_cotacao import EstatisticaCotacao
 from src.models.usuario import Usuario, TipoUsuario
 from src.models.empresa import Empresa
-from src.models.notificacao import Notificacao
+from src.services.cache import CacheTTL
 
 dashboard_v133_bp = Blueprint("dashboard_v133", __name__)
 CORS(dashboard_v133_bp)
@@ -346,107 +347,167 @@ def obter_ranking_usuarios():
 
 # ==================== RELATÓRIOS GERAIS DO SISTEMA ====================
 
+# Relatório geral em cache por mês corrente + última cotação criada; o TTL
+# limita o atraso de mudanças de status feitas por outros workers
+TTL_RELATORIO_GERAL = 60
+MESES_EVOLUCAO = 12
+STATUS_FINALIZADOS = (StatusCotacao.ACEITA_CONSULTOR, StatusCotacao.NEGADA_CONSULTOR, StatusCotacao.FINALIZADA)
+cache_relatorio_geral = CacheTTL(TTL_RELATORIO_GERAL, max_itens=4)
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_cotacoes_alteradas(session, flush_context):
+    if any(isinstance(obj, Cotacao) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['cotacoes_alteradas'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_relatorio_geral(session):
+    if session.info.pop('cotacoes_alteradas', False):
+        cache_relatorio_geral.limpar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marcacao(session):
+    session.info.pop('cotacoes_alteradas', None)
+
+
+def _mes_de(coluna):
+    """Expressão SQL 'YYYY-MM' de uma coluna de data"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m', coluna)
+    return func.to_char(coluna, 'YYYY-MM')
+
+
+def _meses_evolucao(hoje):
+    """Lista 'YYYY-MM' dos últimos MESES_EVOLUCAO meses, em ordem cronológica"""
+    meses = []
+    ano, mes = hoje.year, hoje.month
+    for _ in range(MESES_EVOLUCAO):
+        meses.append(f'{ano:04d}-{mes:02d}')
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    return list(reversed(meses))
+
+
+def _gerar_relatorio_geral(meses):
+    """Calcula o relatório geral (contadores materializados + um GROUP BY mensal)"""
+    # Por status e modalidade
+    contagem_status = EstatisticaCotacao.contagens('status')
+    contagem_modalidade = EstatisticaCotacao.contagens('empresa_transporte')
+    
+    total_cotacoes = sum(contagem_status.values())
+    total_finalizadas = sum(contagem_status.get(status, 0) for status in STATUS_FINALIZADOS)
+    taxa_sucesso = round((total_finalizadas / total_cotacoes * 100) if total_cotacoes > 0 else 0, 1)
+    
+    # Usuários ativos por tipo
+    usuarios_ativos = dict(db.session.execute(
+        db.select(Usuario.tipo_usuario, func.count(Usuario.id))
+        .where(Usuario.ativo == True)
+        .group_by(Usuario.tipo_usuario)
+    ).all())
+    consultores_ativos = usuarios_ativos.get(TipoUsuario.CONSULTOR, 0)
+    operadores_ativos = usuarios_ativos.get(TipoUsuario.OPERADOR, 0)
+    
+    # Empresas que prestaram serviço em alguma cotação
+    empresas_ativas = db.session.scalar(
+        db.select(func.count(func.distinct(Cotacao.empresa_prestadora_id)))
+    )
+    
+    # Evolução mensal: um único GROUP BY por mês de criação
+    inicio = datetime.strptime(meses[0], '%Y-%m')
+    mes = _mes_de(Cotacao.created_at)
+    por_mes = {
+        linha.mes: linha
+        for linha in db.session.execute(
+            db.select(
+                mes.label('mes'),
+                func.count(Cotacao.id).label('criadas'),
+                func.sum(case((Cotacao.status.in_(STATUS_FINALIZADOS), 1), else_=0)).label('finalizadas')
+            )
+            .where(Cotacao.created_at >= inicio)
+            .group_by(mes)
+        )
+    }
+    evolucao_mensal = [
+        {
+            'mes': m,
+            'cotacoes': por_mes[m].criadas if m in por_mes else 0,
+            'finalizadas': int(por_mes[m].finalizadas or 0) if m in por_mes else 0
+        }
+        for m in meses
+    ]
+    
+    status_counts = {status.value: contagem_status.get(status, 0) for status in StatusCotacao}
+    modalidades = {empresa.value: contagem_modalidade.get(empresa, 0) for empresa in EmpresaCotacao}
+    
+    return {
+        'cotacoes_por_status': status_counts,
+        'total_cotacoes': total_cotacoes,
+        'total_cotacoes_finalizadas': total_finalizadas,
+        'cotacoes_finalizadas': total_finalizadas,
+        'cotacoes_andamento': total_cotacoes - total_finalizadas,
+        'taxa_sucesso': taxa_sucesso,
+        'cotacoes_por_modalidade': modalidades,
+        'usuarios_ativos': {
+            'consultores': consultores_ativos,
+            'operadores': operadores_ativos
+        },
+        'empresas_prestadoras_ativas': empresas_ativas,
+        'evolucao_mensal': evolucao_mensal,
+        # Formatos usados pelos gráficos do dashboard
+        'por_status': {
+            'solicitadas': status_counts[StatusCotacao.SOLICITADA.value],
+            'em_analise': status_counts[StatusCotacao.ACEITA_OPERADOR.value],
+            'enviadas': status_counts[StatusCotacao.COTACAO_ENVIADA.value],
+            'finalizadas': total_finalizadas
+        },
+        'por_modalidade': {
+            'rodoviario': modalidades[EmpresaCotacao.BRCARGO_RODOVIARIO.value],
+            'maritimo': modalidades[EmpresaCotacao.BRCARGO_MARITIMO.value],
+            'aereo': modalidades[EmpresaCotacao.FRETE_AEREO.value]
+        },
+        'evolucao': {
+            'labels': [item['mes'] for item in evolucao_mensal],
+            'criadas': [item['cotacoes'] for item in evolucao_mensal],
+            'finalizadas': [item['finalizadas'] for item in evolucao_mensal]
+        }
+    }
+
+
 @dashboard_v133_bp.route("/analytics/sistema/geral", methods=["GET"])
 @login_required
 def obter_relatorio_geral():
     """Obtém relatório geral do sistema"""
     try:
-        # Dados básicos e seguros
-        total_cotacoes = 3
-        total_finalizadas = 2
-        
-        # Status counts básicos
-        status_counts = {
-            'FINALIZADA': 2,
-            'COTACAO_ENVIADA': 1,
-            'SOLICITADA': 0,
-            'ACEITA_OPERADOR': 0
-        }
+        meses = _meses_evolucao(datetime.now())
         
-        # Modalidades básicas
-        modalidades = {
-            'BRCARGO_RODOVIARIO': 3,
-            'BRCARGO_MARITIMO': 0,
-            'FRETE_AEREO': 0
-        }
-        
-        # Dados simplificados
-        consultores_ativos = 1
-        operadores_ativos = 1
-        empresas_ativas = 1
-        
-        # Evolução mensal simplificada
-        evolucao_mensal = [
-            {'mes': 'Jan', 'cotacoes': 0},
-            {'mes': 'Fev', 'cotacoes': 0},
-            {'mes': 'Mar', 'cotacoes': 0},
-            {'mes': 'Abr', 'cotacoes': 0},
-            {'mes': 'Mai', 'cotacoes': 0},
-            {'mes': 'Jun', 'cotacoes': 0},
-            {'mes': 'Jul', 'cotacoes': 0},
-            {'mes': 'Ago', 'cotacoes': 3},
-            {'mes': 'Set', 'cotacoes': 0}
-        ]
+        # Nova cotação criada (em qualquer worker) muda a chave do cache
+        ultima_cotacao = db.session.scalar(db.select(func.max(Cotacao.id)))
+        relatorio = cache_relatorio_geral.obter_ou_calcular(
+            (meses[-1], ultima_cotacao),
+            lambda: _gerar_relatorio_geral(meses)
+        )
         
         return jsonify({
             'success': True,
+            'relatorio_geral': relatorio,
+            # Formato anterior, mantido para compatibilidade
             'data': {
-                'total_cotacoes': total_cotacoes,
-                'total_finalizadas': total_finalizadas,
-                'cotacoes_em_andamento': total_cotacoes - total_finalizadas,
-                'taxa_sucesso': round((total_finalizadas / total_cotacoes * 100) if total_cotacoes > 0 else 0, 1),
-                'status_counts': status_counts,
-                'modalidades': modalidades,
-                'consultores_ativos': consultores_ativos,
-                'operadores_ativos': operadores_ativos,
-                'empresas_ativas': empresas_ativas,
-                'evolucao_mensal': evolucao_mensal
-            }
-        })
-        
-    except Exception as e:
-        print(f"Erro ao gerar analytics: {e}")
-        return jsonify({
-            'success': False,
-            'message': f'Erro interno: {str(e)}'
-        }), 500
-        
-        # Evolução mensal (últimos 12 meses)
-        evolucao_mensal = []
-        for i in range(12):
-            data_inicio = datetime.now().replace(day=1) - timedelta(days=30*i)
-            data_fim = data_inicio.replace(day=calendar.monthrange(data_inicio.year, data_inicio.month)[1])
-            
-            cotacoes_mes = Cotacao.query.filter(
-                and_(
-                    Cotacao.created_at >= data_inicio,
-                    Cotacao.created_at <= data_fim
-                )
-            ).count()
-            
-            evolucao_mensal.append({
-                'mes': data_inicio.strftime('%Y-%m'),
-                'cotacoes': cotacoes_mes
-            })
-        
-        evolucao_mensal.reverse()  # Ordem cronológica
-        
-        return jsonify({
-            'success': True,
-            'relatorio_geral': {
-                'cotacoes_por_status': status_counts,
-                'total_cotacoes_finalizadas': total_finalizadas,
-                'cotacoes_por_modalidade': modalidades,
-                'usuarios_ativos': {
-                    'consultores': consultores_ativos,
-                    'operadores': operadores_ativos
-                },
-                'empresas_prestadoras_ativas': empresas_ativas,
-                'evolucao_mensal': evolucao_mensal
+                'total_cotacoes': relatorio['total_cotacoes'],
+                'total_finalizadas': relatorio['total_cotacoes_finalizadas'],
+                'cotacoes_em_andamento': relatorio['cotacoes_andamento'],
+                'taxa_sucesso': relatorio['taxa_sucesso'],
+                'status_counts': {status.name: relatorio['cotacoes_por_status'][status.value] for status in StatusCotacao},
+                'modalidades': {empresa.name: relatorio['cotacoes_por_modalidade'][empresa.value] for empresa in EmpresaCotacao},
+                'consultores_ativos': relatorio['usuarios_ativos']['consultores'],
+                'operadores_ativos': relatorio['usuarios_ativos']['operadores'],
+                'empresas_ativas': relatorio['empresas_prestadoras_ativas'],
+                'evolucao_mensal': relatorio['evolucao_mensal']
             }
         }), 200
         
     except Exception as e:
+        print(f"Erro ao gerar analytics: {e}")
         return jsonify({
             'success': False,
             'message': f'Erro interno: {str(e)}'
@@ -457,19 +518,20 @@ def obter_relatorio_geral():
 def obter_dados_tempo_real():
     """Obtém dados em tempo real para dashboard"""
     try:
-        # Cotações aguardando ação
-        cotacoes_solicitadas = Cotacao.query.filter_by(status=StatusCotacao.SOLICITADA).count()
-        cotacoes_aceitas_operador = Cotacao.query.filter_by(status=StatusCotacao.ACEITA_OPERADOR).count()
-        cotacoes_aguardando_consultor = Cotacao.query.filter_by(status=StatusCotacao.COTACAO_ENVIADA).count()
+        # Cotações aguardando ação (contadores materializados)
+        contagem_status = EstatisticaCotacao.contagens('status')
+        cotacoes_solicitadas = contagem_status.get(StatusCotacao.SOLICITADA, 0)
+        cotacoes_aceitas_operador = contagem_status.get(StatusCotacao.ACEITA_OPERADOR, 0)
+        cotacoes_aguardando_consultor = contagem_status.get(StatusCotacao.COTACAO_ENVIADA, 0)
         
         # Notificações não lidas por tipo de usuário
-        notificacoes_nao_lidas = Notificacao.query.filter_by(lida=False).count()
+        notificacoes_nao_lidas = db.session.scalar(
+            select(func.coalesce(func.sum(Usuario.notificacoes_nao_lidas), 0))
+        )
         
         # Atividade hoje
         hoje = datetime.now().date()
-        cotacoes_hoje = Cotacao.query.filter(
-            func.date(Cotacao.created_at) == hoje
-        ).count()
+        cotacoes_hoje = sum(EstatisticaCotacao.contagens('dia', dia=hoje).values())
         
         return jsonify({
             'success': True,
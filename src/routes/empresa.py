@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context, current_app
 from flask_cors import CORS
 import json
 from src.models import db
@@ -6,11 +6,15 @@ from src.models.empresa import (
     Empresa, Regulamentacao, Certificacao, ModalidadeTransporte, 
     TipoCarga, AbrangenciaGeografica, Frota, Armazenagem, PortoTerminal,
     SeguroCobertura, Tecnologia, DesempenhoQualidade, ClienteSegmento,
-    RecursoHumano, Sustentabilidade
+    RecursoHumano, Sustentabilidade, REGIAO_NAO_INFORMADA
 )
+from src.models.busca_empresa import IndiceBuscaEmpresa
 from src.models.usuario import LogAuditoria
+from src.services import jobs
+from src.services.reconciliacao import reconciliar_colecao
 from datetime import datetime
-from sqlalchemy import or_, and_
+from io import BytesIO
+from sqlalchemy import or_, and_, select, func, insert, delete
 from flask_login import login_required, current_user
 
 empresa_bp = Blueprint("empresa", __name__)
@@ -37,6 +41,7 @@ def get_empresas():
         nome_tecnologia = request.args.get("nome_tecnologia")
         segmento_cliente = request.args.get("segmento_cliente")
         certificacao_ambiental = request.args.get("certificacao_ambiental")
+        busca = request.args.get("q")
         
         # Paginação
         page = request.args.get("page", 1, type=int)
@@ -45,67 +50,43 @@ def get_empresas():
         # Query base
         query = Empresa.query
         
-        # Aplicar filtros
-        if razao_social:
-            query = query.filter(Empresa.razao_social.ilike(f"%{razao_social}%"))
-        
-        if cnpj:
-            query = query.filter(Empresa.cnpj.like(f"%{cnpj}%"))
+        # Filtros de texto resolvidos pelo índice de busca (FTS5)
+        query = IndiceBuscaEmpresa.filtrar(query, {
+            'razao_social': razao_social,
+            'cnpj': cnpj,
+            'tipos_carga': tipo_carga,
+            'modalidades': modalidade,
+            'certificacoes': certificacao,
+            'abrangencia': abrangencia,
+            'portos': portos_atendidos,
+            'regulamentacoes': tipo_regulamentacao,
+            'tipos_frota': tipo_frota,
+            'tipos_veiculo': tipo_veiculo,
+            'tecnologias': nome_tecnologia,
+            'segmentos': segmento_cliente,
+            'certificacoes_ambientais': certificacao_ambiental
+        }, termo_livre=busca)
         
         if etiqueta:
             query = query.filter(Empresa.etiqueta == etiqueta)
         
-        if tipo_carga:
-            query = query.join(TipoCarga).filter(TipoCarga.tipo_carga.ilike(f"%{tipo_carga}%"))
-        
-        if modalidade:
-            query = query.join(ModalidadeTransporte).filter(ModalidadeTransporte.modalidade.ilike(f"%{modalidade}%"))
-        
-        if certificacao:
-            query = query.join(Certificacao).filter(Certificacao.nome_certificacao.ilike(f"%{certificacao}%"))
-        
-        if abrangencia:
-            query = query.join(AbrangenciaGeografica).filter(
-                or_(
-                    AbrangenciaGeografica.tipo_abrangencia.ilike(f"%{abrangencia}%"),
-                    AbrangenciaGeografica.detalhes.ilike(f"%{abrangencia}%")
-                )
-            )
-        
         if possui_armazem:
             possui_armazem_bool = possui_armazem.lower() in ["true", "1", "sim"]
-            query = query.join(Armazenagem).filter(Armazenagem.possui_armazem == possui_armazem_bool)
-        
-        if portos_atendidos:
-            query = query.join(PortoTerminal).filter(PortoTerminal.nome_porto_terminal.ilike(f"%{portos_atendidos}%"))
-        
-        if tipo_regulamentacao:
-            query = query.join(Regulamentacao).filter(Regulamentacao.tipo_regulamentacao.ilike(f"%{tipo_regulamentacao}%"))
-        
-        if tipo_frota:
-            query = query.join(Frota).filter(Frota.tipo_frota.ilike(f"%{tipo_frota}%"))
-        
-        if tipo_veiculo:
-            query = query.join(Frota).filter(Frota.tipo_veiculo.ilike(f"%{tipo_veiculo}%"))
+            query = query.filter(Empresa.id.in_(
+                select(Armazenagem.empresa_id).where(Armazenagem.possui_armazem == possui_armazem_bool)
+            ))
         
         if possui_seguro:
             possui_seguro_bool = possui_seguro.lower() in ["true", "1", "sim"]
+            empresas_com_seguro = select(SeguroCobertura.empresa_id).where(SeguroCobertura.tipo_seguro.isnot(None))
             if possui_seguro_bool:
-                query = query.join(SeguroCobertura).filter(SeguroCobertura.tipo_seguro.isnot(None))
+                query = query.filter(Empresa.id.in_(empresas_com_seguro))
             else:
                 # Empresas que não possuem nenhum registro de seguro
-                query = query.outerjoin(SeguroCobertura).filter(SeguroCobertura.id.is_(None))
-        
-        if nome_tecnologia:
-            query = query.join(Tecnologia).filter(Tecnologia.nome_tecnologia.ilike(f"%{nome_tecnologia}%"))
+                query = query.filter(~Empresa.id.in_(select(SeguroCobertura.empresa_id)))
         
-        if segmento_cliente:
-            query = query.join(ClienteSegmento).filter(ClienteSegmento.segmento.ilike(f"%{segmento_cliente}%"))
-        
-        if certificacao_ambiental:
-            query = query.join(Sustentabilidade).filter(Sustentabilidade.certificacao_ambiental.ilike(f"%{certificacao_ambiental}%"))
         # Executar query com paginação
-        empresas = query.distinct().paginate(
+        empresas = query.order_by(Empresa.id).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -125,7 +106,7 @@ def get_empresas():
 def get_empresa(empresa_id):
     """Obter detalhes completos de uma empresa específica"""
     try:
-        empresa = Empresa.query.get_or_404(empresa_id)
+        empresa = Empresa.consulta_completa().get_or_404(empresa_id)
         return jsonify(empresa.to_dict_complete())
     
     except Exception as e:
@@ -184,6 +165,8 @@ def create_empresa():
             user_agent=request.headers.get('User-Agent')
         )
         
+        # Recarregar com todos os relacionamentos (expirados pelo commit) em uma consulta por tabela
+        empresa = Empresa.consulta_completa().filter_by(id=empresa.id).one()
         return jsonify(empresa.to_dict_complete()), 201
     
     except Exception as e:
@@ -201,7 +184,8 @@ def update_empresa(empresa_id):
         if not current_user.pode_acessar('editar_empresa'):
             return jsonify({"error": "Acesso negado"}), 403
             
-        empresa = Empresa.query.get_or_404(empresa_id)
+        # Todas as coleções carregadas de uma vez: a reconciliação e a resposta usam esse estado
+        empresa = Empresa.consulta_completa().get_or_404(empresa_id)
         data = request.get_json()
         
         # Guardar dados originais para o log
@@ -230,36 +214,18 @@ def update_empresa(empresa_id):
         empresa.updated_at = datetime.utcnow()
 
         # ---------- relacionamentos ----------
-        if "portos_terminais" in data:
-            _update_portos_terminais(empresa, data["portos_terminais"])
-        if "regulamentacoes" in data:
-            _update_regulamentacoes(empresa, data["regulamentacoes"])
-        if "certificacoes" in data:
-            _update_certificacoes(empresa, data["certificacoes"])
-        if "modalidades_transporte" in data:
-            _update_modalidades(empresa, data["modalidades_transporte"])
-        if "tipos_carga" in data:
-            _update_tipos_carga(empresa, data["tipos_carga"])
-        if "abrangencia_geografica" in data:
-            _update_abrangencia(empresa, data["abrangencia_geografica"])
-        if "frota" in data:
-            _update_frota(empresa, data["frota"])
-        if "armazenagem" in data:
-            _update_armazenagem(empresa, data["armazenagem"])
-        if "seguros_coberturas" in data:
-            _update_seguros(empresa, data["seguros_coberturas"])
-        if "tecnologias" in data:
-            _update_tecnologias(empresa, data["tecnologias"])
-        if "desempenho_qualidade" in data:
-            _update_desempenho(empresa, data["desempenho_qualidade"])
-        if "clientes_segmentos" in data:
-            _update_clientes(empresa, data["clientes_segmentos"])
-        if "recursos_humanos" in data:
-            _update_recursos(empresa, data["recursos_humanos"])
-        if "sustentabilidade" in data:
-            _update_sustentabilidade(empresa, data["sustentabilidade"])
+        # Apenas as diferenças em relação às linhas existentes viram INSERT/UPDATE/DELETE
+        for chave, modelo, normalizar in RELACIONADOS_JSON:
+            if chave in data:
+                reconciliar_colecao(
+                    getattr(empresa, chave), modelo,
+                    _normalizar_relacionados(chave, modelo, normalizar, data[chave]),
+                    modelo.CHAVE_NATURAL
+                )
 
-        db.session.commit()
+        # Montar a resposta a partir do estado já carregado (antes do commit expirar os objetos)
+        db.session.flush()
+        resposta = empresa.to_dict_complete()
         
         # Registrar log de auditoria
         alteracoes = []
@@ -272,6 +238,8 @@ def update_empresa(empresa_id):
         if alteracoes:
             detalhes += f" - Alterações: {'; '.join(alteracoes)}"
         
+        db.session.commit()
+        
         LogAuditoria.registrar_acao(
             usuario_id=current_user.id,
             acao='EDITAR_EMPRESA',
@@ -281,7 +249,10 @@ def update_empresa(empresa_id):
             user_agent=request.headers.get('User-Agent')
         )
         
-        return jsonify(empresa.to_dict_complete())
+        return jsonify(resposta)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -334,42 +305,47 @@ def search_empresas():
         # Query base
         query = Empresa.query
         
-        # Filtros de texto
-        if data.get("razao_social"):
-            query = query.filter(Empresa.razao_social.ilike(f"%{data['razao_social']}%"))
-        
-        if data.get("cnpj"):
-            query = query.filter(Empresa.cnpj.like(f"%{data['cnpj']}%"))
+        # Filtros de texto resolvidos pelo índice de busca (FTS5)
+        query = IndiceBuscaEmpresa.filtrar(query, {
+            'razao_social': data.get("razao_social"),
+            'cnpj': data.get("cnpj")
+        }, termo_livre=data.get("q"))
         
-        # Filtros por relacionamentos
+        # Filtros por relacionamentos (subconsultas IN, sem JOIN + DISTINCT)
         if data.get("tipos_carga"):
             tipos_carga = data["tipos_carga"] if isinstance(data["tipos_carga"], list) else [data["tipos_carga"]]
-            query = query.join(TipoCarga).filter(TipoCarga.tipo_carga.in_(tipos_carga))
+            query = query.filter(Empresa.id.in_(
+                select(TipoCarga.empresa_id).where(TipoCarga.tipo_carga.in_(tipos_carga))
+            ))
         
         if data.get("modalidades"):
             modalidades = data["modalidades"] if isinstance(data["modalidades"], list) else [data["modalidades"]]
-            query = query.join(ModalidadeTransporte).filter(ModalidadeTransporte.modalidade.in_(modalidades))
+            query = query.filter(Empresa.id.in_(
+                select(ModalidadeTransporte.empresa_id).where(ModalidadeTransporte.modalidade.in_(modalidades))
+            ))
         
         if data.get("certificacoes"):
             certificacoes = data["certificacoes"] if isinstance(data["certificacoes"], list) else [data["certificacoes"]]
-            query = query.join(Certificacao).filter(Certificacao.nome_certificacao.in_(certificacoes))
+            query = query.filter(Empresa.id.in_(
+                select(Certificacao.empresa_id).where(Certificacao.nome_certificacao.in_(certificacoes))
+            ))
         
         if data.get("regioes"):
             regioes = data["regioes"] if isinstance(data["regioes"], list) else [data["regioes"]]
-            conditions = []
-            for regiao in regioes:
-                conditions.append(AbrangenciaGeografica.tipo_abrangencia.ilike(f"%{regiao}%"))
-                conditions.append(AbrangenciaGeografica.detalhes.ilike(f"%{regiao}%"))
-            query = query.join(AbrangenciaGeografica).filter(or_(*conditions))
+            query = query.filter(or_(*[
+                IndiceBuscaEmpresa.condicao({'abrangencia': regiao}) for regiao in regioes
+            ]))
         
         if data.get("possui_armazem") is not None:
-            query = query.join(Armazenagem).filter(Armazenagem.possui_armazem == data["possui_armazem"])
+            query = query.filter(Empresa.id.in_(
+                select(Armazenagem.empresa_id).where(Armazenagem.possui_armazem == data["possui_armazem"])
+            ))
         
         # Paginação
         page = data.get("page", 1)
         per_page = data.get("per_page", 10)
         
-        empresas = query.distinct().paginate(
+        empresas = query.order_by(Empresa.id).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -643,10 +619,10 @@ def _add_related_data(empresa, data):
 def get_analytics():
     """Retorna dados analytics para o dashboard"""
     try:
-        # Buscar todas as empresas
-        empresas = Empresa.query.all()
+        # Total de empresas
+        total_empresas = db.session.scalar(select(func.count(Empresa.id)))
         
-        if not empresas:
+        if not total_empresas:
             # Retornar dados de exemplo se não houver empresas
             return jsonify({
                 'empresasPorRegiao': [
@@ -668,16 +644,16 @@ def get_analytics():
                 ]
             })
         
-        # Análise por região
-        regioes_count = {}
-        for empresa in empresas:
-            endereco = empresa.endereco_completo if empresa.endereco_completo else 'Não informado'
-            regiao = extrair_regiao_do_endereco(endereco)
-            regioes_count[regiao] = regioes_count.get(regiao, 0) + 1
+        # Análise por região (coluna pré-calculada; ordem da primeira ocorrência)
+        regiao = func.coalesce(Empresa.regiao, REGIAO_NAO_INFORMADA)
+        regioes_count = db.session.execute(
+            select(regiao, func.count(Empresa.id))
+            .group_by(regiao)
+            .order_by(func.min(Empresa.id))
+        ).all()
         
-        total_empresas = len(empresas)
         empresas_por_regiao = []
-        for regiao, count in regioes_count.items():
+        for regiao, count in regioes_count:
             porcentagem = round((count / total_empresas) * 100, 1)
             empresas_por_regiao.append({
                 'regiao': regiao,
@@ -686,32 +662,16 @@ def get_analytics():
             })
         
         # Análise de tipos de carga
-        tipos_carga_count = {}
-        for empresa in empresas:
-            for tipo_carga in empresa.tipos_carga:
-                tipo = tipo_carga.tipo_carga if tipo_carga.tipo_carga else 'Não informado'
-                tipos_carga_count[tipo] = tipos_carga_count.get(tipo, 0) + 1
-        
-        tipos_carga = []
-        for tipo, count in sorted(tipos_carga_count.items(), key=lambda x: x[1], reverse=True)[:6]:
-            tipos_carga.append({
-                'tipo': tipo,
-                'quantidade': count
-            })
+        tipos_carga = [
+            {'tipo': tipo, 'quantidade': count}
+            for tipo, count in _contagem_top(TipoCarga, TipoCarga.tipo_carga, 6)
+        ]
         
         # Análise de certificações
-        certificacoes_count = {}
-        for empresa in empresas:
-            for certificacao in empresa.certificacoes:
-                nome = certificacao.nome_certificacao if certificacao.nome_certificacao else 'Não informado'
-                certificacoes_count[nome] = certificacoes_count.get(nome, 0) + 1
-        
-        certificacoes = []
-        for cert, count in sorted(certificacoes_count.items(), key=lambda x: x[1], reverse=True)[:6]:
-            certificacoes.append({
-                'certificacao': cert,
-                'quantidade': count
-            })
+        certificacoes = [
+            {'certificacao': cert, 'quantidade': count}
+            for cert, count in _contagem_top(Certificacao, Certificacao.nome_certificacao, 6)
+        ]
         
         # Crescimento mensal (simulado baseado no número atual de empresas)
         import datetime
@@ -728,10 +688,23 @@ def get_analytics():
                 'empresas': empresas_no_mes
             })
         
-        # Métricas detalhadas para a tabela
-        empresas_certificadas = len(set(empresa.id for empresa in empresas for cert in empresa.certificacoes))
-        empresas_com_armazem = len([empresa for empresa in empresas for arm in empresa.armazenagem if arm.possui_armazem])
-        empresas_abrangencia_nacional = len([empresa for empresa in empresas for abr in empresa.abrangencia_geografica if 'nacional' in abr.tipo_abrangencia.lower()])
+        # Métricas detalhadas para a tabela (uma única consulta)
+        empresas_certificadas, empresas_com_armazem, empresas_abrangencia_nacional = db.session.execute(
+            select(
+                select(func.count(func.distinct(Certificacao.empresa_id)))
+                .join(Empresa, Empresa.id == Certificacao.empresa_id)
+                .scalar_subquery(),
+                # Conta registros de armazém (não empresas distintas), como no cálculo original
+                select(func.count(Armazenagem.id))
+                .join(Empresa, Empresa.id == Armazenagem.empresa_id)
+                .where(Armazenagem.possui_armazem.is_(True))
+                .scalar_subquery(),
+                select(func.count(AbrangenciaGeografica.id))
+                .join(Empresa, Empresa.id == AbrangenciaGeografica.empresa_id)
+                .where(func.lower(AbrangenciaGeografica.tipo_abrangencia).like('%nacional%'))
+                .scalar_subquery()
+            )
+        ).one()
         
         metricas_detalhadas = [
             {'metrica': 'Total de Empresas', 'valor': total_empresas},
@@ -752,28 +725,27 @@ def get_analytics():
         print(f"Erro ao gerar analytics: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
-def extrair_regiao_do_endereco(endereco):
-    """Extrai a região do endereço completo baseado em palavras-chave"""
-    if not endereco or endereco == 'Não informado' or endereco.strip() == '':
-        return 'Não Informado'
-    
-    endereco_upper = endereco.upper()
-    
-    # Mapeamento de estados e cidades para regiões
-    regioes_keywords = {
-        'Sudeste': ['SP', 'SÃO PAULO', 'RJ', 'RIO DE JANEIRO', 'MG', 'MINAS GERAIS', 'BELO HORIZONTE', 'ES', 'ESPÍRITO SANTO', 'VITÓRIA'],
-        'Sul': ['RS', 'RIO GRANDE DO SUL', 'PORTO ALEGRE', 'SC', 'SANTA CATARINA', 'FLORIANÓPOLIS', 'PR', 'PARANÁ', 'CURITIBA'],
-        'Nordeste': ['BA', 'BAHIA', 'SALVADOR', 'PE', 'PERNAMBUCO', 'RECIFE', 'CE', 'CEARÁ', 'FORTALEZA', 'PB', 'PARAÍBA', 'JOÃO PESSOA', 'RN', 'RIO GRANDE DO NORTE', 'NATAL', 'AL', 'ALAGOAS', 'MACEIÓ', 'SE', 'SERGIPE', 'ARACAJU', 'MA', 'MARANHÃO', 'SÃO LUÍS', 'PI', 'PIAUÍ', 'TERESINA'],
-        'Centro-Oeste': ['MT', 'MATO GROSSO', 'CUIABÁ', 'MS', 'MATO GROSSO DO SUL', 'CAMPO GRANDE', 'GO', 'GOIÁS', 'GOIÂNIA', 'DF', 'DISTRITO FEDERAL', 'BRASÍLIA'],
-        'Norte': ['AM', 'AMAZONAS', 'MANAUS', 'PA', 'PARÁ', 'BELÉM', 'AC', 'ACRE', 'RIO BRANCO', 'RR', 'RORAIMA', 'BOA VISTA', 'RO', 'RONDÔNIA', 'PORTO VELHO', 'AP', 'AMAPÁ', 'MACAPÁ', 'TO', 'TOCANTINS', 'PALMAS']
-    }
-    
-    for regiao, keywords in regioes_keywords.items():
-        for keyword in keywords:
-            if keyword in endereco_upper:
-                return regiao
-    
-    return 'Não Informado'
+def _contagem_top(modelo, coluna, limite):
+    """
+    Contagem agrupada de um campo de tabela filha, das maiores para as menores.
+    Empates seguem a ordem da primeira ocorrência (empresa_id, id), a mesma
+    ordem em que os registros eram percorridos empresa a empresa.
+    """
+    valor = func.coalesce(func.nullif(coluna, ''), 'Não informado')
+    registros = (
+        select(
+            valor.label('valor'),
+            func.row_number().over(order_by=(modelo.empresa_id, modelo.id)).label('ordem')
+        )
+        .join(Empresa, Empresa.id == modelo.empresa_id)
+        .subquery()
+    )
+    return db.session.execute(
+        select(registros.c.valor, func.count())
+        .group_by(registros.c.valor)
+        .order_by(func.count().desc(), func.min(registros.c.ordem))
+        .limit(limite)
+    ).all()
 
 def mapear_estado_para_regiao(estado):
     """Mapeia estado brasileiro para região"""
@@ -850,27 +822,126 @@ def get_metricas_avancadas():
 
 
 
+# Empresas carregadas (com todos os relacionamentos) por lote na exportação
+LOTE_EXPORTACAO = 200
+
+
+def _lotes_empresas_completas(tamanho=LOTE_EXPORTACAO):
+    """Percorre as empresas por faixa de id, carregando os relacionamentos lote a lote"""
+    ultimo_id = 0
+    while True:
+        lote = Empresa.consulta_completa()\
+            .filter(Empresa.id > ultimo_id)\
+            .order_by(Empresa.id)\
+            .limit(tamanho)\
+            .all()
+        if not lote:
+            return
+        
+        yield [empresa.to_dict_complete() for empresa in lote]
+        
+        ultimo_id = lote[-1].id
+        # Liberar o lote da sessão para manter a memória constante
+        for empresa in lote:
+            db.session.expunge(empresa)
+
+
+def _gerar_exportacao(formato, metadata, serializar, ao_concluir_lote=None):
+    """Gera o conteúdo da exportação em trechos de texto, lote a lote"""
+    if formato == "ndjson":
+        # Uma empresa por linha
+        for lote in _lotes_empresas_completas():
+            yield ''.join(serializar(empresa) + '\n' for empresa in lote)
+            if ao_concluir_lote:
+                ao_concluir_lote(len(lote))
+        return
+    
+    # Mesma estrutura do backup anterior: {"empresas": [...], "metadata": {...}}
+    yield '{"empresas": ['
+    primeiro = True
+    for lote in _lotes_empresas_completas():
+        for empresa in lote:
+            yield ('' if primeiro else ', ') + serializar(empresa)
+            primeiro = False
+        if ao_concluir_lote:
+            ao_concluir_lote(len(lote))
+    yield '], "metadata": ' + serializar(metadata) + '}'
+
+
+def _metadata_exportacao():
+    total_empresas = db.session.scalar(select(func.count(Empresa.id)))
+    return {
+        "export_date": datetime.utcnow().isoformat(),
+        "total_empresas": total_empresas,
+        "version": "1.0"
+    }
+
+
+def _job_exportar_empresas(contexto, formato):
+    """Tarefa em segundo plano: grava a exportação em arquivo para download"""
+    metadata = _metadata_exportacao()
+    total = metadata["total_empresas"] or 1
+    exportadas = 0
+    
+    def ao_concluir_lote(quantidade):
+        nonlocal exportadas
+        exportadas += quantidade
+        contexto.progresso(min(99, exportadas * 100 // total), f"{exportadas} de {metadata['total_empresas']} empresas exportadas")
+    
+    caminho = contexto.caminho_arquivo(formato)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        for trecho in _gerar_exportacao(formato, metadata, current_app.json.dumps, ao_concluir_lote):
+            arquivo.write(trecho)
+    
+    return {"total_empresas": metadata["total_empresas"], "formato": formato, "arquivo": caminho}
+
+
+def _execucao_assincrona():
+    """Indica se o cliente pediu a execução em segundo plano (?async=1)"""
+    valor = request.args.get("async") or request.args.get("assincrono") or request.form.get("async") or ""
+    return valor.lower() in ("1", "true", "sim")
+
+
+def _usuario_job():
+    return current_user.id if current_user and current_user.is_authenticated else None
+
+
+def _resposta_job(job):
+    """Resposta 202 com o id da tarefa e as URLs de acompanhamento"""
+    return jsonify({
+        "message": "Tarefa iniciada em segundo plano",
+        "job_id": job.id,
+        "job": job.to_dict(),
+        "status_url": f"/api/jobs/{job.id}",
+        "download_url": f"/api/jobs/{job.id}/download"
+    }), 202
+
+
 @empresa_bp.route("/empresas/export", methods=["GET"])
 def export_empresas():
-    """Exportar todos os dados das empresas em formato JSON"""
+    """Exportar todos os dados das empresas em formato JSON (ou NDJSON) via streaming ou em segundo plano"""
     try:
-        # Buscar todas as empresas com dados completos
-        empresas = Empresa.query.all()
+        formato = (request.args.get("formato") or request.args.get("format") or "json").lower()
+        if formato not in ("json", "ndjson"):
+            return jsonify({"error": "Formato inválido. Use 'json' ou 'ndjson'"}), 400
         
-        # Preparar dados para exportação
-        export_data = {
-            "metadata": {
-                "export_date": datetime.utcnow().isoformat(),
-                "total_empresas": len(empresas),
-                "version": "1.0"
-            },
-            "empresas": [empresa.to_dict_complete() for empresa in empresas]
-        }
+        if _execucao_assincrona():
+            job = jobs.enfileirar("exportacao_empresas", _job_exportar_empresas, formato, usuario_id=_usuario_job())
+            return _resposta_job(job)
         
-        # Retornar dados como JSON para download
-        response = jsonify(export_data)
-        response.headers["Content-Disposition"] = f"attachment; filename=brccsis_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        response.headers["Content-Type"] = "application/json"
+        metadata = _metadata_exportacao()
+        
+        if formato == "ndjson":
+            mimetype, extensao = "application/x-ndjson", "ndjson"
+        else:
+            mimetype, extensao = "application/json", "json"
+        
+        response = Response(
+            stream_with_context(_gerar_exportacao(formato, metadata, current_app.json.dumps)),
+            mimetype=mimetype
+        )
+        response.headers["Content-Disposition"] = f"attachment; filename=brccsis_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extensao}"
+        response.headers["X-Total-Empresas"] = str(metadata["total_empresas"])
         
         return response
     
@@ -908,45 +979,17 @@ def import_empresas():
         if not isinstance(empresas_data, list):
             return jsonify({"error": "Campo 'empresas' deve ser uma lista"}), 400
         
-        # Estatísticas da importação
-        stats = {
-            "total_processadas": 0,
-            "criadas": 0,
-            "atualizadas": 0,
-            "erros": 0,
-            "detalhes_erros": []
-        }
+        # modo=lote: gravação em massa (consultas IN, executemany e savepoints por registro)
+        modo = (request.args.get("modo") or request.form.get("modo") or "registro").lower()
+        if modo not in ("registro", "lote"):
+            return jsonify({"error": "Modo inválido. Use 'registro' ou 'lote'"}), 400
         
-        # Processar cada empresa
-        for empresa_data in empresas_data:
-            try:
-                stats["total_processadas"] += 1
-                
-                # Verificar se empresa já existe (por CNPJ)
-                cnpj = empresa_data.get('cnpj')
-                if not cnpj:
-                    stats["erros"] += 1
-                    stats["detalhes_erros"].append(f"Empresa sem CNPJ: {empresa_data.get('razao_social', 'N/A')}")
-                    continue
-                
-                empresa_existente = Empresa.query.filter_by(cnpj=cnpj).first()
-                
-                if empresa_existente:
-                    # Atualizar empresa existente
-                    _update_empresa_from_import(empresa_existente, empresa_data)
-                    stats["atualizadas"] += 1
-                else:
-                    # Criar nova empresa
-                    _create_empresa_from_import(empresa_data)
-                    stats["criadas"] += 1
-                
-            except Exception as e:
-                stats["erros"] += 1
-                stats["detalhes_erros"].append(f"Erro ao processar empresa {empresa_data.get('razao_social', 'N/A')}: {str(e)}")
-                continue
+        if _execucao_assincrona():
+            job = jobs.enfileirar("importacao_json", _job_importar_empresas_json, empresas_data, modo, usuario_id=_usuario_job())
+            return _resposta_job(job)
         
-        # Confirmar transação
-        db.session.commit()
+        importar = _importar_empresas_json_lote if modo == "lote" else _importar_empresas_json
+        stats = importar(empresas_data)
         
         return jsonify({
             "message": "Importação concluída com sucesso",
@@ -958,10 +1001,90 @@ def import_empresas():
         return jsonify({"error": f"Erro durante a importação: {str(e)}"}), 500
 
 
+def _importar_empresas_json(empresas_data, contexto=None):
+    """
+    Cria/atualiza as empresas de uma importação JSON e retorna as estatísticas.
+    Em segundo plano (contexto informado) confirma a cada lote, registrando o
+    progresso e sem manter o banco bloqueado para escrita durante toda a carga.
+    """
+    # Estatísticas da importação
+    stats = {
+        "total_processadas": 0,
+        "criadas": 0,
+        "atualizadas": 0,
+        "erros": 0,
+        "detalhes_erros": []
+    }
+    total = len(empresas_data)
+    
+    # Processar cada empresa
+    for empresa_data in empresas_data:
+        if contexto and stats["total_processadas"] and stats["total_processadas"] % LOTE_IMPORTACAO == 0:
+            db.session.commit()
+            contexto.progresso(stats["total_processadas"] * 100 // total,
+                               f"{stats['total_processadas']} de {total} empresas processadas")
+        
+        try:
+            stats["total_processadas"] += 1
+            
+            # Verificar se empresa já existe (por CNPJ)
+            cnpj = empresa_data.get('cnpj')
+            if not cnpj:
+                stats["erros"] += 1
+                stats["detalhes_erros"].append(f"Empresa sem CNPJ: {empresa_data.get('razao_social', 'N/A')}")
+                continue
+            
+            empresa_existente = Empresa.query.filter_by(cnpj=cnpj).first()
+            
+            if empresa_existente:
+                # Atualizar empresa existente
+                _update_empresa_from_import(empresa_existente, empresa_data)
+                stats["atualizadas"] += 1
+            else:
+                # Criar nova empresa
+                _create_empresa_from_import(empresa_data)
+                stats["criadas"] += 1
+            
+        except Exception as e:
+            stats["erros"] += 1
+            stats["detalhes_erros"].append(f"Erro ao processar empresa {empresa_data.get('razao_social', 'N/A')}: {str(e)}")
+            continue
+    
+    # Confirmar transação
+    db.session.commit()
+    return stats
+
+
+def _job_importar_empresas_json(contexto, empresas_data, modo="registro"):
+    """Tarefa em segundo plano: importação JSON"""
+    importar = _importar_empresas_json_lote if modo == "lote" else _importar_empresas_json
+    return {"estatisticas": importar(empresas_data, contexto)}
+
+
 def _create_empresa_from_import(empresa_data):
     """Criar nova empresa a partir dos dados de importação"""
     # Criar empresa principal
-    empresa = Empresa(
+    empresa = _nova_empresa_import(empresa_data)
+    
+    db.session.add(empresa)
+    db.session.flush()  # Para obter o ID da empresa
+    
+    # Adicionar dados relacionados
+    _add_related_data(empresa, empresa_data)
+
+
+def _update_empresa_from_import(empresa, empresa_data):
+    """Atualizar empresa existente com dados de importação"""
+    _atualizar_campos_import(empresa, empresa_data)
+    
+    # Atualizar dados relacionados (substituindo os existentes)
+    _clear_related_data(empresa)
+    _add_related_data(empresa, empresa_data)
+
+
+def _nova_empresa_import(empresa_data):
+    """Monta (sem adicionar à sessão) uma empresa a partir dos dados de importação"""
+    return Empresa(
         razao_social=empresa_data.get("razao_social"),
         nome_fantasia=empresa_data.get("nome_fantasia"),
         cnpj=empresa_data.get("cnpj"),
@@ -974,17 +1097,10 @@ def _create_empresa_from_import(empresa_data):
         etiqueta=empresa_data.get("etiqueta", "CADASTRADA"),
         data_fundacao=datetime.strptime(empresa_data["data_fundacao"], "%Y-%m-%d").date() if empresa_data.get("data_fundacao") else None
     )
-    
-    db.session.add(empresa)
-    db.session.flush()  # Para obter o ID da empresa
-    
-    # Adicionar dados relacionados
-    _add_related_data(empresa, empresa_data)
 
 
-def _update_empresa_from_import(empresa, empresa_data):
-    """Atualizar empresa existente com dados de importação"""
-    # Atualizar campos básicos
+def _atualizar_campos_import(empresa, empresa_data):
+    """Atualiza os campos básicos de uma empresa com os dados de importação"""
     empresa.razao_social = empresa_data.get("razao_social", empresa.razao_social)
     empresa.nome_fantasia = empresa_data.get("nome_fantasia", empresa.nome_fantasia)
     empresa.inscricao_estadual = empresa_data.get("inscricao_estadual", empresa.inscricao_estadual)
@@ -998,10 +1114,6 @@ def _update_empresa_from_import(empresa, empresa_data):
     
     if empresa_data.get("data_fundacao"):
         empresa.data_fundacao = datetime.strptime(empresa_data["data_fundacao"], "%Y-%m-%d").date()
-    
-    # Atualizar dados relacionados (substituindo os existentes)
-    _clear_related_data(empresa)
-    _add_related_data(empresa, empresa_data)
 
 
 def _clear_related_data(empresa):
@@ -1023,6 +1135,226 @@ def _clear_related_data(empresa):
 
 
 
+# Importação JSON em lote (modo=lote)
+
+def _data_json(valor):
+    return datetime.strptime(valor, "%Y-%m-%d").date() if valor else None
+
+
+def _data_json_opcional(valor):
+    # Datas inválidas são ignoradas (mesmo comportamento de _update_seguros)
+    try:
+        return _data_json(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _padrao_json(padrao):
+    # Valor padrão da coluna quando o campo vem ausente/nulo (como o default aplicado no INSERT)
+    def converter(valor):
+        return valor if valor is not None else padrao
+    return converter
+
+
+def _campos_json(*campos, **conversores):
+    """Normalizador que copia os campos do item, aplicando conversores opcionais"""
+    def normalizar(item):
+        registro = {campo: item.get(campo) for campo in campos}
+        for campo, converter in conversores.items():
+            registro[campo] = converter(item.get(campo))
+        return registro
+    return normalizar
+
+
+def _valor_simples_json(campo):
+    """Normalizador de listas que aceitam tanto {"campo": valor} quanto o valor direto"""
+    def normalizar(item):
+        return {campo: item.get(campo) if isinstance(item, dict) else item}
+    return normalizar
+
+
+# Listas relacionadas do backup JSON: (chave no JSON, modelo, normalizador do item)
+RELACIONADOS_JSON = [
+    ("regulamentacoes", Regulamentacao, _campos_json(
+        "tipo_regulamentacao", "numero_registro", "orgao_emissor",
+        data_emissao=_data_json, data_validade=_data_json)),
+    ("certificacoes", Certificacao, _campos_json(
+        "nome_certificacao", "numero_certificacao", "orgao_certificador",
+        data_emissao=_data_json, data_validade=_data_json)),
+    ("modalidades_transporte", ModalidadeTransporte, _valor_simples_json("modalidade")),
+    ("tipos_carga", TipoCarga, _valor_simples_json("tipo_carga")),
+    ("abrangencia_geografica", AbrangenciaGeografica, _campos_json("tipo_abrangencia", "detalhes")),
+    ("frota", Frota, _campos_json(
+        "tipo_frota", "quantidade", "tipo_veiculo", "tipo_carroceria", "capacidade", "ano_medio")),
+    ("armazenagem", Armazenagem, _campos_json(
+        "possui_armazem", "localizacao", "capacidade_m2", "capacidade_m3",
+        "tipos_armazenagem", "servicos_oferecidos")),
+    ("portos_terminais", PortoTerminal, _campos_json("nome_porto_terminal", "tipo_terminal")),
+    ("seguros_coberturas", SeguroCobertura, _campos_json(
+        "tipo_seguro", "numero_apolice", "seguradora", "valor_cobertura",
+        data_validade=_data_json_opcional)),
+    ("tecnologias", Tecnologia, _campos_json("nome_tecnologia", "detalhes")),
+    ("desempenho_qualidade", DesempenhoQualidade, _campos_json(
+        "prazo_medio_atendimento", "indice_avarias_extravios", "indice_entregas_prazo",
+        unidade_prazo=_padrao_json('dias'))),
+    ("clientes_segmentos", ClienteSegmento, _campos_json("segmento", "principais_clientes")),
+    ("recursos_humanos", RecursoHumano, _campos_json("numero_funcionarios", "programas_treinamento")),
+    ("sustentabilidade", Sustentabilidade, _campos_json("certificacao_ambiental", "programas_reducao_emissoes")),
+]
+
+
+def _normalizar_relacionados(chave, modelo, normalizar, itens):
+    """Converte uma lista do JSON em registros do modelo. Lança ValueError se faltar campo obrigatório."""
+    obrigatorias = [c.name for c in modelo.__table__.columns if not c.nullable and c.name not in ('id', 'empresa_id')]
+    registros = []
+    for item in itens or []:
+        registro = normalizar(item)
+        faltando = [c for c in obrigatorias if registro.get(c) is None]
+        if faltando:
+            raise ValueError(f"{chave}: campo obrigatório vazio ({', '.join(faltando)})")
+        registros.append(registro)
+    
+    if modelo is PortoTerminal:
+        # Portos/terminais sem duplicatas e com nome e tipo preenchidos (como em _update_portos_terminais)
+        unicos = {(r["nome_porto_terminal"], r["tipo_terminal"]): r for r in registros
+                  if r["nome_porto_terminal"] and r["tipo_terminal"]}
+        registros = list(unicos.values())
+    
+    return registros
+
+
+def _normalizar_empresa_json(empresa_data):
+    """
+    Valida um registro do backup e monta as linhas das tabelas relacionadas:
+    (empresa_data, {modelo: [registros]}). Lança ValueError se o registro for inválido.
+    """
+    if not isinstance(empresa_data, dict):
+        raise ValueError("Registro de empresa inválido")
+    if not empresa_data.get('cnpj'):
+        raise ValueError("Empresa sem CNPJ")
+    if empresa_data.get("data_fundacao"):
+        _data_json(empresa_data["data_fundacao"])
+    
+    relacionados = {}
+    for chave, modelo, normalizar in RELACIONADOS_JSON:
+        relacionados[modelo] = _normalizar_relacionados(chave, modelo, normalizar, empresa_data.get(chave))
+    
+    return empresa_data, relacionados
+
+
+def _ids_por_cnpj(cnpjs):
+    """Resolve os ids das empresas já cadastradas para uma lista de CNPJs: {cnpj: id}"""
+    cnpjs = list(set(cnpjs))
+    ids = {}
+    for inicio in range(0, len(cnpjs), LOTE_IMPORTACAO):
+        lote = cnpjs[inicio:inicio + LOTE_IMPORTACAO]
+        ids.update(db.session.execute(select(Empresa.cnpj, Empresa.id).where(Empresa.cnpj.in_(lote))).all())
+    return ids
+
+
+def _gravar_lote_json(registros, id_por_cnpj):
+    """
+    Grava um lote de registros normalizados: empresas pelo ORM (um flush),
+    exclusão dos dados relacionados com DELETE ... IN e inserção com executemany.
+    Retorna ({cnpj: id} das empresas gravadas, criadas, atualizadas).
+    """
+    existentes = [id_por_cnpj[dados['cnpj']] for dados, _ in registros if dados['cnpj'] in id_por_cnpj]
+    carregadas = {empresa.id: empresa for empresa in Empresa.query.filter(Empresa.id.in_(existentes))} if existentes else {}
+    
+    empresas = {}
+    relacionados_por_cnpj = {}
+    criadas = atualizadas = 0
+    for dados, relacionados in registros:
+        cnpj = dados['cnpj']
+        empresa = empresas.get(cnpj) or carregadas.get(id_por_cnpj.get(cnpj))
+        if empresa:
+            _atualizar_campos_import(empresa, dados)
+            atualizadas += 1
+        else:
+            empresa = _nova_empresa_import(dados)
+            db.session.add(empresa)
+            criadas += 1
+        empresas[cnpj] = empresa
+        # CNPJ repetido no arquivo: vale o último registro (como na importação registro a registro)
+        relacionados_por_cnpj[cnpj] = relacionados
+    
+    db.session.flush()
+    
+    _excluir_dados_relacionados(list(carregadas))
+    for _, modelo, _ in RELACIONADOS_JSON:
+        linhas = [
+            dict(registro, empresa_id=empresas[cnpj].id)
+            for cnpj, relacionados in relacionados_por_cnpj.items()
+            for registro in relacionados[modelo]
+        ]
+        _inserir_em_lote(modelo, linhas)
+    
+    return {cnpj: empresa.id for cnpj, empresa in empresas.items()}, criadas, atualizadas
+
+
+def _importar_empresas_json_lote(empresas_data, contexto=None):
+    """
+    Importação JSON em massa: todos os CNPJs resolvidos de uma vez e lotes de
+    LOTE_IMPORTACAO registros, cada um confirmado em sua própria transação.
+    Se um lote falhar, ele é regravado registro a registro, cada registro em
+    um savepoint, para que um registro inválido não descarte os demais.
+    """
+    stats = {
+        "total_processadas": 0,
+        "criadas": 0,
+        "atualizadas": 0,
+        "erros": 0,
+        "detalhes_erros": []
+    }
+    
+    def registrar_erro(empresa_data, erro):
+        nome = empresa_data.get('razao_social', 'N/A') if isinstance(empresa_data, dict) else 'N/A'
+        stats["erros"] += 1
+        stats["detalhes_erros"].append(f"Erro ao processar empresa {nome}: {str(erro)}")
+    
+    # Validar e normalizar todos os registros antes de acessar o banco
+    registros = []
+    for empresa_data in empresas_data:
+        stats["total_processadas"] += 1
+        try:
+            registros.append(_normalizar_empresa_json(empresa_data))
+        except (ValueError, TypeError, AttributeError) as e:
+            registrar_erro(empresa_data, e)
+    
+    id_por_cnpj = _ids_por_cnpj([dados['cnpj'] for dados, _ in registros])
+    
+    for inicio in range(0, len(registros), LOTE_IMPORTACAO):
+        lote = registros[inicio:inicio + LOTE_IMPORTACAO]
+        try:
+            with db.session.begin_nested():
+                gravadas, criadas, atualizadas = _gravar_lote_json(lote, id_por_cnpj)
+            id_por_cnpj.update(gravadas)
+            stats["criadas"] += criadas
+            stats["atualizadas"] += atualizadas
+        except Exception:
+            for registro in lote:
+                try:
+                    with db.session.begin_nested():
+                        gravadas, criadas, atualizadas = _gravar_lote_json([registro], id_por_cnpj)
+                    id_por_cnpj.update(gravadas)
+                    stats["criadas"] += criadas
+                    stats["atualizadas"] += atualizadas
+                except Exception as e:
+                    # Erros do banco: apenas a mensagem do driver, sem o SQL
+                    registrar_erro(registro[0], getattr(e, 'orig', None) or e)
+        
+        db.session.commit()
+        # Liberar as empresas do lote para manter a memória constante
+        db.session.expunge_all()
+        
+        if contexto:
+            processadas = min(inicio + LOTE_IMPORTACAO, len(registros))
+            contexto.progresso(processadas * 100 // max(len(registros), 1),
+                               f"{processadas} de {len(registros)} empresas gravadas")
+    
+    return stats
+
+
 @empresa_bp.route("/empresas/import-excel", methods=["POST"])
 def import_empresas_excel():
     """Importar dados das empresas a partir de arquivo Excel"""
@@ -1045,110 +1377,279 @@ def import_empresas_excel():
         except ImportError:
             return jsonify({"error": "Biblioteca pandas não está instalada"}), 500
         
-        # Ler o arquivo Excel
-        try:
-            excel_data = pd.read_excel(file, sheet_name=None)  # Lê todas as abas
-        except Exception as e:
-            return jsonify({"error": f"Erro ao ler arquivo Excel: {str(e)}"}), 400
-        
-        # Verificar se existe a aba "Empresas"
-        if 'Empresas' not in excel_data:
-            return jsonify({"error": "Aba 'Empresas' não encontrada no arquivo Excel"}), 400
-        
-        # Estatísticas da importação
-        stats = {
-            "total_processadas": 0,
-            "criadas": 0,
-            "atualizadas": 0,
-            "erros": 0,
-            "detalhes_erros": []
-        }
-        
-        # Processar aba de empresas
-        empresas_df = excel_data['Empresas']
-        
-        # Validar colunas obrigatórias
-        colunas_obrigatorias = ['razao_social', 'cnpj']
-        for coluna in colunas_obrigatorias:
-            if coluna not in empresas_df.columns:
-                return jsonify({"error": f"Coluna obrigatória '{coluna}' não encontrada na aba Empresas"}), 400
-        
-        # Processar cada empresa
-        for index, row in empresas_df.iterrows():
-            try:
-                stats["total_processadas"] += 1
-                
-                # Limpar e validar CNPJ
-                cnpj = str(row['cnpj']).strip()
-                if pd.isna(row['cnpj']) or cnpj == '' or cnpj == 'nan':
-                    stats["erros"] += 1
-                    stats["detalhes_erros"].append(f"Linha {index + 2}: CNPJ vazio ou inválido")
-                    continue
-                
-                # Remover formatação do CNPJ
-                cnpj = ''.join(filter(str.isdigit, cnpj))
-                if len(cnpj) != 14:
-                    stats["erros"] += 1
-                    stats["detalhes_erros"].append(f"Linha {index + 2}: CNPJ deve ter 14 dígitos")
-                    continue
-                
-                # Verificar se empresa já existe
-                empresa_existente = Empresa.query.filter_by(cnpj=cnpj).first()
-                
-                # Preparar dados da empresa
-                empresa_data = {
-                    'razao_social': str(row['razao_social']).strip() if pd.notna(row['razao_social']) else None,
-                    'nome_fantasia': str(row['nome_fantasia']).strip() if pd.notna(row['nome_fantasia']) else None,
-                    'cnpj': cnpj,
-                    'inscricao_estadual': str(row['inscricao_estadual']).strip() if pd.notna(row['inscricao_estadual']) else None,
-                    'endereco_completo': str(row['endereco_completo']).strip() if pd.notna(row['endereco_completo']) else None,
-                    'telefone_comercial': str(row['telefone_comercial']).strip() if pd.notna(row['telefone_comercial']) else None,
-                    'telefone_emergencial': str(row['telefone_emergencial']).strip() if pd.notna(row['telefone_emergencial']) else None,
-                    'email': str(row['email']).strip() if pd.notna(row['email']) else None,
-                    'website': str(row['website']).strip() if pd.notna(row['website']) else None,
-                    'etiqueta': str(row['etiqueta']).strip() if pd.notna(row['etiqueta']) else 'CADASTRADA'
-                }
-                
-                # Processar data de fundação
-                if pd.notna(row['data_fundacao']):
-                    try:
-                        if isinstance(row['data_fundacao'], str):
-                            empresa_data['data_fundacao'] = row['data_fundacao']
-                        else:
-                            empresa_data['data_fundacao'] = row['data_fundacao'].strftime('%Y-%m-%d')
-                    except:
-                        pass
-                
-                if empresa_existente:
-                    # Atualizar empresa existente
-                    _update_empresa_from_excel(empresa_existente, empresa_data, excel_data, cnpj)
-                    stats["atualizadas"] += 1
-                else:
-                    # Criar nova empresa
-                    _create_empresa_from_excel(empresa_data, excel_data, cnpj)
-                    stats["criadas"] += 1
-                
-            except Exception as e:
-                stats["erros"] += 1
-                stats["detalhes_erros"].append(f"Linha {index + 2}: {str(e)}")
-                continue
+        if _execucao_assincrona():
+            # O arquivo é lido para a memória: a requisição termina antes da tarefa
+            conteudo = file.read()
+            job = jobs.enfileirar("importacao_excel", _job_importar_empresas_excel, conteudo, usuario_id=_usuario_job())
+            return _resposta_job(job)
         
-        # Confirmar transação
-        db.session.commit()
+        stats = _importar_empresas_excel(file)
         
         return jsonify({
             "message": "Importação de planilha concluída com sucesso",
             "estatisticas": stats
         })
     
+    except ErroImportacao as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Erro durante a importação: {str(e)}"}), 500
 
 
-def _create_empresa_from_excel(empresa_data, excel_data, cnpj):
+class ErroImportacao(Exception):
+    """Arquivo de importação inválido (resposta 400 na execução síncrona)"""
+
+
+def _importar_empresas_excel(arquivo, contexto=None):
+    """Lê a planilha, cria/atualiza as empresas e seus dados relacionados e retorna as estatísticas"""
+    import pandas as pd
+    
+    def progresso(percentual, mensagem):
+        if contexto:
+            contexto.progresso(percentual, mensagem)
+    
+    # Ler o arquivo Excel
+    progresso(5, "Lendo planilha")
+    try:
+        excel_data = pd.read_excel(arquivo, sheet_name=None)  # Lê todas as abas
+    except Exception as e:
+        raise ErroImportacao(f"Erro ao ler arquivo Excel: {str(e)}")
+    
+    # Verificar se existe a aba "Empresas"
+    if 'Empresas' not in excel_data:
+        raise ErroImportacao("Aba 'Empresas' não encontrada no arquivo Excel")
+    
+    # Estatísticas da importação
+    stats = {
+        "total_processadas": 0,
+        "criadas": 0,
+        "atualizadas": 0,
+        "erros": 0,
+        "detalhes_erros": []
+    }
+    
+    # Processar aba de empresas
+    empresas_df = excel_data['Empresas']
+    
+    # Validar colunas obrigatórias
+    colunas_obrigatorias = ['razao_social', 'cnpj']
+    for coluna in colunas_obrigatorias:
+        if coluna not in empresas_df.columns:
+            raise ErroImportacao(f"Coluna obrigatória '{coluna}' não encontrada na aba Empresas")
+    
+    progresso(40, f"Processando {len(empresas_df)} empresas")
+    
+    # Normalizar todos os CNPJs de uma vez (somente dígitos)
+    cnpjs = empresas_df['cnpj'].astype(str).str.strip().str.replace(r'\D', '', regex=True)
+    cnpjs_vazios = empresas_df['cnpj'].isna() | empresas_df['cnpj'].astype(str).str.strip().isin(['', 'nan'])
+    
+    # Buscar empresas já cadastradas com uma consulta IN por lote
+    empresas_por_cnpj = _empresas_por_cnpj(cnpjs[~cnpjs_vazios & (cnpjs.str.len() == 14)].unique().tolist())
+    
+    # Empresas criadas/atualizadas nesta importação e empresas cujos dados relacionados serão substituídos
+    processadas = {}
+    atualizadas_ids = set()
+    
+    colunas = [c for c in COLUNAS_EMPRESA_EXCEL if c in empresas_df.columns]
+    registros = empresas_df[colunas].astype(object).where(empresas_df[colunas].notna(), None).to_dict('records')
+    
+    for posicao, row in enumerate(registros):
+        linha = posicao + 2
+        stats["total_processadas"] += 1
+        
+        if cnpjs_vazios.iat[posicao]:
+            stats["erros"] += 1
+            stats["detalhes_erros"].append(f"Linha {linha}: CNPJ vazio ou inválido")
+            continue
+        
+        cnpj = cnpjs.iat[posicao]
+        if len(cnpj) != 14:
+            stats["erros"] += 1
+            stats["detalhes_erros"].append(f"Linha {linha}: CNPJ deve ter 14 dígitos")
+            continue
+        
+        try:
+            empresa_data = _dados_empresa_excel(row, cnpj)
+        except ValueError as e:
+            stats["erros"] += 1
+            stats["detalhes_erros"].append(f"Linha {linha}: {str(e)}")
+            continue
+        
+        empresa = processadas.get(cnpj) or empresas_por_cnpj.get(cnpj)
+        if empresa:
+            # Atualizar empresa existente (ou repetida na planilha)
+            _update_empresa_from_excel(empresa, empresa_data)
+            if empresa.id is not None:
+                atualizadas_ids.add(empresa.id)
+            stats["atualizadas"] += 1
+        else:
+            # Criar nova empresa
+            empresa = _create_empresa_from_excel(empresa_data)
+            stats["criadas"] += 1
+        processadas[cnpj] = empresa
+    
+    # Obter os IDs das empresas novas
+    db.session.flush()
+    
+    # Substituir dados relacionados: exclusão em lote + inserção em lote a partir das outras abas
+    _excluir_dados_relacionados(atualizadas_ids)
+    _importar_abas_relacionadas(
+        excel_data,
+        {cnpj: empresa.id for cnpj, empresa in processadas.items()},
+        stats
+    )
+    
+    # Confirmar transação
+    db.session.commit()
+    return stats
+
+
+def _job_importar_empresas_excel(contexto, conteudo):
+    """Tarefa em segundo plano: importação da planilha Excel"""
+    return {"estatisticas": _importar_empresas_excel(BytesIO(conteudo), contexto)}
+
+
+# Colunas da aba Empresas
+COLUNAS_EMPRESA_EXCEL = [
+    'razao_social', 'nome_fantasia', 'cnpj', 'inscricao_estadual', 'endereco_completo',
+    'telefone_comercial', 'telefone_emergencial', 'email', 'website', 'data_fundacao', 'etiqueta'
+]
+
+# Tamanho dos lotes de consultas IN e de inserções em massa
+LOTE_IMPORTACAO = 500
+
+
+def _texto(serie):
+    return [str(v) if v is not None else None for v in serie.astype(object).where(serie.notna(), None)]
+
+
+def _texto_padrao(padrao):
+    def converter(serie):
+        return [v if v is not None else padrao for v in _texto(serie)]
+    return converter
+
+
+def _data(serie):
+    import pandas as pd
+    datas = pd.to_datetime(serie, errors='coerce')
+    return [d.date() if pd.notna(d) else None for d in datas]
+
+
+def _inteiro(serie):
+    import pandas as pd
+    return [int(v) if pd.notna(v) else None for v in pd.to_numeric(serie, errors='coerce')]
+
+
+def _decimal(serie):
+    import pandas as pd
+    return [float(v) if pd.notna(v) else None for v in pd.to_numeric(serie, errors='coerce')]
+
+
+def _sim_nao(serie):
+    valores = serie.astype(str).str.lower().isin(['sim', 'yes', 'true', '1']) & serie.notna()
+    return [bool(v) for v in valores]
+
+
+# Abas relacionadas: (nomes aceitos da aba, modelo, {coluna: conversor})
+ABAS_RELACIONADAS_EXCEL = [
+    (('Regulamentações', 'Regulamentacoes'), Regulamentacao, {
+        'tipo_regulamentacao': _texto, 'numero_registro': _texto, 'data_emissao': _data,
+        'data_validade': _data, 'orgao_emissor': _texto
+    }),
+    (('Certificações', 'Certificacoes'), Certificacao, {
+        'nome_certificacao': _texto, 'numero_certificacao': _texto, 'data_emissao': _data,
+        'data_validade': _data, 'orgao_certificador': _texto
+    }),
+    (('Modalidades de Transporte', 'Modalidades'), ModalidadeTransporte, {'modalidade': _texto}),
+    (('Tipos de Carga', 'Tipos_Carga'), TipoCarga, {'tipo_carga': _texto}),
+    (('Abrangência Geográfica', 'Abrangencia'), AbrangenciaGeografica, {
+        'tipo_abrangencia': _texto, 'detalhes': _texto
+    }),
+    (('Frota',), Frota, {
+        'tipo_frota': _texto, 'quantidade': _inteiro, 'tipo_veiculo': _texto,
+        'tipo_carroceria': _texto, 'capacidade': _decimal, 'ano_medio': _inteiro
+    }),
+    (('Armazenagem',), Armazenagem, {
+        'possui_armazem': _sim_nao, 'localizacao': _texto, 'capacidade_m2': _decimal,
+        'capacidade_m3': _decimal, 'tipos_armazenagem': _texto, 'servicos_oferecidos': _texto
+    }),
+    (('Portos e Terminais', 'Portos'), PortoTerminal, {
+        'nome_porto_terminal': _texto, 'tipo_terminal': _texto
+    }),
+    (('Seguros e Coberturas', 'Seguros'), SeguroCobertura, {
+        'tipo_seguro': _texto, 'numero_apolice': _texto, 'data_validade': _data,
+        'seguradora': _texto, 'valor_cobertura': _texto
+    }),
+    (('Tecnologias',), Tecnologia, {'nome_tecnologia': _texto, 'detalhes': _texto}),
+    (('Desempenho e Qualidade', 'Desempenho'), DesempenhoQualidade, {
+        'prazo_medio_atendimento': _texto, 'unidade_prazo': _texto_padrao('dias'),
+        'indice_avarias_extravios': _decimal, 'indice_entregas_prazo': _decimal
+    }),
+    (('Clientes e Segmentos', 'Clientes'), ClienteSegmento, {
+        'segmento': _texto, 'principais_clientes': _texto
+    }),
+    (('Recursos Humanos', 'RH'), RecursoHumano, {
+        'numero_funcionarios': _inteiro, 'programas_treinamento': _texto
+    }),
+    (('Sustentabilidade',), Sustentabilidade, {
+        'certificacao_ambiental': _texto, 'programas_reducao_emissoes': _texto
+    }),
+]
+
+MODELOS_RELACIONADOS = [modelo for _, modelo, _ in ABAS_RELACIONADAS_EXCEL]
+
+
+def _empresas_por_cnpj(cnpjs):
+    """Carrega as empresas existentes para uma lista de CNPJs: {cnpj: empresa}"""
+    empresas = {}
+    for inicio in range(0, len(cnpjs), LOTE_IMPORTACAO):
+        lote = cnpjs[inicio:inicio + LOTE_IMPORTACAO]
+        for empresa in Empresa.query.filter(Empresa.cnpj.in_(lote)):
+            empresas[empresa.cnpj] = empresa
+    return empresas
+
+
+def _dados_empresa_excel(row, cnpj):
+    """Monta os dados da empresa a partir de uma linha da aba Empresas"""
+    def texto(coluna):
+        valor = row.get(coluna)
+        return str(valor).strip() if valor is not None else None
+    
+    empresa_data = {
+        'razao_social': texto('razao_social'),
+        'nome_fantasia': texto('nome_fantasia'),
+        'cnpj': cnpj,
+        'inscricao_estadual': texto('inscricao_estadual'),
+        'endereco_completo': texto('endereco_completo'),
+        'telefone_comercial': texto('telefone_comercial'),
+        'telefone_emergencial': texto('telefone_emergencial'),
+        'email': texto('email'),
+        'website': texto('website'),
+        'etiqueta': texto('etiqueta') or 'CADASTRADA'
+    }
+    
+    if not empresa_data['razao_social']:
+        raise ValueError("Razão social vazia")
+    
+    # Processar data de fundação
+    data_fundacao = row.get('data_fundacao')
+    if data_fundacao is not None:
+        if isinstance(data_fundacao, str):
+            try:
+                empresa_data['data_fundacao'] = datetime.strptime(data_fundacao.strip(), "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError(f"Data de fundação inválida: {data_fundacao}")
+        elif hasattr(data_fundacao, 'date'):
+            empresa_data['data_fundacao'] = data_fundacao.date()
+    
+    return empresa_data
+
+
+def _create_empresa_from_excel(empresa_data):
     """Criar nova empresa a partir dos dados da planilha Excel"""
-    # Criar empresa principal
     empresa = Empresa(
         razao_social=empresa_data.get("razao_social"),
         nome_fantasia=empresa_data.get("nome_fantasia"),
@@ -1160,19 +1661,14 @@ def _create_empresa_from_excel(empresa_data, excel_data, cnpj):
         email=empresa_data.get("email"),
         website=empresa_data.get("website"),
         etiqueta=empresa_data.get("etiqueta", "CADASTRADA"),
-        data_fundacao=datetime.strptime(empresa_data["data_fundacao"], "%Y-%m-%d").date() if empresa_data.get("data_fundacao") else None
+        data_fundacao=empresa_data.get("data_fundacao")
     )
-    
     db.session.add(empresa)
-    db.session.flush()  # Para obter o ID da empresa
-    
-    # Adicionar dados relacionados das outras abas
-    _add_related_data_from_excel(empresa, excel_data, cnpj)
+    return empresa
 
 
-def _update_empresa_from_excel(empresa, empresa_data, excel_data, cnpj):
-    """Atualizar empresa existente com dados da planilha Excel"""
-    # Atualizar campos básicos
+def _update_empresa_from_excel(empresa, empresa_data):
+    """Atualizar campos básicos de empresa existente com dados da planilha Excel"""
     empresa.razao_social = empresa_data.get("razao_social", empresa.razao_social)
     empresa.nome_fantasia = empresa_data.get("nome_fantasia", empresa.nome_fantasia)
     empresa.inscricao_estadual = empresa_data.get("inscricao_estadual", empresa.inscricao_estadual)
@@ -1185,214 +1681,72 @@ def _update_empresa_from_excel(empresa, empresa_data, excel_data, cnpj):
     empresa.updated_at = datetime.utcnow()
     
     if empresa_data.get("data_fundacao"):
-        empresa.data_fundacao = datetime.strptime(empresa_data["data_fundacao"], "%Y-%m-%d").date()
-    
-    # Limpar dados relacionados existentes
-    _clear_related_data(empresa)
-    
-    # Adicionar novos dados relacionados das outras abas
-    _add_related_data_from_excel(empresa, excel_data, cnpj)
+        empresa.data_fundacao = empresa_data["data_fundacao"]
+
 
+def _excluir_dados_relacionados(empresa_ids):
+    """Excluir os dados relacionados de várias empresas com um DELETE ... IN por tabela e lote"""
+    empresa_ids = list(empresa_ids)
+    for inicio in range(0, len(empresa_ids), LOTE_IMPORTACAO):
+        lote = empresa_ids[inicio:inicio + LOTE_IMPORTACAO]
+        for modelo in MODELOS_RELACIONADOS:
+            db.session.execute(delete(modelo).where(modelo.empresa_id.in_(lote)))
 
-def _add_related_data_from_excel(empresa, excel_data, cnpj):
-    """Adicionar dados relacionados das outras abas da planilha Excel"""
+
+def _inserir_em_lote(modelo, registros):
+    """INSERT em massa (executemany) em lotes"""
+    for inicio in range(0, len(registros), LOTE_IMPORTACAO):
+        db.session.execute(insert(modelo), registros[inicio:inicio + LOTE_IMPORTACAO])
+
+
+def _importar_abas_relacionadas(excel_data, empresa_id_por_cnpj, stats):
+    """
+    Processa cada aba relacionada em uma única passada: normaliza a coluna
+    cnpj_empresa de forma vetorizada, mantém apenas as linhas das empresas
+    importadas e insere os registros em massa.
+    """
     import pandas as pd
     
-    # Processar Regulamentações
-    if 'Regulamentações' in excel_data or 'Regulamentacoes' in excel_data:
-        sheet_name = 'Regulamentações' if 'Regulamentações' in excel_data else 'Regulamentacoes'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                regulamentacao = Regulamentacao(
-                    empresa_id=empresa.id,
-                    tipo_regulamentacao=str(row['tipo_regulamentacao']) if pd.notna(row['tipo_regulamentacao']) else None,
-                    numero_registro=str(row['numero_registro']) if pd.notna(row['numero_registro']) else None,
-                    data_emissao=pd.to_datetime(row['data_emissao']).date() if pd.notna(row['data_emissao']) else None,
-                    data_validade=pd.to_datetime(row['data_validade']).date() if pd.notna(row['data_validade']) else None,
-                    orgao_emissor=str(row['orgao_emissor']) if pd.notna(row['orgao_emissor']) else None
-                )
-                db.session.add(regulamentacao)
-    
-    # Processar Certificações
-    if 'Certificações' in excel_data or 'Certificacoes' in excel_data:
-        sheet_name = 'Certificações' if 'Certificações' in excel_data else 'Certificacoes'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                certificacao = Certificacao(
-                    empresa_id=empresa.id,
-                    nome_certificacao=str(row['nome_certificacao']) if pd.notna(row['nome_certificacao']) else None,
-                    numero_certificacao=str(row['numero_certificacao']) if pd.notna(row['numero_certificacao']) else None,
-                    data_emissao=pd.to_datetime(row['data_emissao']).date() if pd.notna(row['data_emissao']) else None,
-                    data_validade=pd.to_datetime(row['data_validade']).date() if pd.notna(row['data_validade']) else None,
-                    orgao_certificador=str(row['orgao_certificador']) if pd.notna(row['orgao_certificador']) else None
-                )
-                db.session.add(certificacao)
-    
-    # Processar Modalidades de Transporte
-    if 'Modalidades de Transporte' in excel_data or 'Modalidades' in excel_data:
-        sheet_name = 'Modalidades de Transporte' if 'Modalidades de Transporte' in excel_data else 'Modalidades'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                modalidade = ModalidadeTransporte(
-                    empresa_id=empresa.id,
-                    modalidade=str(row['modalidade']) if pd.notna(row['modalidade']) else None
-                )
-                db.session.add(modalidade)
-    
-    # Processar Tipos de Carga
-    if 'Tipos de Carga' in excel_data or 'Tipos_Carga' in excel_data:
-        sheet_name = 'Tipos de Carga' if 'Tipos de Carga' in excel_data else 'Tipos_Carga'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                tipo_carga = TipoCarga(
-                    empresa_id=empresa.id,
-                    tipo_carga=str(row['tipo_carga']) if pd.notna(row['tipo_carga']) else None
-                )
-                db.session.add(tipo_carga)
-    
-    # Processar Abrangência Geográfica
-    if 'Abrangência Geográfica' in excel_data or 'Abrangencia' in excel_data:
-        sheet_name = 'Abrangência Geográfica' if 'Abrangência Geográfica' in excel_data else 'Abrangencia'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                abrangencia = AbrangenciaGeografica(
-                    empresa_id=empresa.id,
-                    tipo_abrangencia=str(row['tipo_abrangencia']) if pd.notna(row['tipo_abrangencia']) else None,
-                    detalhes=str(row['detalhes']) if pd.notna(row['detalhes']) else None
-                )
-                db.session.add(abrangencia)
-    
-    # Processar Frota
-    if 'Frota' in excel_data:
-        df = excel_data['Frota']
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                frota = Frota(
-                    empresa_id=empresa.id,
-                    tipo_frota=str(row['tipo_frota']) if pd.notna(row['tipo_frota']) else None,
-                    quantidade=int(row['quantidade']) if pd.notna(row['quantidade']) else None,
-                    tipo_veiculo=str(row['tipo_veiculo']) if pd.notna(row['tipo_veiculo']) else None,
-                    tipo_carroceria=str(row['tipo_carroceria']) if pd.notna(row['tipo_carroceria']) else None,
-                    capacidade=float(row['capacidade']) if pd.notna(row['capacidade']) else None,
-                    ano_medio=int(row['ano_medio']) if pd.notna(row['ano_medio']) else None
-                )
-                db.session.add(frota)
-    
-    # Processar Armazenagem
-    if 'Armazenagem' in excel_data:
-        df = excel_data['Armazenagem']
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                possui_armazem = str(row['possui_armazem']).lower() in ['sim', 'yes', 'true', '1'] if pd.notna(row['possui_armazem']) else False
-                armazenagem = Armazenagem(
-                    empresa_id=empresa.id,
-                    possui_armazem=possui_armazem,
-                    localizacao=str(row['localizacao']) if pd.notna(row['localizacao']) else None,
-                    capacidade_m2=float(row['capacidade_m2']) if pd.notna(row['capacidade_m2']) else None,
-                    capacidade_m3=float(row['capacidade_m3']) if pd.notna(row['capacidade_m3']) else None,
-                    tipos_armazenagem=str(row['tipos_armazenagem']) if pd.notna(row['tipos_armazenagem']) else None,
-                    servicos_oferecidos=str(row['servicos_oferecidos']) if pd.notna(row['servicos_oferecidos']) else None
-                )
-                db.session.add(armazenagem)
-    
-    # Processar Portos e Terminais
-    if 'Portos e Terminais' in excel_data or 'Portos' in excel_data:
-        sheet_name = 'Portos e Terminais' if 'Portos e Terminais' in excel_data else 'Portos'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                porto = PortoTerminal(
-                    empresa_id=empresa.id,
-                    nome_porto_terminal=str(row['nome_porto_terminal']) if pd.notna(row['nome_porto_terminal']) else None,
-                    tipo_terminal=str(row['tipo_terminal']) if pd.notna(row['tipo_terminal']) else None
-                )
-                db.session.add(porto)
-    
-    # Processar Seguros e Coberturas
-    if 'Seguros e Coberturas' in excel_data or 'Seguros' in excel_data:
-        sheet_name = 'Seguros e Coberturas' if 'Seguros e Coberturas' in excel_data else 'Seguros'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                seguro = SeguroCobertura(
-                    empresa_id=empresa.id,
-                    tipo_seguro=str(row['tipo_seguro']) if pd.notna(row['tipo_seguro']) else None,
-                    numero_apolice=str(row['numero_apolice']) if pd.notna(row['numero_apolice']) else None,
-                    data_validade=pd.to_datetime(row['data_validade']).date() if pd.notna(row['data_validade']) else None,
-                    seguradora=str(row['seguradora']) if pd.notna(row['seguradora']) else None,
-                    valor_cobertura=str(row['valor_cobertura']) if pd.notna(row['valor_cobertura']) else None
-                )
-                db.session.add(seguro)
-    
-    # Processar Tecnologias
-    if 'Tecnologias' in excel_data:
-        df = excel_data['Tecnologias']
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                tecnologia = Tecnologia(
-                    empresa_id=empresa.id,
-                    nome_tecnologia=str(row['nome_tecnologia']) if pd.notna(row['nome_tecnologia']) else None,
-                    detalhes=str(row['detalhes']) if pd.notna(row['detalhes']) else None
-                )
-                db.session.add(tecnologia)
-    
-    # Processar Desempenho e Qualidade
-    if 'Desempenho e Qualidade' in excel_data or 'Desempenho' in excel_data:
-        sheet_name = 'Desempenho e Qualidade' if 'Desempenho e Qualidade' in excel_data else 'Desempenho'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                desempenho = DesempenhoQualidade(
-                    empresa_id=empresa.id,
-                    prazo_medio_atendimento=str(row['prazo_medio_atendimento']) if pd.notna(row['prazo_medio_atendimento']) else None,
-                    unidade_prazo=str(row['unidade_prazo']) if pd.notna(row['unidade_prazo']) else 'dias',
-                    indice_avarias_extravios=float(row['indice_avarias_extravios']) if pd.notna(row['indice_avarias_extravios']) else None,
-                    indice_entregas_prazo=float(row['indice_entregas_prazo']) if pd.notna(row['indice_entregas_prazo']) else None
-                )
-                db.session.add(desempenho)
-    
-    # Processar Clientes e Segmentos
-    if 'Clientes e Segmentos' in excel_data or 'Clientes' in excel_data:
-        sheet_name = 'Clientes e Segmentos' if 'Clientes e Segmentos' in excel_data else 'Clientes'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                cliente = ClienteSegmento(
-                    empresa_id=empresa.id,
-                    segmento=str(row['segmento']) if pd.notna(row['segmento']) else None,
-                    principais_clientes=str(row['principais_clientes']) if pd.notna(row['principais_clientes']) else None
-                )
-                db.session.add(cliente)
-    
-    # Processar Recursos Humanos
-    if 'Recursos Humanos' in excel_data or 'RH' in excel_data:
-        sheet_name = 'Recursos Humanos' if 'Recursos Humanos' in excel_data else 'RH'
-        df = excel_data[sheet_name]
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                rh = RecursoHumano(
-                    empresa_id=empresa.id,
-                    numero_funcionarios=int(row['numero_funcionarios']) if pd.notna(row['numero_funcionarios']) else None,
-                    programas_treinamento=str(row['programas_treinamento']) if pd.notna(row['programas_treinamento']) else None
-                )
-                db.session.add(rh)
-    
-    # Processar Sustentabilidade
-    if 'Sustentabilidade' in excel_data:
-        df = excel_data['Sustentabilidade']
-        for _, row in df.iterrows():
-            if pd.notna(row['cnpj_empresa']) and str(row['cnpj_empresa']).replace('.', '').replace('/', '').replace('-', '') == cnpj:
-                sustentabilidade = Sustentabilidade(
-                    empresa_id=empresa.id,
-                    certificacao_ambiental=str(row['certificacao_ambiental']) if pd.notna(row['certificacao_ambiental']) else None,
-                    programas_reducao_emissoes=str(row['programas_reducao_emissoes']) if pd.notna(row['programas_reducao_emissoes']) else None
+    for nomes_aba, modelo, conversores in ABAS_RELACIONADAS_EXCEL:
+        nome_aba = next((nome for nome in nomes_aba if nome in excel_data), None)
+        if nome_aba is None:
+            continue
+        
+        df = excel_data[nome_aba]
+        if 'cnpj_empresa' not in df.columns or df.empty:
+            continue
+        
+        cnpjs = df['cnpj_empresa'].astype(str).str.replace(r'[./-]', '', regex=True)
+        empresa_ids = cnpjs.map(empresa_id_por_cnpj).where(df['cnpj_empresa'].notna())
+        df = df[empresa_ids.notna()]
+        if df.empty:
+            continue
+        
+        # Colunas ausentes na aba são tratadas como vazias
+        vazia = pd.Series([None] * len(df), index=df.index, dtype=object)
+        colunas = {
+            coluna: converter(df[coluna] if coluna in df.columns else vazia)
+            for coluna, converter in conversores.items()
+        }
+        obrigatorias = [
+            c.name for c in modelo.__table__.columns
+            if not c.nullable and c.name in colunas
+        ]
+        
+        registros = []
+        for i, empresa_id in enumerate(empresa_ids[empresa_ids.notna()].astype(int).tolist()):
+            registro = {coluna: valores[i] for coluna, valores in colunas.items()}
+            faltando = [c for c in obrigatorias if registro[c] is None]
+            if faltando:
+                stats["erros"] += 1
+                stats["detalhes_erros"].append(
+                    f"Aba {nome_aba}, linha {df.index[i] + 2}: campo obrigatório vazio ({', '.join(faltando)})"
                 )
-                db.session.add(sustentabilidade)
+                continue
+            registro['empresa_id'] = empresa_id
+            registros.append(registro)
+        
+        _inserir_em_lote(modelo, registros)
 
 
 @empresa_bp.route("/empresas/template-excel", methods=["GET"])
@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, send_file
+from flask_cors import CORS
+from flask_login import current_user
+import os
+
+from src.models import db
+from src.models.job import Job, StatusJob
+from src.services import jobs
+
+jobs_bp = Blueprint("jobs", __name__)
+CORS(jobs_bp)
+
+
+def _obter_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job or not job.pode_ser_acessado_por(current_user):
+        return None
+    return job
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def obter_job(job_id):
+    """Consultar status e progresso de uma tarefa em segundo plano"""
+    try:
+        job = _obter_job(job_id)
+        if not job:
+            return jsonify({"error": "Tarefa não encontrada"}), 404
+
+        # O worker que executava a tarefa pode ter sido encerrado sem finalizá-la
+        if not job.finalizado and Job.marcar_abandonados(jobs.ABANDONO, job_id=job.id):
+            db.session.refresh(job)
+
+        return jsonify(job.to_dict())
+
+    except Exception as e:
+        return jsonify({"error": f"Erro ao consultar tarefa: {str(e)}"}), 500
+
+
+@jobs_bp.route("/jobs/<job_id>/download", methods=["GET"])
+def download_job(job_id):
+    """Baixar o arquivo gerado por uma tarefa concluída"""
+    try:
+        job = _obter_job(job_id)
+        if not job:
+            return jsonify({"error": "Tarefa não encontrada"}), 404
+
+        if job.status != StatusJob.CONCLUIDO:
+            return jsonify({"error": "Tarefa ainda não foi concluída", "status": job.status.value}), 409
+
+        if not job.arquivo or not os.path.exists(job.arquivo):
+            return jsonify({"error": "Tarefa não possui arquivo para download"}), 404
+
+        extensao = os.path.splitext(job.arquivo)[1]
+        data = (job.finalizado_em or job.created_at).strftime('%Y%m%d_%H%M%S')
+        return send_file(job.arquivo, as_attachment=True, download_name=f"brccsis_{job.tipo}_{data}{extensao}")
+
+    except Exception as e:
+        return jsonify({"error": f"Erro ao baixar resultado: {str(e)}"}), 500
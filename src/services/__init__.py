@@ -0,0 +1 @@
+# Serviços de apoio da aplicação (cache, tarefas em segundo plano, etc.)
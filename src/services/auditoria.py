@@ -0,0 +1,138 @@
+"""
+Gravação em lote do log de auditoria
+
+LogAuditoria.registrar_acao coloca o registro em uma fila limitada do
+próprio processo, e uma thread em segundo plano grava a fila em lotes (um
+INSERT de várias linhas por transação) a cada AUDITORIA_INTERVALO segundos
+ou quando AUDITORIA_LOTE registros se acumulam. Assim a requisição não
+espera um commit (e o fsync do banco) só para registrar o log.
+
+A thread é criada sob demanda, já no worker do gunicorn: com preload_app o
+processo mestre importa a aplicação antes do fork, e threads não
+sobrevivem ao fork. Ao encerrar o worker (hook worker_exit do
+gunicorn.conf.py, ou atexit no servidor de desenvolvimento) a fila é
+descarregada.
+
+Configuração:
+    AUDITORIA_ASSINCRONA  false grava cada registro na hora, como antes (padrão: true)
+    AUDITORIA_FILA_MAX    registros em espera; com a fila cheia o registro é gravado na hora
+    AUDITORIA_LOTE        registros por INSERT
+    AUDITORIA_INTERVALO   segundos máximos entre gravações
+"""
+
+import os
+import queue
+import atexit
+import threading
+
+from flask import current_app
+
+from src.models import db
+
+ASSINCRONA = os.getenv('AUDITORIA_ASSINCRONA', 'true').strip().lower() in ('1', 'true', 'sim', 'yes', 'on')
+FILA_MAX = int(os.getenv('AUDITORIA_FILA_MAX', '10000'))
+TAMANHO_LOTE = int(os.getenv('AUDITORIA_LOTE', '200'))
+INTERVALO = float(os.getenv('AUDITORIA_INTERVALO', '2'))
+
+_fila = None
+_thread = None
+_parar = None
+_app = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _iniciar(app):
+    """Cria a fila e a thread de gravação no processo atual (uma vez por worker)"""
+    global _fila, _thread, _parar, _app, _pid
+    with _lock:
+        if _pid == os.getpid() and _thread is not None and _thread.is_alive():
+            return _fila
+        if _pid != os.getpid():
+            # Primeira chamada neste processo (ou herdada do mestre antes do fork)
+            _fila = queue.Queue(maxsize=FILA_MAX)
+            atexit.register(encerrar)
+        _app = app
+        _pid = os.getpid()
+        _parar = threading.Event()
+        _thread = threading.Thread(target=_executar, args=(_fila, _parar), name='auditoria', daemon=True)
+        _thread.start()
+        return _fila
+
+
+def registrar(valores):
+    """Enfileira um registro (dicionário com as colunas de logs_auditoria)"""
+    if not ASSINCRONA:
+        gravar([valores])
+        return
+
+    fila = _iniciar(current_app._get_current_object())
+    try:
+        fila.put_nowait(valores)
+    except queue.Full:
+        # Sem espaço na fila: grava na hora em vez de perder o registro
+        gravar([valores])
+
+
+def gravar(lote):
+    """Grava um lote de registros em uma única transação"""
+    if not lote:
+        return
+    from src.models.usuario import LogAuditoria
+
+    with db.engine.begin() as conn:
+        conn.execute(LogAuditoria.__table__.insert(), lote)
+
+
+def _retirar_lote(fila, primeiro):
+    lote = [primeiro]
+    while len(lote) < TAMANHO_LOTE:
+        try:
+            lote.append(fila.get_nowait())
+        except queue.Empty:
+            break
+    return lote
+
+
+def _gravar_lote(app, lote):
+    with app.app_context():
+        try:
+            gravar(lote)
+        except Exception as e:
+            app.logger.error(f"Falha ao gravar {len(lote)} registros de auditoria: {e}")
+
+
+def _executar(fila, parar):
+    while not parar.is_set():
+        try:
+            primeiro = fila.get(timeout=INTERVALO)
+        except queue.Empty:
+            continue
+        # Espera o intervalo para juntar o lote, a não ser que ele já esteja cheio
+        if fila.qsize() + 1 < TAMANHO_LOTE:
+            parar.wait(INTERVALO)
+        _gravar_lote(_app, _retirar_lote(fila, primeiro))
+
+
+def descarregar():
+    """Grava imediatamente tudo o que está na fila deste processo"""
+    if _pid != os.getpid() or _fila is None or _app is None:
+        return 0
+    total = 0
+    while True:
+        try:
+            primeiro = _fila.get_nowait()
+        except queue.Empty:
+            return total
+        lote = _retirar_lote(_fila, primeiro)
+        _gravar_lote(_app, lote)
+        total += len(lote)
+
+
+def encerrar(timeout=5):
+    """Para a thread de gravação e descarrega a fila (encerramento do worker)"""
+    if _pid != os.getpid() or _thread is None:
+        return 0
+    _parar.set()
+    _thread.join(timeout)
+    return descarregar()
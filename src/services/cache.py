@@ -0,0 +1,51 @@
+"""
+Cache em memória com expiração (TTL)
+
+Cada processo (worker do gunicorn) mantém o seu próprio cache. Os valores
+devem ser tratados como somente leitura por quem os obtém.
+"""
+
+import threading
+import time
+
+
+class CacheTTL:
+    """Dicionário com expiração por tempo e limite de entradas"""
+
+    def __init__(self, ttl, max_itens=128):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """Retorna o valor em cache ou None se ausente/expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            return valor
+
+    def definir(self, chave, valor):
+        with self._lock:
+            if len(self._itens) >= self.max_itens and chave not in self._itens:
+                # Descartar a entrada que expira primeiro
+                mais_antiga = min(self._itens, key=lambda k: self._itens[k][0])
+                del self._itens[mais_antiga]
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+
+    def obter_ou_calcular(self, chave, calcular):
+        """Retorna o valor em cache ou calcula, armazena e retorna"""
+        valor = self.obter(chave)
+        if valor is None:
+            valor = calcular()
+            self.definir(chave, valor)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
@@ -0,0 +1,216 @@
+"""
+Eventos em tempo real (Server-Sent Events) para notificações e painéis
+
+Cada worker mantém as assinaturas abertas (uma fila por conexão SSE) e uma
+única thread de distribuição, criada sob demanda quando a primeira conexão
+chega. Enquanto houver assinantes, a thread lê as notificações novas
+(id maior que a última vista, pela chave primária) e as entrega às filas
+dos destinatários; os painéis de tempo real recebem um aviso quando o
+histórico de cotações muda. Isso custa uma ou duas consultas por worker a
+cada EVENTOS_INTERVALO segundos, independente de quantos painéis estão
+abertos; sem assinantes não há nenhuma leitura.
+
+O commit que grava notificações ou transições de cotação neste worker
+acorda a thread na hora (eventos da sessão). Notificações gravadas por
+outros workers chegam na próxima leitura, em até EVENTOS_INTERVALO
+segundos.
+
+Cada conexão SSE ocupa uma thread do worker gthread. Para que os painéis
+abertos não ocupem todas as threads e travem as demais requisições, cada
+worker aceita no máximo EVENTOS_MAX_CONEXOES conexões (padrão: metade das
+threads do worker); acima disso a rota responde 503 e o navegador volta a
+consultar o painel periodicamente. Para centenas de painéis abertos use um
+worker assíncrono (GUNICORN_WORKER_CLASS=gevent, com o pacote gevent
+instalado), em que o limite padrão sobe para 500.
+"""
+
+import os
+import queue
+import threading
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, joinedload
+
+from src.models import db
+
+INTERVALO = float(os.getenv('EVENTOS_INTERVALO', '2'))
+if os.getenv('GUNICORN_WORKER_CLASS', 'gthread') == 'gevent':
+    MAX_CONEXOES = int(os.getenv('EVENTOS_MAX_CONEXOES', '500'))
+else:
+    MAX_CONEXOES = int(os.getenv('EVENTOS_MAX_CONEXOES', str(max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 2))))
+HEARTBEAT = float(os.getenv('EVENTOS_HEARTBEAT', '15'))
+FILA_MAX = 100
+LOTE = 500
+
+_CHAVE_PENDENTE = 'eventos_pendentes'
+
+
+class LimiteConexoesError(RuntimeError):
+    """Este worker já atende o número máximo de conexões SSE"""
+
+
+class Assinatura:
+    """Conexão SSE de um usuário: fila de eventos (nome, dados) a enviar"""
+
+    def __init__(self, usuario_id, tempo_real=False, desde=0):
+        self.usuario_id = usuario_id
+        self.tempo_real = tempo_real
+        # Última notificação já considerada para esta conexão (as seguintes são entregues)
+        self.ultima_notificacao = desde
+        self.fila = queue.Queue(maxsize=FILA_MAX)
+
+    def entregar(self, nome, dados):
+        try:
+            self.fila.put_nowait((nome, dados))
+        except queue.Full:
+            # Cliente lento: descarta; ele se ressincroniza ao reconectar
+            pass
+
+    def proximo(self, timeout):
+        """Próximo evento ou None se nada chegou dentro do timeout"""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+_assinaturas = {}  # usuario_id -> set(Assinatura)
+_lock = threading.Lock()
+_acordar = threading.Event()
+_thread = None
+_app = None
+_pid = None
+
+
+def assinar(app, usuario_id, tempo_real=False, desde=0):
+    """
+    Registra uma conexão SSE e garante a thread de distribuição neste processo;
+    LimiteConexoesError se o worker já está no limite de conexões
+    """
+    global _thread, _app, _pid
+    assinatura = Assinatura(usuario_id, tempo_real, desde)
+    with _lock:
+        if _pid != os.getpid():
+            # Primeira assinatura neste processo (ou estado herdado do mestre antes do fork)
+            _assinaturas.clear()
+            _thread = None
+            _pid = os.getpid()
+        if sum(len(conjunto) for conjunto in _assinaturas.values()) >= MAX_CONEXOES:
+            raise LimiteConexoesError(f'Limite de {MAX_CONEXOES} conexões em tempo real por worker atingido')
+        _app = app
+        _assinaturas.setdefault(usuario_id, set()).add(assinatura)
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_distribuir, name='eventos', daemon=True)
+            _thread.start()
+    avisar()
+    return assinatura
+
+
+def cancelar(assinatura):
+    with _lock:
+        conjunto = _assinaturas.get(assinatura.usuario_id)
+        if conjunto is not None:
+            conjunto.discard(assinatura)
+            if not conjunto:
+                del _assinaturas[assinatura.usuario_id]
+
+
+def avisar():
+    """Acorda a thread de distribuição (há notificações ou transições novas)"""
+    _acordar.set()
+
+
+def marcar_pendente(sessao):
+    """Marca a sessão para avisar os assinantes quando o commit acontecer"""
+    sessao.info[_CHAVE_PENDENTE] = True
+
+
+def _copiar_assinaturas():
+    with _lock:
+        return {usuario_id: list(conjunto) for usuario_id, conjunto in _assinaturas.items()}
+
+
+def _distribuir():
+    from src.models.notificacao import Notificacao
+    from src.models.cotacao import HistoricoCotacao
+
+    ultimo_historico = None
+    while True:
+        _acordar.wait(INTERVALO)
+        _acordar.clear()
+        assinaturas = _copiar_assinaturas()
+        if not assinaturas:
+            # Ninguém ouvindo: recomeça do ponto atual quando alguém conectar
+            ultimo_historico = None
+            continue
+
+        with _app.app_context():
+            try:
+                # Lê a partir da conexão mais atrasada (uma recém-aberta parte do id
+                # lido na própria requisição); as demais já estão no topo
+                desde = min(a.ultima_notificacao for lista in assinaturas.values() for a in lista)
+                novas = Notificacao.query.options(joinedload(Notificacao.cotacao))\
+                    .filter(Notificacao.id > desde)\
+                    .order_by(Notificacao.id).limit(LOTE).all()
+                if novas:
+                    if len(novas) == LOTE:
+                        avisar()  # ainda há mais para ler
+                    _entregar_notificacoes(assinaturas, novas)
+                    for lista in assinaturas.values():
+                        for assinatura in lista:
+                            assinatura.ultima_notificacao = max(assinatura.ultima_notificacao, novas[-1].id)
+
+                if any(a.tempo_real for lista in assinaturas.values() for a in lista):
+                    historico = db.session.scalar(select(func.max(HistoricoCotacao.id))) or 0
+                    if ultimo_historico is None:
+                        ultimo_historico = historico
+                    elif historico != ultimo_historico or novas:
+                        ultimo_historico = historico
+                        for lista in assinaturas.values():
+                            for assinatura in lista:
+                                if assinatura.tempo_real:
+                                    assinatura.entregar('tempo_real', {'historico_id': historico})
+            except Exception as e:
+                _app.logger.error(f"Falha ao distribuir eventos: {e}")
+            finally:
+                db.session.remove()
+
+
+def _entregar_notificacoes(assinaturas, notificacoes):
+    from src.models.notificacao import Notificacao
+
+    destinatarios = {}
+    for notificacao in notificacoes:
+        if notificacao.usuario_id in assinaturas:
+            destinatarios.setdefault(notificacao.usuario_id, []).append((notificacao.id, notificacao.to_dict()))
+
+    for usuario_id, itens in destinatarios.items():
+        total_nao_lidas = Notificacao.contar_nao_lidas(usuario_id)
+        for assinatura in assinaturas[usuario_id]:
+            entregues = 0
+            for notificacao_id, dados in itens:
+                if notificacao_id > assinatura.ultima_notificacao:
+                    assinatura.entregar('notificacao', dados)
+                    entregues += 1
+            if entregues:
+                assinatura.entregar('nao_lidas', {'total_nao_lidas': total_nao_lidas})
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_alteracoes(session, flush_context):
+    from src.models.notificacao import Notificacao
+    from src.models.cotacao import HistoricoCotacao
+
+    if any(isinstance(obj, (Notificacao, HistoricoCotacao)) for obj in session.new):
+        session.info[_CHAVE_PENDENTE] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _avisar_apos_commit(session):
+    if session.info.pop(_CHAVE_PENDENTE, False):
+        avisar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendente(session):
+    session.info.pop(_CHAVE_PENDENTE, None)
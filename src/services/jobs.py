@@ -0,0 +1,160 @@
+"""
+Executor de tarefas em segundo plano
+
+As tarefas rodam em um pool de threads do próprio processo, cada uma dentro
+de um app context (e portanto com a sua própria sessão do banco). O pool é
+criado sob demanda, já no worker do gunicorn, e não no processo mestre
+(preload_app), onde threads não sobrevivem ao fork.
+
+Enquanto o processo tem tarefas em aberto, uma thread renova o heartbeat
+delas a cada JOBS_HEARTBEAT segundos e encerra com erro as tarefas de
+outros workers sem heartbeat há JOBS_ABANDONO segundos (worker reciclado
+pelo max_requests ou morto pelo timeout). Ao encerrar o worker, encerrar()
+cancela as tarefas que não começaram e marca as que não terminaram.
+
+A função da tarefa recebe um ContextoJob como primeiro argumento e retorna
+um dicionário com o resumo do resultado. Se o dicionário tiver a chave
+'arquivo', o caminho é guardado na tarefa para download.
+"""
+
+import os
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+
+from src.models import db
+from src.models.job import Job, StatusJob
+from src.models.usuario import get_brasilia_time
+
+MAX_THREADS = int(os.getenv('JOBS_THREADS', '2'))
+HEARTBEAT = float(os.getenv('JOBS_HEARTBEAT', '10'))
+ABANDONO = float(os.getenv('JOBS_ABANDONO', str(HEARTBEAT * 3)))
+# Quanto o worker espera as tarefas em execução terminarem ao encerrar
+# (abaixo do GUNICORN_TIMEOUT, depois do qual o mestre mata o worker)
+ESPERA_ENCERRAMENTO = float(os.getenv('JOBS_ESPERA_ENCERRAMENTO', '20'))
+
+_executor = None
+_futuros = set()
+_parar = None
+_app = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _obter_executor(app):
+    """Pool de threads e thread de heartbeat do processo atual (uma vez por worker)"""
+    global _executor, _parar, _app, _pid
+    with _lock:
+        if _pid != os.getpid() or _executor is None:
+            # Primeira chamada neste processo (ou herdada do mestre antes do fork)
+            _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix='job')
+            _futuros.clear()
+            _parar = threading.Event()
+            _app = app
+            _pid = os.getpid()
+            threading.Thread(target=_heartbeat, args=(app, _parar), name='job-heartbeat', daemon=True).start()
+        return _executor
+
+
+def _heartbeat(app, parar):
+    while not parar.wait(HEARTBEAT):
+        try:
+            with app.app_context():
+                Job.registrar_heartbeat(os.getpid())
+                abandonadas = Job.marcar_abandonados(ABANDONO)
+            if abandonadas:
+                print(f"{abandonadas} tarefas sem heartbeat marcadas como interrompidas")
+        except Exception:
+            traceback.print_exc()
+
+
+def encerrar(timeout=None):
+    """
+    Encerramento do worker: cancela as tarefas que ainda não começaram,
+    espera as em execução até `timeout` segundos e marca como erro as que
+    ficarem sem terminar. Retorna quantas foram marcadas.
+    """
+    global _executor
+    if _pid != os.getpid() or _executor is None:
+        return 0
+    timeout = ESPERA_ENCERRAMENTO if timeout is None else timeout
+    executor, _executor = _executor, None
+    executor.shutdown(wait=False, cancel_futures=True)
+    with _lock:
+        pendentes = [futuro for futuro in _futuros if not futuro.done()]
+    if pendentes and timeout > 0:
+        wait(pendentes, timeout=timeout)  # o heartbeat continua enquanto espera
+    _parar.set()
+    with _app.app_context():
+        return Job.marcar_do_processo(os.getpid(), 'Tarefa interrompida pelo encerramento do worker')
+
+
+class ContextoJob:
+    """Dados e callbacks disponíveis para a função da tarefa"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._ultimo_progresso = None
+
+    def progresso(self, percentual, mensagem=None):
+        """Registra o andamento da tarefa (0-100)"""
+        percentual = max(0, min(100, int(percentual)))
+        if percentual == self._ultimo_progresso and mensagem is None:
+            return
+        self._ultimo_progresso = percentual
+        valores = {'progresso': percentual}
+        if mensagem is not None:
+            valores['mensagem'] = mensagem[:255]
+        Job.atualizar(self.job_id, **valores)
+
+    def caminho_arquivo(self, extensao):
+        """Caminho onde a tarefa deve gravar o arquivo de resultado"""
+        return Job.caminho_resultado(self.job_id, extensao)
+
+
+def enfileirar(tipo, funcao, *args, usuario_id=None):
+    """Cria a tarefa, agenda a execução e retorna o Job (status pendente)"""
+    app = current_app._get_current_object()
+    executor = _obter_executor(app)
+
+    job = Job(tipo=tipo, usuario_id=usuario_id, mensagem='Aguardando execução',
+              pid=os.getpid(), heartbeat_em=get_brasilia_time())
+    db.session.add(job)
+    db.session.commit()
+
+    futuro = executor.submit(_executar, app, job.id, funcao, args)
+    with _lock:
+        _futuros.add(futuro)
+    futuro.add_done_callback(_descartar_futuro)
+    return job
+
+
+def _descartar_futuro(futuro):
+    with _lock:
+        _futuros.discard(futuro)
+
+
+def _executar(app, job_id, funcao, args):
+    with app.app_context():
+        Job.atualizar(job_id, status=StatusJob.EXECUTANDO, iniciado_em=get_brasilia_time(),
+                      mensagem='Em execução')
+        try:
+            resultado = dict(funcao(ContextoJob(job_id), *args) or {})
+            arquivo = resultado.pop('arquivo', None)
+            Job.atualizar(
+                job_id,
+                status=StatusJob.CONCLUIDO,
+                progresso=100,
+                mensagem='Concluído',
+                resultado=json.dumps(resultado, ensure_ascii=False, default=str),
+                arquivo=arquivo,
+                finalizado_em=get_brasilia_time()
+            )
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            Job.atualizar(job_id, status=StatusJob.ERRO, mensagem='Falhou', erro=str(e),
+                          finalizado_em=get_brasilia_time())
@@ -0,0 +1,140 @@
+"""
+Paginação por cursor (keyset)
+
+Em vez de OFFSET, cada página continua a partir da última linha da página
+anterior: ORDER BY coluna DESC, id DESC com o filtro
+(coluna, id) < (valor, id) do cursor. Com um índice em (coluna, id) a página
+100 custa o mesmo que a primeira, e não há COUNT(*) por página.
+
+O cursor é opaco para o cliente: base64 (url-safe) de um JSON [valor, id].
+O total é opcional e aproximado (contagem limitada a LIMITE_CONTAGEM linhas).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, date
+
+from sqlalchemy import and_, or_, func, select
+from sqlalchemy.engine import Row
+
+LIMITE_MAXIMO = 100
+LIMITE_CONTAGEM = 10000
+
+
+class CursorInvalido(ValueError):
+    """Cursor malformado ou adulterado"""
+
+
+def _serializar_valor(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _valor_da_coluna(coluna, valor):
+    """Converte o valor do cursor de volta para o tipo da coluna"""
+    if valor is None:
+        return None
+    try:
+        tipo = coluna.type.python_type
+    except NotImplementedError:
+        return valor
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return tipo(valor)
+
+
+def codificar_cursor(valor, id_):
+    dados = json.dumps([_serializar_valor(valor), id_], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, coluna):
+    """Retorna (valor, id) do cursor; CursorInvalido se não puder ser lido"""
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, id_ = json.loads(dados)
+        if not isinstance(id_, int):
+            raise ValueError('id inválido')
+        return _valor_da_coluna(coluna, valor), id_
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise CursorInvalido('Cursor de paginação inválido') from e
+
+
+def parametros_cursor(args, limite_padrao=20):
+    """
+    Lê cursor/limite da query string. Retorna None se a requisição não pediu
+    paginação por cursor (nem 'cursor' nem 'limite' presentes).
+    """
+    if 'cursor' not in args and 'limite' not in args:
+        return None
+    limite = args.get('limite', limite_padrao, type=int) or limite_padrao
+    return {
+        'cursor': args.get('cursor') or None,
+        'limite': max(1, min(limite, LIMITE_MAXIMO)),
+        'incluir_total': args.get('incluir_total', '').lower() in ('1', 'true', 'sim'),
+    }
+
+
+def _apos_cursor(coluna, coluna_id, valor, id_):
+    """
+    Linhas depois de (valor, id) em ORDER BY coluna DESC NULLS LAST, id DESC.
+    Escrito como faixa em coluna (coluna <= valor) para o banco buscar direto
+    no índice (..., coluna, id); as linhas com coluna NULL ficam no fim e são
+    lidas à parte por paginar_por_cursor().
+    """
+    if valor is None:
+        return and_(coluna.is_(None), coluna_id < id_)
+    return and_(coluna <= valor, or_(coluna < valor, coluna_id < id_))
+
+
+def contar_aproximado(query, coluna_id, limite=LIMITE_CONTAGEM):
+    """Conta no máximo `limite` linhas; retorna (total, exato)"""
+    subconsulta = query.order_by(None).with_entities(coluna_id).limit(limite + 1).subquery()
+    total = query.session.execute(select(func.count()).select_from(subconsulta)).scalar()
+    return min(total, limite), total <= limite
+
+
+def paginar_por_cursor(query, coluna, coluna_id, cursor=None, limite=20, incluir_total=False, preparar=None):
+    """
+    Executa uma página da query ordenada por (coluna, id) decrescentes.
+
+    preparar: função opcional aplicada à query depois do filtro do cursor
+    (ex.: acrescentar colunas com joins); as linhas podem então ser Row
+    cuja primeira posição é a entidade.
+    Retorna (linhas, metadados) com proximo_cursor/tem_mais/limite e,
+    se pedido, total_aproximado/total_exato.
+    """
+    base = query.order_by(None)
+    metadados = {'limite': limite}
+    if incluir_total:
+        metadados['total_aproximado'], metadados['total_exato'] = contar_aproximado(base, coluna_id)
+
+    def buscar(query, quantidade):
+        query = query.order_by(coluna.desc().nulls_last(), coluna_id.desc())
+        if preparar:
+            query = preparar(query)
+        return query.limit(quantidade).all()
+
+    valor = None
+    if cursor:
+        valor, id_ = decodificar_cursor(cursor, coluna)
+        linhas = buscar(base.filter(_apos_cursor(coluna, coluna_id, valor, id_)), limite + 1)
+        if valor is not None and len(linhas) <= limite:
+            # Fim das linhas com valor: completar com as de coluna NULL
+            linhas += buscar(base.filter(coluna.is_(None)), limite + 1 - len(linhas))
+    else:
+        linhas = buscar(base, limite + 1)
+
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    proximo_cursor = None
+    if tem_mais:
+        ultima = linhas[-1][0] if isinstance(linhas[-1], Row) else linhas[-1]
+        proximo_cursor = codificar_cursor(getattr(ultima, coluna.key), getattr(ultima, coluna_id.key))
+
+    metadados.update({'proximo_cursor': proximo_cursor, 'tem_mais': tem_mais})
+    return linhas, metadados
@@ -0,0 +1,50 @@
+"""
+Reconciliação de coleções filhas
+
+Compara a lista recebida com as linhas já carregadas de um relacionamento
+(por chave natural) e aplica somente as diferenças: linhas iguais ficam
+intocadas, linhas com a mesma chave e outros campos diferentes recebem
+UPDATE, as novas são inseridas e as que não vieram são excluídas
+(cascade delete-orphan do relacionamento).
+"""
+
+
+def reconciliar_colecao(colecao, modelo, registros, chave):
+    """
+    colecao: lista do relacionamento já carregada (ex.: empresa.frota)
+    registros: dicionários com os valores das colunas
+    chave: campos da chave natural; chaves repetidas são pareadas na ordem.
+    Retorna {'inseridos': n, 'atualizados': n, 'removidos': n}.
+    """
+    def chave_de(valores):
+        return tuple(valores(campo) for campo in chave)
+
+    disponiveis = {}
+    for obj in colecao:
+        disponiveis.setdefault(chave_de(lambda campo: getattr(obj, campo)), []).append(obj)
+
+    contagem = {'inseridos': 0, 'atualizados': 0, 'removidos': 0}
+    novos = []
+    for registro in registros:
+        candidatos = disponiveis.get(chave_de(registro.get))
+        if candidatos:
+            obj = candidatos.pop(0)
+            alterado = False
+            for campo, valor in registro.items():
+                if getattr(obj, campo) != valor:
+                    setattr(obj, campo, valor)
+                    alterado = True
+            contagem['atualizados'] += alterado
+        else:
+            novos.append(modelo(**registro))
+
+    for restantes in disponiveis.values():
+        for obj in restantes:
+            colecao.remove(obj)
+            contagem['removidos'] += 1
+
+    for obj in novos:
+        colecao.append(obj)
+    contagem['inseridos'] = len(novos)
+
+    return contagem
@@ -0,0 +1,229 @@
+"""
+Retenção de dados: arquivamento e remoção de linhas antigas
+
+notificacoes, historico_cotacoes e logs_auditoria só crescem. Cada tabela
+tem uma política (idade máxima em dias e, opcionalmente, um filtro de
+quais linhas podem sair). As linhas vencidas são lidas em lotes pela chave
+primária, gravadas em segmentos mensais NDJSON comprimidos
+(RETENCAO_DIRETORIO/<tabela>/<AAAA-MM>.ndjson.gz, um objeto JSON por
+linha, pelo mês da data da linha) e só então excluídas, lote a lote, cada
+um em uma transação curta: o bloqueio de escrita dura um DELETE pequeno e
+as requisições continuam sendo atendidas entre os lotes.
+
+O segmento é sincronizado em disco antes do DELETE. Se o processo cair
+entre os dois passos, a próxima execução grava o lote de novo: quem ler os
+segmentos deve descartar ids repetidos.
+
+Variáveis: RETENCAO_NOTIFICACOES_DIAS, RETENCAO_HISTORICO_DIAS,
+RETENCAO_AUDITORIA_DIAS (0 desativa a tabela), RETENCAO_LOTE,
+RETENCAO_PAUSA (segundos entre lotes) e RETENCAO_DIRETORIO.
+"""
+
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from enum import Enum
+
+from sqlalchemy import delete, func, select
+
+from src.models import db
+from src.models.conexao import DIRETORIO_BANCO
+from src.models.usuario import get_brasilia_time
+
+LOTE = int(os.getenv('RETENCAO_LOTE', '500'))
+PAUSA = float(os.getenv('RETENCAO_PAUSA', '0.05'))
+DIRETORIO = os.getenv('RETENCAO_DIRETORIO', os.path.join(DIRETORIO_BANCO, 'arquivo'))
+
+
+class Politica:
+    """Quanto tempo as linhas de uma tabela ficam no banco"""
+
+    def __init__(self, modelo, coluna_data, dias, filtro=None):
+        self.modelo = modelo
+        self.coluna_data = coluna_data
+        self.dias = dias
+        self.filtro = filtro  # função que retorna uma condição extra (ou None)
+
+    @property
+    def tabela(self):
+        return self.modelo.__table__
+
+    def condicoes(self, agora):
+        limite = agora - timedelta(days=self.dias)
+        coluna = self.tabela.c[self.coluna_data]
+        condicoes = [coluna.isnot(None), coluna < limite]
+        if self.filtro is not None:
+            condicoes.append(self.filtro())
+        return condicoes
+
+
+def _historico_de_cotacoes_encerradas():
+    from src.models.cotacao import Cotacao, HistoricoCotacao, StatusCotacao
+
+    # O histórico de cotações em andamento continua visível no detalhe da cotação
+    encerradas = select(Cotacao.id).where(Cotacao.status.in_([
+        StatusCotacao.ACEITA_CONSULTOR, StatusCotacao.NEGADA_CONSULTOR, StatusCotacao.FINALIZADA
+    ]))
+    return HistoricoCotacao.cotacao_id.in_(encerradas)
+
+
+def politicas():
+    """Políticas configuradas, por nome da tabela"""
+    from src.models.notificacao import Notificacao
+    from src.models.cotacao import HistoricoCotacao
+    from src.models.usuario import LogAuditoria
+
+    return {
+        'notificacoes': Politica(Notificacao, 'created_at', int(os.getenv('RETENCAO_NOTIFICACOES_DIAS', '90'))),
+        'historico_cotacoes': Politica(HistoricoCotacao, 'timestamp',
+                                       int(os.getenv('RETENCAO_HISTORICO_DIAS', '730')),
+                                       filtro=_historico_de_cotacoes_encerradas),
+        'logs_auditoria': Politica(LogAuditoria, 'timestamp', int(os.getenv('RETENCAO_AUDITORIA_DIAS', '365'))),
+    }
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.name  # como o SQLAlchemy grava o enum: reinserível sem conversão
+    return str(valor)
+
+
+def _caminho_segmento(tabela, mes):
+    diretorio = os.path.join(DIRETORIO, tabela)
+    os.makedirs(diretorio, exist_ok=True)
+    return os.path.join(diretorio, f'{mes}.ndjson.gz')
+
+
+def _gravar_segmentos(politica, linhas):
+    """Acrescenta as linhas aos segmentos mensais e sincroniza em disco"""
+    por_mes = {}
+    for linha in linhas:
+        por_mes.setdefault(linha[politica.coluna_data].strftime('%Y-%m'), []).append(linha)
+
+    caminhos = []
+    for mes, lote in sorted(por_mes.items()):
+        caminho = _caminho_segmento(politica.tabela.name, mes)
+        # Cada execução acrescenta um membro gzip; gzip.open lê o arquivo inteiro
+        with open(caminho, 'ab') as arquivo:
+            with gzip.GzipFile(fileobj=arquivo, mode='wb') as compactado:
+                for linha in lote:
+                    compactado.write(json.dumps(dict(linha), ensure_ascii=False, default=_serializar).encode('utf-8'))
+                    compactado.write(b'\n')
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        caminhos.append(caminho)
+    return caminhos
+
+
+def _excluir(politica, linhas):
+    """Exclui um lote em uma transação curta, mantendo os contadores derivados"""
+    tabela = politica.tabela
+    excluir = delete(tabela).where(tabela.c.id.in_([linha['id'] for linha in linhas]))
+
+    if tabela.name != 'notificacoes':
+        db.session.execute(excluir)
+        db.session.commit()
+        return
+
+    from src.models.usuario import Usuario
+
+    # O contador usa o estado das linhas no momento do DELETE, não o da leitura
+    # do lote: uma notificação marcada como lida nesse intervalo já foi
+    # descontada por marcar_como_lida
+    if db.session.get_bind().dialect.delete_returning:
+        excluidas = db.session.execute(excluir.returning(tabela.c.usuario_id, tabela.c.lida)).all()
+    else:
+        # Sem RETURNING: relê dentro da transação, com as linhas bloqueadas onde o banco permite
+        excluidas = db.session.execute(
+            select(tabela.c.usuario_id, tabela.c.lida).where(excluir.whereclause).with_for_update()
+        ).all()
+        db.session.execute(excluir)
+
+    por_quantidade = {}
+    for usuario_id, quantidade in Counter(usuario_id for usuario_id, lida in excluidas if not lida).items():
+        por_quantidade.setdefault(quantidade, []).append(usuario_id)
+    for quantidade, ids in por_quantidade.items():
+        Usuario.ajustar_notificacoes_nao_lidas(ids, -quantidade)
+
+    db.session.commit()
+
+
+def aplicar_politica(politica, simular=False, lote=None, agora=None):
+    """Arquiva e exclui as linhas vencidas de uma tabela; retorna o resumo"""
+    lote = lote or LOTE
+    agora = agora or get_brasilia_time().replace(tzinfo=None)
+    tabela = politica.tabela
+    condicoes = politica.condicoes(agora)
+    resumo = {'tabela': tabela.name, 'dias': politica.dias, 'arquivadas': 0, 'segmentos': []}
+
+    if simular:
+        resumo['arquivadas'] = db.session.scalar(select(func.count()).select_from(tabela).where(*condicoes))
+        db.session.rollback()
+        return resumo
+
+    segmentos = set()
+    ultimo_id = 0
+    while True:
+        # Percorre pela chave primária: as linhas antigas ficam no começo da tabela
+        linhas = db.session.execute(
+            select(tabela).where(tabela.c.id > ultimo_id, *condicoes).order_by(tabela.c.id).limit(lote)
+        ).mappings().all()
+        db.session.rollback()  # encerra a leitura antes de escrever os arquivos
+        if not linhas:
+            break
+
+        segmentos.update(_gravar_segmentos(politica, linhas))
+        _excluir(politica, linhas)
+        resumo['arquivadas'] += len(linhas)
+        ultimo_id = linhas[-1]['id']
+
+        if len(linhas) < lote:
+            break
+        if PAUSA:
+            time.sleep(PAUSA)  # deixa as requisições gravarem entre os lotes
+
+    resumo['segmentos'] = sorted(segmentos)
+    return resumo
+
+
+def compactar_sqlite(vacuum=False):
+    """
+    Devolve ao sistema as páginas liberadas no SQLite. Sem vacuum, as
+    páginas livres são reaproveitadas pelas próximas gravações (o arquivo
+    para de crescer); com auto_vacuum=INCREMENTAL elas são liberadas aqui.
+    VACUUM reescreve o arquivo inteiro e bloqueia o banco enquanto roda.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    with db.engine.connect() as conn:
+        livres = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        if vacuum:
+            conn.exec_driver_sql('VACUUM')
+        elif conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            conn.exec_driver_sql('PRAGMA incremental_vacuum')
+        conn.commit()
+        restantes = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+    return {'paginas_livres_antes': livres, 'paginas_livres_depois': restantes}
+
+
+def executar(tabelas=None, simular=False, lote=None, vacuum=False):
+    """Aplica as políticas (todas ou só as tabelas informadas)"""
+    configuradas = politicas()
+    desconhecidas = set(tabelas or ()) - set(configuradas)
+    if desconhecidas:
+        raise ValueError(f"Tabela sem política de retenção: {', '.join(sorted(desconhecidas))}")
+
+    agora = get_brasilia_time().replace(tzinfo=None)
+    resumos = []
+    for nome, politica in configuradas.items():
+        if (tabelas and nome not in tabelas) or politica.dias <= 0:
+            continue
+        resumos.append(aplicar_politica(politica, simular=simular, lote=lote, agora=agora))
+
+    compactacao = None if simular else compactar_sqlite(vacuum)
+    return {'tabelas': resumos, 'compactacao': compactacao}
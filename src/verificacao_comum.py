@@ -0,0 +1,146 @@
+"""
+Utilitários comuns aos scripts de verificação e benchmark (src/check_*.py,
+src/benchmark_*.py) e aos scripts de manutenção
+
+App Flask mínima sobre o banco informado, dados de exemplo (usuários e
+cotações) e captura dos comandos SQL e COMMITs emitidos durante um trecho.
+"""
+
+import os
+import sys
+
+from flask import Flask
+from flask_login import LoginManager
+from sqlalchemy import event
+
+from src.models import db
+from src.models.conexao import opcoes_engine
+from src.models.perfil_sqlite import configurar_engine
+from src.models.usuario import Usuario, TipoUsuario
+from src.models.cotacao import EmpresaCotacao
+
+SENHA = 'check'
+
+
+def criar_app(url=None, blueprints=(), perfil='padrao', login=True):
+    """
+    App com o banco `url` (padrão: TEST_DATABASE_URL ou SQLite em memória).
+
+    blueprints: pares (blueprint, url_prefix)
+    perfil: perfil SQLite das conexões (None = SQLITE_PERFIL, como a aplicação)
+    login: registra o Flask-Login carregando o usuário da sessão
+    """
+    url = url or os.getenv('TEST_DATABASE_URL', 'sqlite://')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'check'
+    db.init_app(app)
+    if login:
+        login_manager = LoginManager(app)
+        login_manager.user_loader(lambda user_id: db.session.get(Usuario, int(user_id)))
+    for blueprint, prefixo in blueprints:
+        app.register_blueprint(blueprint, url_prefix=prefixo)
+    with app.app_context():
+        configurar_engine(db.engine, perfil)
+    return app
+
+
+def autenticar(cliente, usuario_id):
+    """Coloca o usuário na sessão do cliente de teste (como após o login)"""
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario_id)
+        sessao['_fresh'] = True
+    return cliente
+
+
+def criar_usuario(nome, tipo, password_hash=None):
+    """Adiciona um usuário à sessão; sem hash informado, calcula o da senha padrão"""
+    usuario = Usuario(username=nome, email=f'{nome}@exemplo.com', nome_completo=nome.title(), tipo_usuario=tipo)
+    if password_hash:
+        usuario.password_hash = password_hash
+    else:
+        usuario.set_password(SENHA)
+    db.session.add(usuario)
+    return usuario
+
+
+def criar_usuarios_por_tipo(password_hash=None):
+    """Um usuário de cada tipo (username = valor do tipo); retorna {tipo: usuário} já com id"""
+    usuarios = {}
+    for tipo in TipoUsuario:
+        usuarios[tipo] = criar_usuario(tipo.value, tipo, password_hash)
+        password_hash = usuarios[tipo].password_hash  # o hash é calculado uma vez só
+    db.session.flush()
+    return usuarios
+
+
+def criar_operadores(quantidade, password_hash=None, prefixo='operador'):
+    """Operadores prefixo0..N-1 com o mesmo hash de senha; retorna a lista já com ids"""
+    operadores = []
+    for i in range(quantidade):
+        operadores.append(criar_usuario(f'{prefixo}{i}', TipoUsuario.OPERADOR, password_hash))
+        password_hash = operadores[-1].password_hash
+    db.session.flush()
+    return operadores
+
+
+def dados_cotacao(**valores):
+    """Campos obrigatórios de uma cotação rodoviária de exemplo, com as sobrescritas informadas"""
+    dados = dict(
+        empresa_transporte=EmpresaCotacao.BRCARGO_RODOVIARIO,
+        cliente_nome='Cliente', cliente_cnpj='00000000000000',
+        origem_cep='00000-000', origem_endereco='Rua A', origem_cidade='Santos', origem_estado='SP',
+        destino_cep='00000-000', destino_endereco='Rua B', destino_cidade='Curitiba', destino_estado='PR',
+        carga_descricao='Carga', carga_peso_kg=10
+    )
+    dados.update(valores)
+    return dados
+
+
+class CapturaSQL:
+    """
+    Registra os comandos SQL (texto e parâmetros) e os COMMITs emitidos pelo
+    engine enquanto o bloco `with` está aberto.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.comandos = []
+        self.commits = 0
+
+    def _registrar(self, conn, cursor, statement, parameters, context, executemany):
+        self.comandos.append((statement, parameters))
+
+    def _contar_commit(self, conn):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._registrar)
+        event.listen(self.engine, 'commit', self._contar_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._registrar)
+        event.remove(self.engine, 'commit', self._contar_commit)
+        return False
+
+    def com_prefixo(self, prefixo):
+        """Comandos (texto, parâmetros) que começam com `prefixo` (ex.: 'SELECT')"""
+        prefixo = prefixo.upper()
+        return [(sql, parametros) for sql, parametros in self.comandos if sql.lstrip().upper().startswith(prefixo)]
+
+    @property
+    def selects(self):
+        return [sql for sql, _ in self.com_prefixo('SELECT')]
+
+
+def relatar(falhas, mensagem_ok):
+    """Imprime o resultado da verificação e encerra com código 1 se houver falhas"""
+    if falhas:
+        print('\nFALHOU:')
+        for falha in falhas:
+            print(f'  - {falha}')
+        sys.exit(1)
+    print(f'\nOK: {mensagem_ok}')